@@ -0,0 +1,294 @@
+"""OpenAI-compatible chat completions served by the running LocalPilot process.
+
+Other local tools point their OpenAI client at ``http://127.0.0.1:<LOCALPILOT_API_PORT>/v1``.
+Their requests go through ``stream_ollama`` like the tabs' requests do. They get
+the same endpoint pool (warm-model affinity, failover) and wait for a slot from
+the shared scheduler, so one process arbitrates all local LLM traffic. Only
+``/v1/models`` and ``/v1/chat/completions`` (streaming or not) are implemented.
+
+Browsers can POST ``text/plain`` to ``127.0.0.1`` without a CORS preflight, so
+requests that carry an ``Origin`` header or a body that is not
+``application/json`` are refused: any web page could start generations otherwise.
+"""
+from __future__ import annotations
+
+import json
+import queue
+import select
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from config import API_KEY, fetch_ollama_models
+from latency import RequestTimeline
+from metrics import METRICS
+from ollama_client import StopEvent, stream_ollama
+from routing import route
+from scheduler import PRIORITY_API
+from utils import chat_prompt, estimate_tokens
+
+AUTO_MODELS = ("auto", "localpilot")  # model names that let the router choose
+MODELS_TTL = 30.0  # seconds the installed-model list is reused between requests
+CLIENT_CHECK_S = 0.25  # how often a non-streaming request checks that its client is still connected
+
+_models_cache: tuple[float, list[str]] = (0.0, [])
+_models_lock = threading.Lock()
+
+
+def installed_models() -> list[str]:
+    """``fetch_ollama_models()``, refreshed at most every ``MODELS_TTL`` seconds."""
+    global _models_cache
+    with _models_lock:
+        fetched_at, models = _models_cache
+        if not models or time.monotonic() - fetched_at > MODELS_TTL:
+            models = fetch_ollama_models()
+            _models_cache = (time.monotonic(), models)
+        return models
+
+
+class APIError(Exception):
+    def __init__(self, status: int, message: str, kind: str = "invalid_request_error"):
+        super().__init__(message)
+        self.status = status
+        self.kind = kind
+
+
+def _text(content) -> str:
+    """Message content as text (OpenAI clients may send a list of typed parts)."""
+    if isinstance(content, list):
+        return "".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return content or ""
+
+
+def prepare(body: dict, models: list[str]) -> tuple[str, str, dict]:
+    """(model, prompt, Ollama options) for a chat-completions request body; raises APIError."""
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise APIError(400, "'messages' must be a non-empty list")
+    messages = [{"role": m.get("role", "user"), "content": _text(m.get("content"))} for m in messages]
+    prompt = chat_prompt(messages)
+    model = body.get("model") or "auto"
+    if model in AUTO_MODELS:
+        if not models:
+            raise APIError(503, "no Ollama models available", "server_error")
+        model = route(models, estimate_tokens(prompt)).model
+    elif models and model not in models:
+        raise APIError(404, f"model '{model}' not found", "model_not_found")
+    options = {}
+    if body.get("temperature") is not None:
+        options["temperature"] = body["temperature"]
+    if body.get("top_p") is not None:
+        options["top_p"] = body["top_p"]
+    max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+    if max_tokens:
+        options["num_predict"] = int(max_tokens)
+    stop = body.get("stop")
+    if stop:
+        options["stop"] = [stop] if isinstance(stop, str) else list(stop)
+    return model, prompt, options
+
+
+class _Generation:
+    """One ``stream_ollama`` call on a background thread, read chunk by chunk."""
+
+    def __init__(self, prompt: str, model: str, options: dict):
+        self.queue: queue.Queue[str | None] = queue.Queue()
+        self.stop = StopEvent()
+        self.timeline = RequestTimeline()
+        self.error: str | None = None
+        self.abandoned = False  # the client disconnected before the answer was complete
+        self._thread = threading.Thread(
+            target=stream_ollama, daemon=True, name="api-generate",
+            args=(prompt, self.queue, model, self.stop, PRIORITY_API),
+            kwargs={"timeline": self.timeline, "options": options})
+        self._thread.start()
+
+    def chunks(self, client_gone: Optional[Callable[[], bool]] = None):
+        """Yield the answer's chunks; ``client_gone`` is polled meanwhile and stops the request once true."""
+        check_at = time.monotonic() + CLIENT_CHECK_S
+        while True:
+            try:
+                chunk = self.queue.get(timeout=CLIENT_CHECK_S)
+            except queue.Empty:
+                chunk = ""
+            if chunk is None:
+                return
+            if client_gone and not self.abandoned and time.monotonic() >= check_at:
+                check_at = time.monotonic() + CLIENT_CHECK_S
+                if client_gone():
+                    self.abandoned = True
+                    self.stop.set()  # aborts the upstream request; the stream then ends
+            if not chunk:
+                continue
+            if chunk.lstrip().startswith("[Error]"):
+                self.error = chunk.strip()[len("[Error]"):].strip()
+                continue
+            yield chunk
+
+    def finish(self) -> dict:
+        self.stop.set()
+        self._thread.join()
+        stats = self.timeline.stats()
+        if self.timeline.tokens:
+            METRICS.record({**stats, "client": "api"})
+        return stats
+
+
+def _finish_reason(stats: dict) -> str:
+    return "length" if stats.get("stop_reason") == "length" else "stop"
+
+
+def _usage(stats: dict) -> dict:
+    prompt, completion = stats.get("prompt_tokens") or 0, stats.get("gen_tokens") or 0
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "LocalPilot"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, obj: dict, status: int = 200) -> None:
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, e: APIError) -> None:
+        self._json({"error": {"message": str(e), "type": e.kind, "code": e.status}}, e.status)
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Origin"):  # sent by browsers: a web page is calling
+            self._error(APIError(403, "requests from web pages are not accepted", "permission_error"))
+            return False
+        if not API_KEY or self.headers.get("Authorization", "") == f"Bearer {API_KEY}":
+            return True
+        self._error(APIError(401, "invalid API key", "authentication_error"))
+        return False
+
+    def _client_gone(self) -> bool:
+        """True once the client has closed its connection (readable, but nothing to read)."""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") == "/v1/models":
+            self._json({"object": "list", "data": [{"id": m, "object": "model", "created": 0, "owned_by": "ollama"}
+                                                   for m in installed_models()]})
+        else:
+            self._error(APIError(404, f"unknown path {self.path}"))
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._error(APIError(404, f"unknown path {self.path}"))
+            return
+        if self.headers.get_content_type() != "application/json":
+            self._error(APIError(415, "the request body must be sent as Content-Type: application/json"))
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            model, prompt, options = prepare(body, installed_models())
+        except APIError as e:
+            self._error(e)
+            return
+        except (ValueError, AttributeError) as e:
+            self._error(APIError(400, f"invalid request body: {e}"))
+            return
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        gen = _Generation(prompt, model, options)
+        if body.get("stream"):
+            self._stream(gen, completion_id, model)
+        else:
+            self._complete(gen, completion_id, model)
+
+    def _complete(self, gen: _Generation, completion_id: str, model: str) -> None:
+        text = "".join(gen.chunks(self._client_gone))
+        stats = gen.finish()
+        if gen.abandoned:  # nobody to answer; the upstream request was aborted and its slot freed
+            self.close_connection = True
+            return
+        if gen.error and not text:
+            self._error(APIError(502, gen.error, "server_error"))
+            return
+        self._json({
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": _finish_reason(stats)}],
+            "usage": _usage(stats),
+        })
+
+    def _stream(self, gen: _Generation, completion_id: str, model: str) -> None:
+        created = int(time.time())
+
+        def event(delta: dict, finish: str | None = None, **extra) -> bytes:
+            obj = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+            return b"data: " + json.dumps(obj).encode() + b"\n\n"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            self.wfile.write(event({"role": "assistant", "content": ""}))
+            for chunk in gen.chunks():
+                self.wfile.write(event({"content": chunk}))
+                self.wfile.flush()
+            stats = gen.finish()
+            if gen.error:
+                err = {"error": {"message": gen.error, "type": "server_error"}}
+                self.wfile.write(b"data: " + json.dumps(err).encode() + b"\n\n")
+            self.wfile.write(event({}, _finish_reason(stats), usage=_usage(stats)))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            gen.finish()  # the client went away: abort the upstream request and free its slot
+
+
+class APIServer:
+    """The HTTP server on a daemon thread; ``port`` is the bound port (useful with port 0)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="api-server")
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> "APIServer":
+        self._thread.start()
+        print(f"[api_server] OpenAI-compatible API on {self.base_url}", file=sys.stderr)
+        return self
+
+    def shutdown(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def serve(port: int, host: str = "127.0.0.1") -> APIServer | None:
+    """Start the API on ``port`` (None, with a message, if the port is taken)."""
+    try:
+        return APIServer(host, port).start()
+    except OSError as e:
+        print(f"[api_server] could not listen on {host}:{port}: {e}", file=sys.stderr)
+        return None
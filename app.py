@@ -6,7 +6,8 @@ import sys
 from PySide6.QtWidgets import QApplication
 
 from ipc import send_open_session
-from ui.main_window import MainWindow
+from tracing import configure as configure_tracing
+from ui.main_window import MainWindow, load_transcript_engine
 
 
 def _read_selection_from_ranges(path: str, sline: int, scol: int, eline: int, ecol: int) -> str:
@@ -34,6 +35,8 @@ def parse_args(argv) -> argparse.Namespace:
     p.add_argument("--selection", help="pre-supplied selection text")
     p.add_argument("--sel-start-line", type=int); p.add_argument("--sel-start-col", type=int)
     p.add_argument("--sel-end-line", type=int);   p.add_argument("--sel-end-col", type=int)
+    p.add_argument("--trace", help="write a Chrome trace of the session to this file")
+    p.add_argument("--profile", help="sample Python stacks and write folded stacks to this file")
     return p.parse_args(argv)
 
 def main():
@@ -42,10 +45,10 @@ def main():
 
     # Determine selection
     sel = (args.selection or "").rstrip("\n")
-    if not sel and args.filepath and all(
-        getattr(args, k) is not None for k in
-        ("sel_start_line","sel_start_col","sel_end_line","sel_end_col")
-    ):
+    sel_range = None
+    if all(getattr(args, k) is not None for k in ("sel_start_line","sel_start_col","sel_end_line","sel_end_col")):
+        sel_range = (args.sel_start_line, args.sel_start_col, args.sel_end_line, args.sel_end_col)
+    if not sel and args.filepath and sel_range:
         sel = _read_selection_from_ranges(
             args.filepath, args.sel_start_line, args.sel_start_col, args.sel_end_line, args.sel_end_col
         )
@@ -54,13 +57,16 @@ def main():
     # If no selection was found, proceed with an empty string to allow general chat mode.
 
     # Try to hand off to an existing window (single-instance UX)
-    if send_open_session(sel, label):
+    if send_open_session(sel, label, args.filepath, sel_range):
         return
 
     # Launch a new window
+    configure_tracing(args.trace, args.profile)
+    load_transcript_engine()
     qapp = QApplication(sys.argv)
-    win = MainWindow(sel, label)
+    win = MainWindow(sel, label, filepath=args.filepath, selection_range=sel_range)
     win.listen_ipc()
+    win.recover_sessions()
     win.show()
     sys.exit(qapp.exec())
 
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Headless LocalPilot: run an action over files/ranges/stdin and stream JSONL results.
+
+Examples:
+  python batch.py --action explain "src/**/*.py"
+  python batch.py --action tests app/models.py:10-80 --jobs 4
+  git diff -U0 | python batch.py --action refactor --file patch.diff -
+
+Nothing on this path imports Qt, so it runs in pre-commit hooks and CI.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+from chunking import split_code
+from config import CHUNK_TOKENS, LARGE_SELECTION_TOKENS, MODEL, NUM_PARALLEL
+from latency import RequestTimeline
+from map_reduce import part_heading, run_map_reduce
+from ollama_client import stream_ollama
+from scheduler import SlotScheduler
+from tracing import configure as configure_tracing
+from utils import ACTIONS, build_prompt, estimate_tokens, lang_hint
+
+_RANGE = re.compile(r"^(?P<path>.+):(?P<start>\d+)(?:-(?P<end>\d+))?$")
+
+
+@dataclass
+class BatchRequest:
+    id: int
+    file: str
+    code: str
+    lang: str
+    start_line: int | None = None
+    end_line: int | None = None
+
+
+class _TimedQueue(queue.Queue):
+    """Queue that remembers when the first chunk arrived (``first_put`` can also be stamped directly)."""
+
+    def __init__(self):
+        super().__init__()
+        self.first_put: float | None = None
+
+    def put(self, item, block=True, timeout=None):
+        if self.first_put is None and item is not None:
+            self.first_put = time.perf_counter()
+        super().put(item, block, timeout)
+
+
+def read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def expand_inputs(inputs: list[str], stdin_name: str = "stdin", stdin=None) -> list[BatchRequest]:
+    """Turn globs, ``path:START-END`` ranges and ``-`` (stdin) into requests, in argument order."""
+    out: list[BatchRequest] = []
+    seen: set[tuple] = set()
+
+    def add(file, code, start=None, end=None, lang_from=None):
+        key = (file, start, end)
+        if key in seen:
+            return
+        seen.add(key)
+        out.append(BatchRequest(len(out), file, code, lang_hint(lang_from or file), start, end))
+
+    for item in inputs:
+        if item == "-":
+            add(stdin_name, (stdin or sys.stdin).read())
+            continue
+        m = _RANGE.match(item)
+        if m and os.path.isfile(m.group("path")):
+            path = m.group("path")
+            start = int(m.group("start"))
+            end = int(m.group("end") or start)
+            lines = read_text(path).splitlines(keepends=True)
+            start, end = max(1, min(start, end)), min(len(lines), max(start, end))
+            add(path, "".join(lines[start - 1:end]), start, end)
+            continue
+        paths = sorted(glob.glob(item, recursive=True)) if glob.has_magic(item) else [item]
+        for path in paths:
+            if os.path.isfile(path):
+                add(path, read_text(path))
+            elif not glob.has_magic(item):
+                print(f"[batch] no such file: {item}", file=sys.stderr)
+    return out
+
+
+def run_request(req: BatchRequest, instruction: str, model: str, action: str,
+                stop_event: threading.Event | None = None, limiter: SlotScheduler | None = None) -> dict:
+    """Generate the answer for one request; return its JSONL record.
+
+    Every model request (each part of a large input) holds a slot of ``limiter`` if given.
+    """
+    q = _TimedQueue()
+    parts: list[str] = []
+    errors: list[str] = []
+    timeline = RequestTimeline()
+    started = time.perf_counter()
+
+    def collect(s: str) -> None:
+        if s.startswith("[Error]") or s.startswith("\n[Error]"):
+            errors.append(s.strip())
+        else:
+            parts.append(s)
+
+    if estimate_tokens(req.code) > LARGE_SELECTION_TOKENS:
+        chunks = split_code(req.code, req.lang, CHUNK_TOKENS)
+        headings = {part_heading(c, i, len(chunks)) for i, c in enumerate(chunks)} if len(chunks) > 1 else set()
+
+        def emit(s: str) -> None:
+            if q.first_put is None and s not in headings:  # part headings come before any token
+                q.first_put = time.perf_counter()
+            collect(s)
+
+        run_map_reduce(instruction, chunks, req.lang, emit, model=model, stop_event=stop_event, limiter=limiter)
+    else:
+        with limiter.slot(stop_event=stop_event) if limiter else nullcontext():
+            stream_ollama(build_prompt(instruction, req.code, req.lang), q, model=model, stop_event=stop_event,
+                          timeline=timeline)
+        while True:
+            s = q.get()
+            if s is None:
+                break
+            collect(s)
+    finished = time.perf_counter()
+    output = "".join(parts)
+    return {
+        "id": req.id,
+        "file": req.file,
+        "range": [req.start_line, req.end_line] if req.start_line else None,
+        "lang": req.lang,
+        "action": action,
+        "model": model,
+        "ok": not errors,
+        "error": "; ".join(errors) or None,
+        "output": output,
+        "chars": len(output),
+        "timing": {
+            "ttft_s": round(q.first_put - started, 4) if q.first_put else None,
+            "total_s": round(finished - started, 4),
+        },
+        "server": timeline.stats() if timeline.tokens else None,
+    }
+
+
+def run_batch(requests_: list[BatchRequest], instruction: str, model: str, action: str, jobs: int,
+              out=None) -> int:
+    """Run requests on a bounded pool; write one JSON line per result as each completes.
+
+    At most ``jobs`` model requests run at once, counting the parts of large inputs
+    (the process-wide scheduler still caps them at ``OLLAMA_NUM_PARALLEL``).
+    Returns the number of failed requests.
+    """
+    out = out or sys.stdout
+    lock = threading.Lock()
+    failed = 0
+    started = time.perf_counter()
+    limiter = SlotScheduler(jobs)
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="batch") as pool:
+        futures = {pool.submit(run_request, r, instruction, model, action, limiter=limiter): r for r in requests_}
+        for fut in as_completed(futures):
+            try:
+                record = fut.result()
+            except Exception as e:
+                r = futures[fut]
+                record = {"id": r.id, "file": r.file, "action": action, "model": model, "ok": False,
+                          "error": str(e), "output": ""}
+            record["timing"] = {**record.get("timing", {}),
+                                "finished_at_s": round(time.perf_counter() - started, 4)}
+            failed += not record["ok"]
+            with lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+    return failed
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Run a LocalPilot action headlessly and stream JSONL results.")
+    p.add_argument("inputs", nargs="+", help="files, globs (quote them), path:START-END line ranges, or - for stdin")
+    p.add_argument("--action", choices=sorted(ACTIONS), default="explain")
+    p.add_argument("--instruction", help="custom instruction instead of --action's prompt")
+    p.add_argument("--model", default=None, help="Ollama model (default: first installed)")
+    p.add_argument("--jobs", type=int, default=NUM_PARALLEL,
+                   help="concurrent model requests, parts of large files included (default: OLLAMA_NUM_PARALLEL)")
+    p.add_argument("--file", default="stdin", help="name (and language hint) for stdin input")
+    p.add_argument("--trace", help="write a Chrome trace of the run to this file")
+    p.add_argument("--profile", help="sample Python stacks and write folded stacks to this file")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_tracing(args.trace, args.profile)
+    model = args.model or MODEL
+    if not model:
+        print("[batch] no Ollama model available; pass --model", file=sys.stderr)
+        return 2
+    reqs = expand_inputs(args.inputs, stdin_name=args.file)
+    if not reqs:
+        print("[batch] nothing to do", file=sys.stderr)
+        return 2
+    instruction = args.instruction or ACTIONS[args.action]
+    failed = run_batch(reqs, instruction, model, args.action if not args.instruction else "custom", args.jobs)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
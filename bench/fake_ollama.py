@@ -0,0 +1,158 @@
+"""Minimal in-process stand-in for the Ollama HTTP API, shared by the tests and the benchmarks."""
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_DIM = 64
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> list[float]:
+    """Deterministic bag-of-words vector: texts sharing identifiers score high."""
+    vec = [0.0] * dim
+    for word in re.findall(r"[A-Za-z_]\w*", text.lower()):
+        vec[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    return vec
+
+
+class FakeOllama:
+    """Serves ``/api/*`` on an ephemeral localhost port; records every request.
+
+    Leaving the ``with`` block wakes any handler that is still waiting, closes the
+    open connections and joins the server and handler threads.
+    """
+
+    def __init__(self, models=("m",), tokens=("Hello", " world"), token_delay: float = 0.0,
+                 loaded=(), fail_after: int | None = None, first_delay: float | dict = 0.0,
+                 stall_after: int | None = None, stall_for: float = 0.0, header_delay: float = 0.0):
+        self.models = list(models)
+        self.loaded = list(loaded)
+        self.tokens = list(tokens)
+        self.token_delay = token_delay
+        self.fail_after = fail_after  # drop the connection after this many tokens
+        self.first_delay = first_delay  # silence before the first token (model load); per model if a dict
+        self.stall_after = stall_after  # go quiet for stall_for seconds after this many tokens
+        self.stall_for = stall_for
+        self.header_delay = header_delay  # silence before the response headers (Ollama sends them with a token)
+        self.requests: list[tuple[str, dict]] = []
+        self._closing = threading.Event()  # set on exit: ends the handlers' delays
+        self._connections: set[socket.socket] = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def setup(self):
+                super().setup()
+                server._connections.add(self.connection)
+
+            def finish(self):
+                server._connections.discard(self.connection)
+                super().finish()
+
+            def _json(self, obj, status=200):
+                body = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, obj):
+                data = json.dumps(obj).encode() + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, payload):
+                if server.header_delay and server._closing.wait(server.header_delay):
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                model = payload.get("model")
+                started = time.monotonic()
+                try:
+                    delay = server.first_delay
+                    if isinstance(delay, dict):
+                        delay = delay.get(model, 0.0)
+                    if delay and server._closing.wait(delay):
+                        return
+                    limit = (payload.get("options") or {}).get("num_predict")
+                    tokens = server.tokens[:limit] if limit else server.tokens  # num_predict counts chunks here
+                    for i, tok in enumerate(tokens):
+                        if server.stall_after is not None and i == server.stall_after:
+                            if server._closing.wait(server.stall_for):
+                                return
+                        if server.fail_after is not None and i >= server.fail_after:
+                            self.close_connection = True
+                            self.connection.shutdown(socket.SHUT_RDWR)
+                            return
+                        if server.token_delay and server._closing.wait(server.token_delay):
+                            return
+                        self._chunk({"model": model, "response": tok, "done": False})
+                    elapsed = int((time.monotonic() - started) * 1e9) or 1
+                    self._chunk({"model": model, "response": "", "done": True,
+                                 "done_reason": "length" if len(tokens) < len(server.tokens) else "stop",
+                                 "total_duration": elapsed,
+                                 "load_duration": int(delay * 1e9), "prompt_eval_count": len(payload.get("prompt", "")),
+                                 "prompt_eval_duration": 1_000_000, "eval_count": len(tokens),
+                                 "eval_duration": max(1, elapsed - int(delay * 1e9))})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def do_GET(self):
+                server.requests.append((self.path, {}))
+                if self.path == "/api/tags":
+                    self._json({"models": [{"name": m} for m in server.models]})
+                elif self.path == "/api/ps":
+                    self._json({"models": [{"name": m} for m in server.loaded]})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                server.requests.append((self.path, payload))
+                if self.path == "/api/generate":
+                    self._stream(payload)
+                elif self.path == "/api/embed":
+                    inputs = payload.get("input")
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._json({"model": payload.get("model"), "embeddings": [fake_embedding(t) for t in inputs]})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = False  # server_close() joins the handler threads
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def calls(self, path: str) -> list[dict]:
+        return [p for r, p in self.requests if r == path]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._closing.set()
+        self._httpd.shutdown()
+        self._thread.join()
+        for conn in list(self._connections):  # idle keep-alive connections block their handler in a read
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._httpd.server_close()
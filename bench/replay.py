@@ -0,0 +1,36 @@
+"""Replay a recorded Ollama stream through the test server at a chosen token rate."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from bench.fake_ollama import FakeOllama
+
+RECORDINGS = Path(__file__).resolve().parent / "recordings"
+
+
+def load_recording(path: str | Path) -> list[str]:
+    """The ``response`` chunks of a recorded ``/api/generate`` NDJSON stream, in order."""
+    parts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                parts.append(json.loads(line).get("response", ""))
+    return [p for p in parts if p]
+
+
+def rechunk(chunks: list[str], chunk_chars: int) -> list[str]:
+    """Re-split the recorded chunks into ``chunk_chars``-sized ones (0 keeps the recorded sizes)."""
+    if chunk_chars <= 0:
+        return list(chunks)
+    text = "".join(chunks)
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+
+def replay_server(recording: str | Path, tokens_per_s: float, chunk_chars: int, model: str = "bench",
+                  first_delay: float = 0.0) -> FakeOllama:
+    """A FakeOllama that streams the recording; use it as a context manager."""
+    tokens = rechunk(load_recording(recording), chunk_chars)
+    delay = 1.0 / tokens_per_s if tokens_per_s > 0 else 0.0
+    return FakeOllama(models=[model], loaded=[model], tokens=tokens, token_delay=delay, first_delay=first_delay)
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""End-to-end performance benchmarks against a replayed Ollama stream.
+
+Scenarios:
+  stream    stream_ollama → queue (HTTP, NDJSON decode, failover/watchdog overhead)
+  markdown  re-rendering the growing answer every frame, as the tab does (no Qt)
+  worker    ChatWorker → Qt signals → GUI event loop (QtCore only)
+  ui        SessionWidget end to end: markdown + setHtml in the web view (offscreen Qt,
+            skipped when QtWebEngine cannot load)
+  ui_lite   the same with the native "lite" transcript (LOCALPILOT_TRANSCRIPT=lite)
+  startup   a fresh process per renderer: time to a ready tab and resident memory,
+            including the Chromium helper processes of the web renderer
+  tabs      a fresh process with TAB_COUNT tabs pinned to the same generated TAB_FILE_MB
+            file (lite transcript): memory per extra tab, Python heap and RSS
+
+Examples:
+  python bench/run_bench.py --out bench/baseline.json
+  python bench/run_bench.py --baseline bench/baseline.json --rate 120 --chunk 8
+
+With ``--baseline`` the run is compared metric by metric and exits 1 when any
+metric is worse than the baseline by more than ``--tolerance``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import queue
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO))
+
+from bench.replay import RECORDINGS, replay_server  # noqa: E402
+
+MODEL = "bench"
+FRAME_INTERVAL = 0.08  # SessionWidget's render timer
+SCENARIOS = ("stream", "markdown", "worker", "ui", "ui_lite", "startup", "tabs")
+TAB_COUNT, TAB_FILE_MB = 20, 2.0
+HIGHER_IS_BETTER = ("_per_s",)
+NOISE_FLOOR = {"_ms": 2.0, "_s": 0.005, "_pct": 2.0, "_mb": 5.0}  # absolute differences below these are noise
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def bench_stream(n_tokens: int, ideal_s: float) -> dict:
+    from ollama_client import stream_ollama
+
+    q: queue.Queue = queue.Queue()
+    started = time.perf_counter()
+    t = threading.Thread(target=stream_ollama, args=("bench", q), kwargs={"model": MODEL}, daemon=True)
+    t.start()
+    first = None
+    chunks = 0
+    while (item := q.get(timeout=60)) is not None:
+        if first is None:
+            first = time.perf_counter()
+        chunks += 1
+    total = time.perf_counter() - started
+    t.join()
+    return {
+        "ttft_ms": _ms((first or started) - started),
+        "total_s": round(total, 4),
+        "chunks": chunks,
+        "chunks_per_s": round(chunks / total, 1),
+        "overhead_pct": round((total / ideal_s - 1) * 100, 2) if ideal_s else 0.0,
+        "lost_chunks": n_tokens - chunks,
+    }
+
+
+def bench_markdown(tokens: list[str], tokens_per_s: float) -> dict:
+    from markdown_it import MarkdownIt
+
+    md = MarkdownIt()  # same configuration as the tab
+    per_frame = max(1, int(tokens_per_s * FRAME_INTERVAL))
+    frame_times = []
+    text = ""
+    for i in range(0, len(tokens), per_frame):
+        text += "".join(tokens[i:i + per_frame])
+        t0 = time.perf_counter()
+        md.render(text)
+        frame_times.append(time.perf_counter() - t0)
+    return {
+        "frames": len(frame_times),
+        "render_p50_ms": _ms(_pct(frame_times, 50)),
+        "render_p95_ms": _ms(_pct(frame_times, 95)),
+        "render_max_ms": _ms(max(frame_times)),
+        "render_total_s": round(sum(frame_times), 4),
+    }
+
+
+class _LoopLag:
+    """Measures how late a 10 ms timer fires: a proxy for GUI-thread stalls."""
+
+    def __init__(self, interval_ms: int = 10):
+        from PySide6.QtCore import QTimer
+
+        self.interval = interval_ms / 1000
+        self.lags: list[float] = []
+        self._last = time.perf_counter()
+        self.timer = QTimer()
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._tick)
+        self.timer.start()
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.lags.append(max(0.0, now - self._last - self.interval))
+        self._last = now
+
+    def stop(self) -> dict:
+        self.timer.stop()
+        return {"loop_lag_p95_ms": _ms(_pct(self.lags, 95)), "loop_lag_max_ms": _ms(max(self.lags, default=0.0))}
+
+
+def _spin(app, until, timeout: float = 120.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while not until() and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def _app():
+    """The QApplication every Qt scenario shares (QtWebEngine, when present, must be loaded before it)."""
+    from PySide6.QtWidgets import QApplication
+
+    if QApplication.instance() is None:
+        try:
+            import PySide6.QtWebEngineWidgets  # noqa: F401
+        except ImportError:
+            pass
+        QApplication([])
+    return QApplication.instance()
+
+
+def bench_worker() -> dict:
+    from workers.chat_worker import ChatWorker
+
+    app = _app()
+    received: list[float] = []
+    finished = []
+    worker = ChatWorker([{"role": "user", "content": "bench"}], model=MODEL)
+    worker.chunk.connect(lambda s: received.append(time.perf_counter()))
+    worker.done.connect(lambda: finished.append(time.perf_counter()))
+    lag = _LoopLag()
+    started = time.perf_counter()
+    worker.start()
+    _spin(app, lambda: finished)
+    worker.wait()
+    total = (finished[0] if finished else time.perf_counter()) - started
+    gaps = [b - a for a, b in zip(received, received[1:])]
+    return {
+        "ttft_ms": _ms(received[0] - started) if received else None,
+        "total_s": round(total, 4),
+        "chunks": len(received),
+        "chunks_per_s": round(len(received) / total, 1) if total else 0.0,
+        "delivery_gap_p95_ms": _ms(_pct(gaps, 95)),
+        **lag.stop(),
+    }
+
+
+def bench_ui(renderer: str = "web") -> dict:
+    if renderer == "web":
+        import PySide6.QtWebEngineWidgets  # noqa: F401  (ImportError skips the scenario)
+    import ui.session_widget as session_widget
+    from ui.session_widget import SessionWidget
+
+    app = _app()
+    session_widget.TRANSCRIPT = renderer
+    busy: list[float] = []
+    frames: list[float] = []
+    pending: list[float] = []  # arrival times of chunks not yet on screen
+    in_flight = [0]
+
+    orig_on_chunk = SessionWidget._on_chunk
+    orig_flush = SessionWidget._flush_render
+
+    def on_chunk(self, s):
+        t0 = time.perf_counter()
+        pending.append(t0)
+        orig_on_chunk(self, s)
+        busy.append(time.perf_counter() - t0)
+
+    def flush(self, force=False):
+        t0 = time.perf_counter()
+        orig_flush(self, force)
+        busy.append(time.perf_counter() - t0)
+
+    def timed_view(view):
+        set_blocks = view.set_blocks
+
+        def timed(blocks, done=None):
+            oldest = pending[0] if pending else time.perf_counter()
+            pending.clear()
+            in_flight[0] += 1
+
+            def painted(oldest=oldest):
+                frames.append(time.perf_counter() - oldest)
+                in_flight[0] -= 1
+
+            set_blocks(blocks, painted)
+
+        view.set_blocks = timed
+
+    SessionWidget._on_chunk, SessionWidget._flush_render = on_chunk, flush
+    try:
+        code = (REPO / "symbol_index.py").read_text(encoding="utf-8")[:4000]
+        tab = SessionWidget(code, "symbol_index.py")
+        tab.resize(900, 700)
+        tab.show()
+        _spin(app, lambda: tab.view.ready, timeout=30)
+        timed_view(tab.view)
+        busy.clear()
+        frames.clear()
+        lag = _LoopLag()
+        started = time.perf_counter()
+        tab.run_action("explain")
+        _spin(app, lambda: not tab._busy() and not tab._rendering and in_flight[0] == 0)
+        total = time.perf_counter() - started
+        result = {
+            "total_s": round(total, 4),
+            "frames": len(frames),
+            "frame_latency_p50_ms": _ms(_pct(frames, 50)),
+            "frame_latency_p95_ms": _ms(_pct(frames, 95)),
+            "gui_busy_s": round(sum(busy), 4),
+            "gui_busy_pct": round(sum(busy) / total * 100, 2) if total else 0.0,
+            **lag.stop(),
+        }
+        tab.shutdown()
+        tab.deleteLater()
+        return result
+    finally:
+        SessionWidget._on_chunk, SessionWidget._flush_render = orig_on_chunk, orig_flush
+        session_widget.TRANSCRIPT = os.environ.get("LOCALPILOT_TRANSCRIPT", "web")
+
+
+def _rss_mb(pid: int | None = None) -> float | None:
+    """Resident memory of ``pid`` and all its descendants (Linux /proc); None elsewhere."""
+    pid = pid or os.getpid()
+    try:
+        children: dict[int, list[int]] = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat", encoding="ascii") as f:
+                        ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, ValueError, IndexError):
+                    continue
+                children.setdefault(ppid, []).append(int(entry))
+        total, todo = 0, [pid]
+        while todo:
+            p = todo.pop()
+            todo += children.get(p, [])
+            try:
+                with open(f"/proc/{p}/statm", encoding="ascii") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except (OSError, ValueError):
+                continue
+        return round(total / 2**20, 1)
+    except OSError:
+        return None
+
+
+def startup_probe(renderer: str) -> dict:
+    """Run in a fresh process: import, create the app and one tab, wait until the transcript shows it."""
+    started = time.perf_counter()
+    os.environ["LOCALPILOT_TRANSCRIPT"] = renderer
+    if renderer == "web":
+        import PySide6.QtWebEngineWidgets  # noqa: F401
+    from PySide6.QtWidgets import QApplication
+    from ui.session_widget import SessionWidget
+
+    app = QApplication([])
+    imported = time.perf_counter()
+    tab = SessionWidget((REPO / "symbol_index.py").read_text(encoding="utf-8")[:4000], "symbol_index.py")
+    tab.resize(900, 700)
+    tab.show()
+    _spin(app, lambda: tab.view.ready, timeout=30)
+    shown = []
+    tab.view.set_blocks(list(tab._html) + ["<p>ready</p>"], lambda: shown.append(time.perf_counter()))
+    _spin(app, lambda: shown, timeout=30)
+    ready = shown[0] if shown else time.perf_counter()
+    result = {"import_s": round(imported - started, 4), "first_paint_s": round(ready - started, 4),
+              "rss_mb": _rss_mb()}
+    tab.shutdown()
+    return result
+
+
+def tabs_probe(count: int = TAB_COUNT, size_mb: float = TAB_FILE_MB) -> dict:
+    """Run in a fresh process: open ``count`` tabs on one large file, each with its own copy of the text.
+
+    Every tab reads the file itself, as each IDE hand-off arrives as a new string.
+    """
+    import gc
+    import tracemalloc
+
+    os.environ["LOCALPILOT_TRANSCRIPT"] = "lite"
+    from PySide6.QtWidgets import QApplication
+    from ui.session_widget import SessionWidget
+
+    app = QApplication([])
+    unit = (REPO / "symbol_index.py").read_text(encoding="utf-8")
+    path = Path(tempfile.mkdtemp(prefix="localpilot-tabs-")) / "big.py"
+    path.write_text(unit * int(size_mb * 2**20 / len(unit) + 1), encoding="utf-8")
+    lines = path.read_text(encoding="utf-8").count("\n")
+    tracemalloc.start()
+    tabs, py, rss = [], [], []
+    started = time.perf_counter()
+    for _ in range(count):
+        tabs.append(SessionWidget(path.read_text(encoding="utf-8"), path.name, filepath=str(path),
+                                  selection_range=(1, 1, lines + 1, 1)))
+        _spin(app, lambda: False, timeout=0.01)
+        gc.collect()
+        py.append(tracemalloc.get_traced_memory()[0] / 2**20)
+        rss.append(_rss_mb() or 0.0)
+    opened = time.perf_counter() - started
+    result = {"open_all_s": round(opened, 3), "py_mb": round(py[-1], 1), "rss_mb": rss[-1],
+              "py_per_tab_mb": round((py[-1] - py[0]) / max(1, count - 1), 2),
+              "rss_per_tab_mb": round((rss[-1] - rss[0]) / max(1, count - 1), 2)}
+    tracemalloc.stop()
+    for tab in tabs:
+        tab.shutdown()
+    return result
+
+
+def bench_tabs() -> dict:
+    proc = subprocess.run([sys.executable, __file__, "--tabs-probe"], capture_output=True, text=True, timeout=1800)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        raise ImportError(f"tabs probe failed: {proc.stderr.strip()[-300:]}") from None
+
+
+def bench_startup() -> dict:
+    results = {}
+    for renderer in ("web", "lite"):
+        proc = subprocess.run([sys.executable, __file__, "--startup-probe", renderer],
+                              capture_output=True, text=True, timeout=120)
+        try:
+            probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            print(f"[bench] startup probe for {renderer} failed: {proc.stderr.strip()[-300:]}", file=sys.stderr)
+            continue
+        results.update({f"{renderer}_{k}": v for k, v in probe.items() if v is not None})
+    if not results:
+        raise ImportError("no renderer could start")
+    return results
+
+
+def flatten(results: dict) -> dict[str, float]:
+    return {f"{scenario}.{key}": value
+            for scenario, metrics in results.items()
+            for key, value in metrics.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return human-readable regressions of ``current`` against ``baseline`` results."""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for key in sorted(now.keys() & before.keys()):
+        new, old = now[key], before[key]
+        higher_better = key.endswith(HIGHER_IS_BETTER)
+        worse = old - new if higher_better else new - old
+        floor = next((v for suffix, v in NOISE_FLOOR.items() if key.endswith(suffix)), 0.0)
+        if worse > max(abs(old) * tolerance, floor):
+            regressions.append(f"{key}: {old:g} -> {new:g}")
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="LocalPilot end-to-end benchmarks against a replayed stream.")
+    p.add_argument("--recording", default=str(RECORDINGS / "explain_python.ndjson"))
+    p.add_argument("--rate", type=float, default=80.0, help="chunks per second the fake server sends (0 = no delay)")
+    p.add_argument("--chunk", type=int, default=0, help="characters per chunk (0 = recorded token sizes)")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    p.add_argument("--out", help="write the results JSON here (default: stdout)")
+    p.add_argument("--baseline", help="compare against this results JSON; exit 1 on regressions")
+    p.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 0.15)")
+    p.add_argument("--startup-probe", choices=("web", "lite"), help=argparse.SUPPRESS)  # used by the startup scenario
+    p.add_argument("--tabs-probe", action="store_true", help=argparse.SUPPRESS)  # used by the tabs scenario
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if args.startup_probe:
+        print(json.dumps(startup_probe(args.startup_probe)))
+        return 0
+    if args.tabs_probe:
+        print(json.dumps(tabs_probe()))
+        return 0
+    wanted = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+
+    with replay_server(args.recording, args.rate, args.chunk, model=MODEL) as server:
+        # configure before the first import of config: the fake server is the only endpoint
+        os.environ.update({"OLLAMA_URL": server.base_url, "OLLAMA_URLS": "", "MODEL_LIST": MODEL, "EMBED_MODEL": "",
+                           "SYMBOL_CONTEXT_TOKENS": "0", "LOCALPILOT_SPECULATE": "0",
+                           "LOCALPILOT_CACHE": tempfile.mkdtemp(prefix="localpilot-bench-")})
+        tokens = server.tokens
+        ideal = len(tokens) * server.token_delay
+        results: dict = {}
+        skipped: dict = {}
+        for name in wanted:
+            print(f"[bench] {name}…", file=sys.stderr)
+            try:
+                if name == "stream":
+                    results[name] = bench_stream(len(tokens), ideal)
+                elif name == "markdown":
+                    results[name] = bench_markdown(tokens, args.rate or 1000.0)
+                elif name == "worker":
+                    results[name] = bench_worker()
+                elif name == "ui":
+                    results[name] = bench_ui("web")
+                elif name == "ui_lite":
+                    results[name] = bench_ui("lite")
+                elif name == "startup":
+                    results[name] = bench_startup()
+                elif name == "tabs":
+                    results[name] = bench_tabs()
+                else:
+                    skipped[name] = "unknown scenario"
+            except ImportError as e:
+                skipped[name] = f"unavailable: {e}"
+                print(f"[bench] {name} skipped ({e})", file=sys.stderr)
+
+    report = {
+        "version": 1,
+        "config": {"recording": Path(args.recording).name, "rate": args.rate, "chunk": args.chunk,
+                   "chunks": len(tokens), "python": platform.python_version(), "platform": platform.platform(),
+                   "median_chunk_chars": statistics.median(len(t) for t in tokens)},
+        "results": results,
+        "skipped": skipped,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("config", {}).get("rate") != args.rate or baseline.get("config", {}).get("chunk") != args.chunk:
+            print("[bench] warning: baseline was recorded with a different --rate/--chunk", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for r in regressions:
+            print(f"[bench] REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("[bench] no regressions against baseline", file=sys.stderr)
+    return 0
+
+
+def _close_qt() -> None:
+    """Join the app's background threads, then destroy the QApplication while the interpreter is still whole."""
+    if "PySide6.QtCore" not in sys.modules:
+        return
+    import gc
+
+    from PySide6.QtCore import QCoreApplication, QEvent
+
+    app = QCoreApplication.instance()
+    if app is None:
+        return
+    session_widget = sys.modules.get("ui.session_widget")
+    if session_widget is not None:
+        session_widget.join_background_threads()
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+    app.shutdown()
+    gc.collect()
+
+
+if __name__ == "__main__":
+    code = main()
+    _close_qt()
+    sys.exit(code)
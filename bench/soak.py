@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Long-session memory soak: IPC hand-offs, chats and tab closes against a replayed stream.
+
+Each cycle opens a tab through the single-instance socket (as a second ``app.py``
+launch does), asks ``--questions`` questions, then closes the tab. After every
+cycle, Python allocations (tracemalloc) and process RSS are sampled. The
+per-cycle growth is the least-squares slope over the cycles after ``--warmup``.
+The run fails (exit 1) when either slope is above its threshold, and prints the
+allocation sites that grew the most.
+
+Examples:
+  python bench/soak.py --cycles 300
+  python bench/soak.py --cycles 100 --questions 3 --renderer web --out soak.json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO))
+
+from bench.replay import RECORDINGS, replay_server  # noqa: E402
+from bench.run_bench import _rss_mb, _spin  # noqa: E402
+
+MODEL = "bench"
+
+
+def slope(values: list[float]) -> float:
+    """Least-squares growth per step of ``values`` (0.0 for fewer than two)."""
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean_x, mean_y = (n - 1) / 2, sum(values) / n
+    var = sum((x - mean_x) ** 2 for x in range(n))
+    return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / var
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Drive LocalPilot for many tab cycles and fail on memory growth.")
+    p.add_argument("--cycles", type=int, default=200, help="tabs to open, chat in and close")
+    p.add_argument("--questions", type=int, default=2, help="questions per tab")
+    p.add_argument("--warmup", type=int, default=20, help="cycles ignored for the growth slopes (caches filling)")
+    p.add_argument("--max-py-kb", type=float, default=4.0, help="allowed Python heap growth per cycle (KiB)")
+    p.add_argument("--max-rss-kb", type=float, default=64.0, help="allowed RSS growth per cycle (KiB)")
+    p.add_argument("--renderer", choices=("lite", "web"), default="lite", help="transcript renderer to soak")
+    p.add_argument("--recording", default=str(RECORDINGS / "explain_python.ndjson"))
+    p.add_argument("--chunk", type=int, default=48, help="characters per streamed chunk")
+    p.add_argument("--out", help="write per-cycle samples and the verdict as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with replay_server(args.recording, 0, args.chunk, model=MODEL) as server:
+        # a private socket name, so the soak never talks to (or replaces) a running LocalPilot
+        os.environ.update({"OLLAMA_URL": server.base_url, "OLLAMA_URLS": "", "MODEL_LIST": MODEL, "EMBED_MODEL": "",
+                           "SYMBOL_CONTEXT_TOKENS": "0", "LOCALPILOT_SPECULATE": "0", "LOCALPILOT_API_PORT": "0",
+                           "LOCALPILOT_TRANSCRIPT": args.renderer, "LOCALPILOT_SOCKET": f"LocalPilot-soak-{os.getpid()}",
+                           "LOCALPILOT_CACHE": tempfile.mkdtemp(prefix="localpilot-soak-")})
+        if args.renderer == "web":
+            import PySide6.QtWebEngineWidgets  # noqa: F401
+        from PySide6.QtCore import QCoreApplication, QEvent
+        from PySide6.QtWidgets import QApplication
+
+        from ipc import send_open_session
+        from ui.main_window import MainWindow
+        from ui.session_widget import join_background_threads
+
+        app = QApplication([])
+        win = MainWindow("", "soak")  # the first tab stays open: closing the last one closes the window
+        win.listen_ipc()
+        code = (REPO / "symbol_index.py").read_text(encoding="utf-8")[:3000]
+
+        def settle():
+            for _ in range(3):
+                _spin(app, lambda: False, timeout=0.01)
+                QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+            gc.collect()
+
+        tracemalloc.start(10)
+        samples: list[dict] = []
+        baseline = None
+        started = time.perf_counter()
+        for cycle in range(args.cycles):
+            if not send_open_session(code, f"soak_{cycle}.py"):
+                print("[soak] could not reach the window's socket", file=sys.stderr)
+                return 2
+            _spin(app, lambda: win.tabs.count() == 2, timeout=10)
+            tab = win.tabs.widget(1)
+            for q in range(args.questions):
+                tab.input.setPlainText(f"Question {q} about cycle {cycle}?")
+                tab._send_message_same_tab()
+                _spin(app, lambda: tab.status.currentMessage().startswith(("Done", "[Error]", "Error")), timeout=30)
+            tab = None
+            win.close_tab(1)
+            server.requests.clear()  # the fake server's request log is the harness's memory, not the app's
+            settle()
+            py_bytes = tracemalloc.get_traced_memory()[0]
+            samples.append({"cycle": cycle, "py_kb": round(py_bytes / 1024, 1), "rss_mb": _rss_mb(),
+                            "objects": len(gc.get_objects())})
+            if cycle == args.warmup - 1:
+                baseline = tracemalloc.take_snapshot()
+            if cycle % 25 == 0:
+                print(f"[soak] cycle {cycle}: python {samples[-1]['py_kb']:.0f} KiB, rss {samples[-1]['rss_mb']} MB",
+                      file=sys.stderr)
+
+        measured = samples[args.warmup:]
+        py_growth = slope([s["py_kb"] for s in measured])
+        rss = [s["rss_mb"] for s in measured if s["rss_mb"] is not None]
+        rss_growth = slope(rss) * 1024 if rss else 0.0
+        failures = []
+        if py_growth > args.max_py_kb:
+            failures.append(f"Python heap grows {py_growth:.2f} KiB/cycle (limit {args.max_py_kb})")
+        if rss_growth > args.max_rss_kb:
+            failures.append(f"RSS grows {rss_growth:.1f} KiB/cycle (limit {args.max_rss_kb})")
+        if baseline is not None:
+            top = tracemalloc.take_snapshot().compare_to(baseline, "traceback")[:8]
+            print("[soak] largest allocation growth since warm-up:", file=sys.stderr)
+            for stat in top:
+                frame = stat.traceback[-1]
+                print(f"  {stat.size_diff / 1024:+8.1f} KiB {stat.count_diff:+6d} blocks  "
+                      f"{frame.filename}:{frame.lineno}", file=sys.stderr)
+        tracemalloc.stop()
+        win.close()
+        join_background_threads()
+
+    report = {
+        "cycles": args.cycles, "questions": args.questions, "renderer": args.renderer,
+        "elapsed_s": round(time.perf_counter() - started, 1),
+        "py_kb_per_cycle": round(py_growth, 3), "rss_kb_per_cycle": round(rss_growth, 1),
+        "objects_per_cycle": round(slope([s["objects"] for s in measured]), 1),
+        "failures": failures, "samples": samples,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(json.dumps({k: v for k, v in report.items() if k != "samples"}, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
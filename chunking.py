@@ -0,0 +1,138 @@
+"""Split source code into prompt-sized chunks at structural boundaries."""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from utils import estimate_tokens
+
+# Lines that start a new top-level-ish definition, keyed by ``lang_hint`` value.
+_DECL_PATTERNS = {
+    "python": r"(async\s+def|def|class)\s+\w+",
+    "java": r"((public|private|protected|static|final|abstract|synchronized|default)\s+)*"
+            r"(class|interface|enum|record|@interface|[\w<>\[\],.? ]+\s+\w+\s*\()",
+    "kotlin": r"((public|private|internal|protected|open|abstract|override|data|sealed|suspend|inline)\s+)*"
+              r"(fun|class|object|interface)\b",
+    "javascript": r"(export\s+)?(default\s+)?(async\s+)?(function\b|class\b|(const|let|var)\s+\w+\s*=)",
+    "typescript": r"(export\s+)?(default\s+)?(abstract\s+)?(async\s+)?"
+                  r"(function\b|class\b|interface\b|type\s+\w+|enum\b|(const|let|var)\s+\w+\s*[:=])",
+    "go": r"(func|type)\s",
+    "ruby": r"(def|class|module)\s",
+    "csharp": r"((public|private|protected|internal|static|sealed|abstract|override|async|virtual|partial)\s+)*"
+              r"(class|interface|struct|enum|record|[\w<>\[\],.? ]+\s+\w+\s*\()",
+    "c": r"[A-Za-z_][\w\s\*]*\s\**\w+\s*\([^;]*$",
+    "bash": r"(function\s+\w+|\w+\s*\(\)\s*\{?)",
+}
+_DECL_PATTERNS["tsx"] = _DECL_PATTERNS["typescript"]
+_DECL_PATTERNS["jsx"] = _DECL_PATTERNS["javascript"]
+_DECL_PATTERNS["cpp"] = _DECL_PATTERNS["c"]
+_DECL_PATTERNS["objectivec"] = _DECL_PATTERNS["c"]
+
+# Control-flow statements look like calls/declarations to the loose patterns above.
+_NOT_STATEMENT = r"(?!(if|else|for|while|switch|catch|return|new|throw|do|try|await|yield)\b)"
+
+# Lines that belong to the declaration that follows them.
+_PREAMBLE = re.compile(r"^\s*(@|#|//|/\*|\*|--|///)")
+
+
+@dataclass(frozen=True)
+class CodeChunk:
+    """A contiguous slice of the selection; line numbers are 1-based and inclusive."""
+    start_line: int
+    end_line: int
+    text: str
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" \t"))
+
+
+def _declaration_starts(lines: list[str], lang: str) -> list[tuple[int, int]]:
+    """Return ``(line_index, indent)`` for lines that open a definition.
+
+    Decorators, annotations and comments directly above a definition are kept
+    with it by moving the boundary up.
+    """
+    pattern = _DECL_PATTERNS.get(lang)
+    if not pattern:
+        return []
+    decl = re.compile(_NOT_STATEMENT + pattern)
+    starts: list[tuple[int, int]] = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or not decl.match(stripped):
+            continue
+        j = i
+        while j > 0 and lines[j - 1].strip() and _PREAMBLE.match(lines[j - 1]):
+            j -= 1
+        if not starts or starts[-1][0] < j:
+            starts.append((j, _indent(line)))
+    return starts
+
+
+def _segments(lines: list[str], boundaries: list[int]) -> list[tuple[int, int]]:
+    cuts = sorted({0, *boundaries, len(lines)})
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+def _hard_split(lines: list[str], start: int, end: int, max_tokens: int) -> list[tuple[int, int]]:
+    """Split an oversized segment, preferring blank lines as cut points."""
+    out: list[tuple[int, int]] = []
+    seg_start = start
+    size = 0
+    last_blank = None
+    for i in range(start, end):
+        size += estimate_tokens(lines[i])
+        if not lines[i].strip():
+            last_blank = i + 1
+        if size > max_tokens and i > seg_start:
+            cut = last_blank if last_blank and last_blank > seg_start else i
+            out.append((seg_start, cut))
+            seg_start = cut
+            size = sum(estimate_tokens(l) for l in lines[seg_start:i + 1])
+            last_blank = None
+    if seg_start < end:
+        out.append((seg_start, end))
+    return out
+
+
+def split_code(code: str, lang: str, max_tokens: int) -> list[CodeChunk]:
+    """Split ``code`` into chunks of at most ~``max_tokens`` each.
+
+    Cuts happen at the shallowest definition level that keeps every piece under
+    the budget (top-level functions/classes first, then their members), and
+    adjacent pieces are packed back together so chunks stay close to the budget.
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+    if estimate_tokens(code) <= max_tokens:
+        return [CodeChunk(1, len(lines), code)]
+
+    starts = _declaration_starts(lines, lang)
+    levels = sorted({indent for _, indent in starts})
+    segments = [(0, len(lines))]
+    for level in levels:
+        segments = _segments(lines, [i for i, indent in starts if indent <= level])
+        if all(estimate_tokens("".join(lines[a:b])) <= max_tokens for a, b in segments):
+            break
+
+    pieces: list[tuple[int, int]] = []
+    for a, b in segments:
+        if estimate_tokens("".join(lines[a:b])) > max_tokens:
+            pieces.extend(_hard_split(lines, a, b, max_tokens))
+        else:
+            pieces.append((a, b))
+
+    chunks: list[CodeChunk] = []
+    cur_start, cur_end = pieces[0]
+    cur_tokens = estimate_tokens("".join(lines[cur_start:cur_end]))
+    for a, b in pieces[1:]:
+        tokens = estimate_tokens("".join(lines[a:b]))
+        if cur_tokens + tokens <= max_tokens:
+            cur_end, cur_tokens = b, cur_tokens + tokens
+            continue
+        chunks.append(CodeChunk(cur_start + 1, cur_end, "".join(lines[cur_start:cur_end])))
+        cur_start, cur_end, cur_tokens = a, b, tokens
+    chunks.append(CodeChunk(cur_start + 1, cur_end, "".join(lines[cur_start:cur_end])))
+    return chunks
@@ -0,0 +1,202 @@
+"""Shrink pinned code before it goes into the prompt.
+
+Comments are dropped, docstrings and doc comments cut to their first line,
+long string literals and runs of data lines (generated tables, byte arrays)
+replaced with short placeholders, blank-line runs collapsed and indentation
+dedented/halved. The strategy is picked by ``lang_hint`` value; unknown
+languages only get the whitespace and literal passes. The result is meant for
+the model only: the transcript keeps showing the original selection.
+"""
+from __future__ import annotations
+
+import io
+import re
+import textwrap
+import tokenize
+from dataclasses import dataclass, field
+
+from utils import estimate_tokens
+
+LITERAL_CHARS = 160  # string literals longer than this are elided
+DATA_LINES = 8  # runs of more data-only lines than this are elided
+_GONE = "\0"  # marks removed comments so lines left empty by them can be dropped
+
+# Comment syntax per ``lang_hint`` value: (line comment prefixes, block comment (open, close) pairs)
+_C_LIKE = (("//",), (("/*", "*/"),))
+_COMMENTS = {
+    "java": _C_LIKE, "kotlin": _C_LIKE, "javascript": _C_LIKE, "jsx": _C_LIKE, "typescript": _C_LIKE,
+    "tsx": _C_LIKE, "go": _C_LIKE, "csharp": _C_LIKE, "c": _C_LIKE, "cpp": _C_LIKE, "objectivec": _C_LIKE,
+    "scss": _C_LIKE, "css": ((), (("/*", "*/"),)),
+    "ruby": (("#",), (("=begin", "=end"),)), "bash": (("#",), ()), "yaml": (("#",), ()),
+    "python": (("#",), ()),  # used when the selection does not tokenize (a fragment)
+    "sql": (("--",), (("/*", "*/"),)), "html": ((), (("<!--", "-->"),)), "xml": ((), (("<!--", "-->"),)),
+}
+_SHEBANG = re.compile(r"^#!")
+_STRING = r""""(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`"""
+_DATA_LINE = re.compile(
+    r"""^\s*(?:(?:[-+]?(?:0[xXbB][\da-fA-F_]+|\d[\d_]*\.?\d*(?:[eE][-+]?\d+)?)[lLuUfF]*|"[^"\n]{0,40}"|'[^'\n]{0,40}'"""
+    r"""|true|false|null|None|True|False|nil)\s*[,;:]?\s*|[\[\](){}]\s*[,;]?\s*)+$""")
+_COMMENT_MARK = {"python": "#", "ruby": "#", "bash": "#", "yaml": "#", "sql": "--", "html": None, "xml": None}
+
+
+@dataclass
+class Compressed:
+    text: str
+    before_tokens: int
+    after_tokens: int
+    removed: dict[str, int] = field(default_factory=dict)  # comments, docstrings, literals, data_lines
+
+    @property
+    def saved_pct(self) -> float:
+        return 100.0 * (1 - self.after_tokens / self.before_tokens) if self.before_tokens else 0.0
+
+    def summary(self) -> str:
+        """e.g. "1234 → 812 tokens (−34%): 40 comments, 3 docstrings, 2 literals elided"."""
+        parts = [f"{n} {k.replace('_', ' ')}" for k, n in self.removed.items() if n]
+        text = f"{self.before_tokens} → {self.after_tokens} tokens (−{self.saved_pct:.0f}%)"
+        return f"{text}: {', '.join(parts)} elided" if parts else text
+
+
+def compress(code: str, lang: str) -> Compressed:
+    removed = {"comments": 0, "docstrings": 0, "literals": 0, "data_lines": 0}
+    text = textwrap.dedent(code.replace("\r\n", "\n").expandtabs(4))  # an indented method still tokenizes
+    stripped = _strip_python(text, removed) if lang == "python" else None
+    if stripped is None and lang in _COMMENTS:
+        stripped = _strip_comments(text, *_COMMENTS[lang], removed)
+    text = stripped if stripped is not None else _elide_literals(text, removed)
+    text = _elide_data_runs(text, _COMMENT_MARK.get(lang, "//"), removed)
+    text = _tidy_whitespace(text)
+    return Compressed(text, estimate_tokens(code), estimate_tokens(text), removed)
+
+
+def _short_literal(literal: str, removed: dict) -> str:
+    if len(literal) <= LITERAL_CHARS:
+        return literal
+    removed["literals"] += 1
+    quote = literal[0] if literal[0] in "\"'`" else literal[-1]
+    return f"{quote}…({len(literal)} chars){quote}"
+
+
+def _elide_literals(text: str, removed: dict) -> str:
+    return re.sub(_STRING, lambda m: _short_literal(m.group(0), removed), text)
+
+
+def _strip_comments(text: str, line: tuple[str, ...], blocks: tuple[tuple[str, str], ...], removed: dict) -> str:
+    """Remove comments with a regex that also matches strings, so comment markers inside strings survive."""
+    alts = [f"(?P<s>{_STRING})"]
+    alts += [re.escape(o) + r".*?" + re.escape(c) for o, c in blocks]
+    # "#" only starts a comment after whitespace (bash "$#", "${#a[@]}")
+    alts += [(r"(?<!\S)#" if p == "#" else re.escape(p)) + r"[^\n]*" for p in line]
+    pattern = re.compile("|".join(alts), re.S)
+
+    def repl(m: re.Match) -> str:
+        if m.group("s") is not None:
+            return _short_literal(m.group(0), removed)
+        found = m.group(0)
+        if m.start() == 0 and _SHEBANG.match(found):
+            return found
+        if found.startswith("/**") and found.count("\n") > 1:  # doc comment: keep its summary line
+            first = next((l.strip(" *") for l in found[3:-2].splitlines() if l.strip(" *")), "")
+            removed["docstrings"] += 1
+            return f"/** {first} */" if first else _GONE
+        removed["comments"] += 1
+        return "\n".join([_GONE] * (found.count("\n") + 1))
+
+    return _drop_emptied(pattern.sub(repl, text))
+
+
+def _strip_python(text: str, removed: dict) -> str | None:
+    """Tokenizer-based pass for Python; None if the selection is not complete code."""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(text).readline))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    starts = [0]
+    for line in text.splitlines(keepends=True):
+        starts.append(starts[-1] + len(line))
+
+    def offset(pos):
+        return starts[pos[0] - 1] + pos[1]
+
+    edits: list[tuple[int, int, str]] = []
+    prev = None  # previous significant token
+    for i, tok in enumerate(tokens):
+        if tok.type == tokenize.COMMENT:
+            if not (tok.start == (1, 0) and tok.string.startswith("#!")):
+                removed["comments"] += 1
+                edits.append((offset(tok.start), offset(tok.end), _GONE))
+            continue
+        if tok.type in (tokenize.NL, tokenize.ENCODING):
+            continue
+        if tok.type == tokenize.STRING:
+            after = next((tokens[j] for j in range(i + 1, len(tokens))
+                          if tokens[j].type not in (tokenize.NL, tokenize.COMMENT)), None)
+            statement = (prev is None or prev.type in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT)) \
+                and (after is None or after.type in (tokenize.NEWLINE, tokenize.ENDMARKER))
+            if statement and tok.string.lstrip("rRbBuU")[:3] in ('"""', "'''"):
+                doc = _docstring_line(tok.string)
+                if doc != tok.string:
+                    removed["docstrings"] += 1
+                    edits.append((offset(tok.start), offset(tok.end), doc))
+            else:
+                short = _short_literal(tok.string, removed)
+                if short != tok.string:
+                    edits.append((offset(tok.start), offset(tok.end), short))
+        prev = tok
+    pieces, pos = [], 0
+    for start, end, new in edits:
+        pieces += [text[pos:start], new]
+        pos = end
+    return _drop_emptied("".join(pieces) + text[pos:])
+
+
+def _docstring_line(literal: str) -> str:
+    """A triple-quoted string reduced to its first non-empty line."""
+    prefix = literal[: len(literal) - len(literal.lstrip("rRbBuU"))]
+    quote = literal[len(prefix):len(prefix) + 3]
+    body = literal[len(prefix) + 3:-3]
+    first = next((l.strip() for l in body.splitlines() if l.strip()), "")
+    first = first.replace(quote, "")
+    if first.endswith(quote[0]) or first.endswith("\\"):
+        first += " "
+    return f"{prefix}{quote}{first}{quote}"
+
+
+def _drop_emptied(text: str) -> str:
+    lines = [l for l in text.split("\n") if not (_GONE in l and not l.replace(_GONE, "").strip())]
+    return "\n".join(l.replace(_GONE, "").rstrip() if _GONE in l else l for l in lines)
+
+
+def _elide_data_runs(text: str, mark: str | None, removed: dict) -> str:
+    lines = text.split("\n")
+    out: list[str] = []
+    i = 0
+    while i < len(lines):
+        j = i
+        while j < len(lines) and lines[j].strip() and "," in lines[j] and _DATA_LINE.match(lines[j]):
+            j += 1
+        if j - i > DATA_LINES:
+            indent = lines[i][: len(lines[i]) - len(lines[i].lstrip())]
+            note = f"… {j - i - 3} similar lines elided …"
+            note = f"{mark} {note}" if mark else f"<!-- {note} -->"
+            out += lines[i:i + 2] + [indent + note] + [lines[j - 1]]
+            removed["data_lines"] += j - i - 3
+            i = j
+        else:
+            out.append(lines[i])
+            i += 1
+    return "\n".join(out)
+
+
+def _tidy_whitespace(text: str) -> str:
+    """Strip trailing spaces, collapse blank-line runs, dedent, and halve 4-space indentation."""
+    lines = [l.rstrip() for l in textwrap.dedent(text).split("\n")]
+    out: list[str] = []
+    for line in lines:
+        if line or (out and out[-1]):
+            out.append(line)
+    widths = [len(l) - len(l.lstrip(" ")) for l in out if l.strip()]
+    nonzero = [w for w in widths if w]
+    if nonzero and min(nonzero) >= 4 and sum(w % 4 == 0 for w in nonzero) >= 0.8 * len(nonzero):
+        out = [" " * ((len(l) - len(l.lstrip(" "))) // 2) + l.lstrip(" ") if l else l for l in out]
+    return "\n".join(out).strip("\n")
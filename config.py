@@ -1,5 +1,7 @@
 """Runtime configuration for the local assistant."""
+import json
 import os
+import sys
 
 import requests
 
@@ -10,6 +12,12 @@ OLLAMA_BASE_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api")
 OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/chat"
 OLLAMA_TAGS_URL = f"{OLLAMA_BASE_URL}/tags"
 
+# Several servers (comma separated, e.g. "http://localhost:11434/api,http://gpu-box:11434/api");
+# requests are routed to the least-loaded healthy one that has the model.
+OLLAMA_URLS = [u.strip().rstrip("/") for u in os.environ.get("OLLAMA_URLS", "").split(",") if u.strip()] \
+    or [OLLAMA_BASE_URL]
+HEALTH_CHECK_INTERVAL = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", "15"))
+
 
 # ---------------------------------------------------------------------------
 # Model/runtime
@@ -20,7 +28,7 @@ def fetch_ollama_models() -> list[str]:
 
     Preference order:
     1. ``MODEL_LIST`` environment variable (comma separated)
-    2. Query the local Ollama instance for models
+    2. Query the Ollama instance(s) for models (union, in endpoint order)
     """
 
     env = os.environ.get("MODEL_LIST")
@@ -29,31 +37,32 @@ def fetch_ollama_models() -> list[str]:
         if models:
             return models
 
-    try:
-        r = requests.get(OLLAMA_TAGS_URL, timeout=1)
-        r.raise_for_status()
-        data = r.json()
-        models = []
-        for m in data.get("models", []):
-            name = m.get("name") or m.get("model")
-            if name:
-                models.append(name)
-        if models:
-            return models
-    except Exception:
-        pass
+    models: list[str] = []
+    for url in OLLAMA_URLS:
+        try:
+            r = requests.get(f"{url}/tags", timeout=1)
+            r.raise_for_status()
+            data = r.json()
+            for m in data.get("models", []):
+                name = m.get("name") or m.get("model")
+                if name and name not in models:
+                    models.append(name)
+        except Exception:
+            pass
 
-    return []
+    return models
 
 
 def is_ollama_running() -> bool:
-    """Return True if the Ollama server responds, False otherwise."""
-    try:
-        r = requests.get(OLLAMA_TAGS_URL, timeout=1)
-        r.raise_for_status()
-        return True
-    except Exception:
-        return False
+    """Return True if any configured Ollama server responds, False otherwise."""
+    for url in OLLAMA_URLS:
+        try:
+            r = requests.get(f"{url}/tags", timeout=1)
+            r.raise_for_status()
+            return True
+        except Exception:
+            pass
+    return False
 
 
 MODEL_LIST = fetch_ollama_models()
@@ -64,3 +73,88 @@ TEMP = 0.2
 # Context window for chat requests (increase if you pin long code)
 NUM_CTX = 16384  # adjust build/model supports it
 KEEP_ALIVE = "10m"  # keep loaded between requests
+
+# Concurrent requests the server accepts (mirror OLLAMA_NUM_PARALLEL of `ollama serve`)
+NUM_PARALLEL = max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", "2")))
+
+# Selections above this estimate are analysed in parallel chunks (map-reduce)
+LARGE_SELECTION_TOKENS = int(os.environ.get("LARGE_SELECTION_TOKENS", "6000"))
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "3000"))
+
+# Local caches (project indexes, metrics, ...)
+CACHE_DIR = os.environ.get("LOCALPILOT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "localpilot"))
+
+# Budget for project definitions added to the pinned context (0 disables enrichment)
+SYMBOL_CONTEXT_TOKENS = int(os.environ.get("SYMBOL_CONTEXT_TOKENS", "1500"))
+
+# Semantic retrieval over the project (opt-in, e.g. EMBED_MODEL=nomic-embed-text; empty disables it)
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "")
+EMBED_BATCH = int(os.environ.get("EMBED_BATCH", "32"))
+EMBED_CHUNK_TOKENS = 512
+RETRIEVAL_TOKENS = int(os.environ.get("RETRIEVAL_TOKENS", "1200"))
+RETRIEVAL_TOP_K = 4
+
+# Pre-generate the most likely first action when a tab opens (opt-in)
+SPECULATE = os.environ.get("LOCALPILOT_SPECULATE", "0") == "1"
+
+# Latency watchdog: give up on a server that does not connect, never sends a first
+# token, or stops mid-answer, and retry on another endpoint (or the fallback model)
+CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "3"))
+TTFT_TIMEOUT = float(os.environ.get("OLLAMA_TTFT_TIMEOUT", "120"))  # includes model load
+STALL_TIMEOUT = float(os.environ.get("OLLAMA_STALL_TIMEOUT", "30"))
+STATUS_DELAY = 1.0  # report the waiting phase once the first token is this late
+FALLBACK_MODEL = os.environ.get("FALLBACK_MODEL", "")  # smaller model to use when the chosen one is too slow
+
+# Refactor/Performance/Simplify answer with a unified diff that is applied locally:
+# "auto" for selections of at least DIFF_MIN_LINES lines, "on" always, "off" never
+DIFF_MODE = os.environ.get("LOCALPILOT_DIFF_MODE", "auto")
+DIFF_MIN_LINES = int(os.environ.get("DIFF_MIN_LINES", "40"))
+
+# "Auto" model routing: small/latency-sensitive requests go to the strongest model predicted
+# to answer within LATENCY_TARGET seconds, edits of large selections to the strongest model.
+# Strength is read from the model tag ("7b" > "1.5b") unless set explicitly here.
+LATENCY_TARGET = float(os.environ.get("LOCALPILOT_LATENCY_TARGET", "1.0"))
+ROUTE_SMALL_TOKENS = int(os.environ.get("ROUTE_SMALL_TOKENS", "800"))
+ROUTE_FAST_MODEL = os.environ.get("ROUTE_FAST_MODEL", "")
+ROUTE_STRONG_MODEL = os.environ.get("ROUTE_STRONG_MODEL", "")
+
+
+def _load_profiles(path: str) -> dict:
+    """Per-model generation profile overrides (see ``utils.generation_profile``)."""
+    if not path:
+        return {}
+    try:
+        with open(os.path.expanduser(path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[config] ignoring LOCALPILOT_PROFILES ({e})", file=sys.stderr)
+        return {}
+
+
+# JSON file overriding num_predict/stop/stop_after_fence per model and action, e.g.
+# {"qwen2.5-coder:1.5b": {"explain": {"num_predict": 400}}, "*": {"refactor": {"stop_after_fence": false}}}
+MODEL_PROFILES = _load_profiles(os.environ.get("LOCALPILOT_PROFILES", ""))
+
+# Strip comments/docstrings and elide large literals from the pinned code sent to the model
+# (the transcript still shows the original); each tab has its own toggle, this is the default
+COMPRESS_CONTEXT = os.environ.get("LOCALPILOT_COMPRESS", "0") == "1"
+
+# Local socket of the single-instance window (set a different name to run a separate instance)
+SOCKET_NAME = os.environ.get("LOCALPILOT_SOCKET", "LocalPilot")
+
+# Transcript renderer: "web" (QtWebEngine: full HTML/CSS, highlight.js) or "lite" (native Qt text
+# widget: no Chromium process, much less memory and a faster start; sections show stacked)
+TRANSCRIPT = os.environ.get("LOCALPILOT_TRANSCRIPT", "web").strip().lower()
+
+# Watch the tab's --filepath and send edits to the pinned lines as a diff with the next message
+# (each tab has its own toggle, this is the default)
+WATCH_PINNED = os.environ.get("LOCALPILOT_WATCH", "1") == "1"
+
+# OpenAI-compatible API for other local tools (0 = off), e.g. LOCALPILOT_API_PORT=11435 and
+# base_url http://127.0.0.1:11435/v1; requests share the tabs' endpoints and server slots
+API_PORT = int(os.environ.get("LOCALPILOT_API_PORT", "0"))
+API_KEY = os.environ.get("LOCALPILOT_API_KEY", "")  # if set, clients must send "Authorization: Bearer <key>"
+
+# Journal streamed answers to CACHE_DIR/sessions so tabs and interrupted answers are recovered
+# after a crash (closed tabs are forgotten)
+JOURNAL = os.environ.get("LOCALPILOT_JOURNAL", "1") == "1"
@@ -0,0 +1,125 @@
+"""Process-wide single copies of large texts: pinned code, prompts and messages.
+
+Tabs opened on the same selection (several IDE hand-offs of one file, or
+forks) would otherwise each hold the code, the system prompt built from it,
+its escaped transcript block, its compressed variant and the file's lines.
+``STORE`` keeps each distinct text once, keyed by a digest of its content, and
+counts the ``SharedText`` and ``Message`` objects that reference it. Values
+derived from a text (``SharedText.derived``) are computed once and kept with
+it. The text and its derived values are dropped with the last reference.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class ContentStore:
+    """Texts by content digest, with reference counts and per-text derived values."""
+
+    def __init__(self):
+        self._entries: dict[str, list] = {}  # key -> [text, references, derived values or None]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+    def acquire(self, text: str) -> str:
+        """Reference ``text`` (stored unless an equal text already is); returns its key."""
+        key = self.digest(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [text, 1, None]
+            else:
+                entry[1] += 1
+        return key
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._entries[key]
+
+    def text(self, key: str) -> str:
+        return self._entries[key][0]
+
+    def derived(self, key: str, name: Hashable, make: Callable[[], T]) -> T:
+        """``make()`` computed once per text and ``name``, e.g. the text's compressed form."""
+        entry = self._entries[key]
+        if entry[2] is None:
+            entry[2] = {}
+        if name not in entry[2]:
+            entry[2][name] = make()  # unlocked: two tabs may both compute it, one result is kept
+        return entry[2][name]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"texts": len(self._entries), "chars": sum(len(e[0]) for e in self._entries.values()),
+                    "references": sum(e[1] for e in self._entries.values())}
+
+
+STORE = ContentStore()
+
+
+class SharedText:
+    """A reference to one text in ``STORE``: equal texts share a single string."""
+    __slots__ = ("key",)
+
+    def __init__(self, text: str):
+        self.key = STORE.acquire(text)
+
+    @property
+    def text(self) -> str:
+        return STORE.text(self.key)
+
+    def derived(self, name: Hashable, make: Callable[[], T]) -> T:
+        return STORE.derived(self.key, name, make)
+
+    def __del__(self):
+        try:
+            STORE.release(self.key)
+        except Exception:  # __init__ failed, or the interpreter is shutting down
+            pass
+
+
+class Message(SharedText):
+    """One chat message, immutable, with its content in ``STORE``.
+
+    Reads like the message dicts it replaces (``msg["content"]``, ``msg.get("role")``),
+    so prompt builders accept either.
+    """
+    __slots__ = ("role",)
+
+    def __init__(self, role: str, content: str):
+        super().__init__(content)
+        self.role = role
+
+    @property
+    def content(self) -> str:
+        return STORE.text(self.key)
+
+    def __getitem__(self, name: str) -> str:
+        if name == "role":
+            return self.role
+        if name == "content":
+            return self.content
+        raise KeyError(name)
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def as_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self) -> str:
+        return f"Message({self.role!r}, {self.content[:40]!r})"
@@ -0,0 +1,214 @@
+"""Parse and apply the unified diffs that diff-mode actions ask the model for.
+
+Models get line numbers wrong far more often than context lines, so hunks are
+located by their context/removed lines (searching forward from the previous
+hunk, preferring the stated position) rather than trusted by number.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+from utils import FENCE
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_DIFF_LANGS = ("diff", "patch", "udiff")
+
+
+class DiffError(ValueError):
+    """The diff is malformed or does not match the original code."""
+
+
+@dataclass
+class Hunk:
+    old_start: int  # 1-based, as stated by the model (only a hint)
+    lines: list[str] = field(default_factory=list)  # each starts with " ", "-" or "+"
+
+    @property
+    def old(self) -> list[str]:
+        return [l[1:] for l in self.lines if l[:1] in (" ", "-")]
+
+    @property
+    def new(self) -> list[str]:
+        return [l[1:] for l in self.lines if l[:1] in (" ", "+")]
+
+
+def parse_hunks(diff: str) -> list[Hunk]:
+    """Hunks of a unified diff; file headers and "\\ No newline" markers are ignored."""
+    hunks: list[Hunk] = []
+    lines = diff.splitlines()
+    for i, line in enumerate(lines):
+        m = _HUNK_HEADER.match(line)
+        if m:
+            hunks.append(Hunk(int(m.group(1))))
+            continue
+        nxt = lines[i + 1] if i + 1 < len(lines) else ""
+        file_header = (line.startswith("--- ") and nxt.startswith("+++ ")) or \
+            (line.startswith("+++ ") and i > 0 and lines[i - 1].startswith("--- "))
+        if not hunks or file_header or line.startswith(("\\", "diff --git", "index ")):
+            continue
+        if line == "":
+            line = " "  # editors and models drop the space of empty context lines
+        if line[0] not in " +-":
+            raise DiffError(f"unexpected line in hunk: {line[:40]!r}")
+        hunks[-1].lines.append(line)
+    if not hunks:
+        raise DiffError("no hunks found")
+    for hunk in hunks:
+        # trailing context does not change the result; blank ones are often padding before the fence
+        while hunk.lines and hunk.lines[-1].strip() == "":
+            hunk.lines.pop()
+    return hunks
+
+
+def _matches(lines: list[str], at: int, old: list[str], loose: bool) -> bool:
+    if at < 0 or at + len(old) > len(lines):
+        return False
+    if loose:
+        return all(a.rstrip() == b.rstrip() for a, b in zip(lines[at:at + len(old)], old))
+    return lines[at:at + len(old)] == old
+
+
+def locate(lines: list[str], hunk: Hunk, start: int) -> int:
+    """Index in ``lines`` (at or after ``start``) where ``hunk``'s old lines are; raises DiffError."""
+    old = hunk.old
+    if not old:  # pure insertion: trust the stated position
+        return min(max(start, hunk.old_start), len(lines))
+    hint = hunk.old_start - 1
+    for loose in (False, True):
+        if hint >= start and _matches(lines, hint, old, loose):
+            return hint
+        for at in range(start, len(lines) - len(old) + 1):
+            if _matches(lines, at, old, loose):
+                return at
+    raise DiffError(f"hunk @@ -{hunk.old_start} does not match the code: {old[0][:60]!r}")
+
+
+def apply_hunks(original: str, hunks: list[Hunk]) -> str:
+    lines = original.splitlines()
+    out: list[str] = []
+    pos = 0
+    for hunk in hunks:
+        at = locate(lines, hunk, pos)
+        out.extend(lines[pos:at])
+        out.extend(hunk.new)
+        pos = at + len(hunk.old)
+    out.extend(lines[pos:])
+    return "\n".join(out) + ("\n" if original.endswith("\n") else "")
+
+
+def extract_diff(markdown: str) -> str | None:
+    """Body of the first ```diff fence (or of the first fence that looks like a diff)."""
+    body: list[str] | None = None
+    is_diff = False
+    for line in markdown.splitlines():
+        m = FENCE.match(line)
+        if body is None:
+            if m:
+                body, is_diff = [], m.group(2) in _DIFF_LANGS
+            continue
+        if m and not m.group(2):
+            text = "\n".join(body)
+            if is_diff or _HUNK_HEADER.search(text):
+                return text
+            body = None
+            continue
+        body.append(line)
+    if body is not None and (is_diff or any(_HUNK_HEADER.match(l) for l in body)):
+        return "\n".join(body)  # unterminated fence at the end of the answer
+    return None
+
+
+def apply_markdown_diff(original: str, markdown: str) -> str:
+    """Apply the diff contained in a model answer to ``original``; raises DiffError."""
+    diff = extract_diff(markdown)
+    if diff is None:
+        raise DiffError("the answer contains no diff")
+    return apply_hunks(original, parse_hunks(diff))
+
+
+class StreamingDiffCheck:
+    """Validates hunks as the answer streams in, so a bad diff is caught early.
+
+    ``feed()`` returns an error message as soon as a complete hunk fails to
+    match the original (or the answer starts a non-diff code block first);
+    otherwise None. Each line of the answer is looked at once, as it completes,
+    following the same rules as ``extract_diff`` and ``parse_hunks``.
+    """
+
+    def __init__(self, original: str):
+        self.lines = original.splitlines()
+        self.text = ""
+        self.error: str | None = None
+        self._pos = 0  # original line index after the last validated hunk
+        self._tail = ""  # the incomplete last line
+        self._in_fence = False
+        self._is_diff = False  # the open fence is labelled as a diff
+        self._hunk: Hunk | None = None  # hunk still receiving lines
+        self._held: str | None = None  # a "--- " line: a file header if "+++ " follows
+        self._done = False  # the diff fence is closed: later text is not checked
+
+    def feed(self, chunk: str) -> str | None:
+        self.text += chunk
+        if self.error or self._done:
+            return self.error
+        lines = (self._tail + chunk).split("\n")
+        self._tail = lines.pop()
+        try:
+            for line in lines:
+                self._line(line)
+                if self._done:
+                    break
+        except DiffError as e:
+            self.error = str(e)
+        return self.error
+
+    def _line(self, line: str) -> None:
+        m = FENCE.match(line)
+        if not self._in_fence:
+            if m:
+                lang = m.group(2)
+                if lang and lang not in _DIFF_LANGS:
+                    raise DiffError(f"the answer started a {lang} block instead of a diff")
+                self._in_fence, self._is_diff, self._hunk, self._held = True, bool(lang), None, None
+            return
+        if m and not m.group(2):  # closing fence
+            if self._held is not None:
+                self._hunk_line(self._held)
+            if self._hunk is not None or self._is_diff:
+                self._close_hunk()
+                self._done = True
+            self._in_fence = False
+            return
+        if self._held is not None:
+            held, self._held = self._held, None
+            if line.startswith("+++ "):
+                return  # file header pair
+            self._hunk_line(held)
+        if line.startswith("--- "):
+            self._held = line
+        else:
+            self._hunk_line(line)
+
+    def _hunk_line(self, line: str) -> None:
+        m = _HUNK_HEADER.match(line)
+        if m:
+            self._close_hunk()
+            self._hunk = Hunk(int(m.group(1)))
+            return
+        if self._hunk is None or line.startswith(("\\", "diff --git", "index ")):
+            return
+        if line == "":
+            line = " "
+        if line[0] not in " +-":
+            raise DiffError(f"unexpected line in hunk: {line[:40]!r}")
+        self._hunk.lines.append(line)
+
+    def _close_hunk(self) -> None:
+        hunk, self._hunk = self._hunk, None
+        if hunk is None:
+            return
+        while hunk.lines and hunk.lines[-1].strip() == "":
+            hunk.lines.pop()
+        at = locate(self.lines, hunk, self._pos)
+        self._pos = at + len(hunk.old)
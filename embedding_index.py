@@ -0,0 +1,287 @@
+"""Semantic retrieval over the project through Ollama embeddings."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from chunking import split_code
+from config import (
+    CACHE_DIR, EMBED_BATCH, EMBED_CHUNK_TOKENS, EMBED_MODEL, RETRIEVAL_TOKENS, RETRIEVAL_TOP_K,
+)
+from endpoints import POOL
+from scheduler import PRIORITY_BACKGROUND, SCHEDULER
+from symbol_index import MAX_FILE_BYTES, find_project_root, iter_source_files
+from utils import estimate_tokens
+
+INDEX_VERSION = 1
+
+_CODE_WORD = re.compile(r"`([^`]+)`|\b([A-Za-z_]\w*\(\)|[a-z]+_[a-z_\d]+|[a-z]+[A-Z]\w*|[A-Z][a-z\d]+[A-Z]\w*)")
+_OUTSIDE_HINTS = re.compile(
+    r"\b(where (is|are)|who calls|called from|callers?|used (by|in)|usages?|elsewhere|other files?|"
+    r"the (rest of the )?(project|codebase|repo)|defined)\b",
+    re.IGNORECASE,
+)
+
+
+def _server(model: str, base_url: str | None) -> str:
+    """``base_url``, or the endpoint the pool would send ``model`` to."""
+    return base_url or POOL.choose(model).url
+
+
+def embed_texts(texts: list[str], model: str = EMBED_MODEL, base_url: str | None = None,
+                batch_size: int = EMBED_BATCH, timeout: float = 60) -> np.ndarray:
+    """Embed ``texts`` in batched ``/api/embed`` calls; rows are L2-normalised float32.
+
+    Each batch waits for a server slot at background priority, so a reindex never
+    takes a slot an interactive request is waiting for. Without ``base_url`` the
+    batch goes to the endpoint the pool picks.
+    """
+    rows: list[list[float]] = []
+    for i in range(0, len(texts), max(1, batch_size)):
+        ep = POOL.choose(model) if base_url is None else None
+        with SCHEDULER.slot(PRIORITY_BACKGROUND), (POOL.use(ep) if ep else nullcontext()):
+            r = requests.post(
+                f"{ep.url if ep else base_url}/embed",
+                headers={"Content-Type": "application/json"},
+                data=json.dumps({"model": model, "input": texts[i:i + batch_size]}),
+                timeout=timeout,
+            )
+        r.raise_for_status()
+        rows.extend(r.json()["embeddings"])
+    vecs = np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vecs / norms
+
+
+_INSTALLED: dict[tuple[str, str], bool] = {}
+
+
+def model_installed(model: str, base_url: str | None = None) -> bool:
+    """Whether the server at ``base_url`` (default: the pool's pick) has ``model``.
+
+    Asked once per process (again if the server was unreachable).
+    """
+    url = _server(model, base_url)
+    key = (url, model)
+    if key not in _INSTALLED:
+        try:
+            r = requests.get(f"{url}/tags", timeout=2)
+            r.raise_for_status()
+            names = {m.get("name") or m.get("model") for m in r.json().get("models", [])}
+        except (requests.RequestException, ValueError):
+            return False
+        _INSTALLED[key] = model in names or f"{model}:latest" in names
+        if not _INSTALLED[key]:
+            print(f"[embedding_index] {model} is not installed (ollama pull {model}); project retrieval is off",
+                  file=sys.stderr)
+    return _INSTALLED[key]
+
+
+def mentions_outside_code(question: str, selection: str) -> bool:
+    """True when ``question`` names code that is not in ``selection`` or asks about the wider project."""
+    if _OUTSIDE_HINTS.search(question):
+        return True
+    for m in _CODE_WORD.finditer(question):
+        word = (m.group(1) or m.group(2)).rstrip("()").strip()
+        if word and word not in selection:
+            return True
+    return False
+
+
+class EmbeddingIndex:
+    """Chunk vectors for every source file under ``root``.
+
+    Vectors live in ``vectors.npy`` (memory-mapped for search) next to an
+    ``index.json`` describing each row. Updates re-chunk only files whose
+    mtime/size and content hash changed, and chunks whose text hash is already
+    in the index reuse the stored vector instead of calling the server again.
+    """
+
+    def __init__(self, root: str, model: str = EMBED_MODEL, cache_dir: str = CACHE_DIR,
+                 base_url: str | None = None):
+        self.root = str(Path(root).resolve())
+        self.model = model
+        self.base_url = base_url
+        key = hashlib.sha1(f"{self.root}\0{model}".encode("utf-8")).hexdigest()[:16]
+        self.dir = Path(cache_dir).expanduser() / "embeddings" / key
+        self._files: dict[str, dict] = {}
+        self._rows: list[tuple[str, int, int, str]] = []  # (relpath, start_line, end_line, chunk hash)
+        self._vectors: np.ndarray | None = None
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.ready = threading.Event()
+        self._load()
+
+    # persistence
+    def _load(self) -> None:
+        try:
+            meta = json.loads((self.dir / "index.json").read_text(encoding="utf-8"))
+            if meta.get("version") != INDEX_VERSION or meta.get("root") != self.root:
+                return
+            vectors = np.load(self.dir / "vectors.npy", mmap_mode="r")
+            rows = [tuple(r) for r in meta.get("rows", [])]
+            if len(rows) != len(vectors):
+                return
+            self._files, self._rows, self._vectors = meta.get("files", {}), rows, vectors
+            self.ready.set()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self, files: dict, rows: list, vectors: np.ndarray) -> np.ndarray:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / "vectors.tmp.npy"
+        np.save(tmp, vectors)
+        os.replace(tmp, self.dir / "vectors.npy")
+        meta = {"version": INDEX_VERSION, "root": self.root, "model": self.model, "files": files, "rows": rows}
+        (self.dir / "index.tmp.json").write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(self.dir / "index.tmp.json", self.dir / "index.json")
+        return np.load(self.dir / "vectors.npy", mmap_mode="r")
+
+    # indexing
+    def update(self) -> int:
+        """Re-scan the tree; return the number of chunks sent to the embeddings endpoint."""
+        files: dict[str, dict] = {}
+        pending: dict[str, str] = {}  # chunk hash -> text to embed
+        for path, lang in iter_source_files(self.root):
+            rel = os.path.relpath(path, self.root)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            old = self._files.get(rel)
+            if old and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+                files[rel] = old
+                continue
+            if st.st_size > MAX_FILE_BYTES:
+                continue
+            try:
+                raw = Path(path).read_bytes()
+            except OSError:
+                continue
+            digest = hashlib.sha1(raw).hexdigest()
+            if old and old["hash"] == digest:
+                files[rel] = {**old, "mtime": st.st_mtime, "size": st.st_size}
+                continue
+            chunks = []
+            for c in split_code(raw.decode("utf-8", errors="replace"), lang, EMBED_CHUNK_TOKENS):
+                if not c.text.strip():
+                    continue
+                text = f"{rel}\n{c.text}"
+                h = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                chunks.append([c.start_line, c.end_line, h])
+                pending[h] = text
+            files[rel] = {"mtime": st.st_mtime, "size": st.st_size, "hash": digest, "chunks": chunks}
+
+        rows = [(rel, start, end, h) for rel, entry in files.items() for start, end, h in entry["chunks"]]
+        known = {r[3]: i for i, r in enumerate(self._rows)}
+        for h in list(pending):
+            if h in known:
+                del pending[h]
+        if files == self._files and rows == self._rows and self._vectors is not None:
+            self.ready.set()
+            return 0
+
+        fresh = dict(zip(pending, embed_texts(list(pending.values()), self.model, self.base_url))) if pending else {}
+        if fresh:
+            dim = len(next(iter(fresh.values())))
+        else:
+            dim = self._vectors.shape[1] if self._vectors is not None else 0
+        vectors = np.zeros((len(rows), dim), dtype=np.float32)
+        for i, (_, _, _, h) in enumerate(rows):
+            vectors[i] = fresh[h] if h in fresh else self._vectors[known[h]]
+        mapped = self._save(files, [list(r) for r in rows], vectors)
+        with self._lock:
+            self._files, self._rows, self._vectors = files, rows, mapped
+        self.ready.set()
+        return len(pending)
+
+    def refresh_async(self) -> None:
+        """Start a background update unless one is already running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._safe_update, daemon=True, name="embedding-index")
+            self._thread.start()
+
+    def _safe_update(self) -> None:
+        if not model_installed(self.model, self.base_url):
+            return
+        try:
+            self.update()
+        except Exception as e:
+            print(f"[embedding_index] update failed: {e}", file=sys.stderr)
+
+    # search
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> list[dict]:
+        """Top-``k`` chunks by cosine similarity to ``query``."""
+        with self._lock:
+            rows, vectors = self._rows, self._vectors
+        if vectors is None or not len(rows):
+            return []
+        q = embed_texts([query], self.model, self.base_url, timeout=10)[0]
+        scores = vectors @ q
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = []
+        for i in top:
+            rel, start, end, _ = rows[i]
+            try:
+                with open(os.path.join(self.root, rel), "r", encoding="utf-8", errors="replace") as f:
+                    code = "".join(f.readlines()[start - 1:end])
+            except OSError:
+                continue
+            hits.append({"path": rel, "start_line": start, "end_line": end, "score": float(scores[i]), "code": code})
+        return hits
+
+    def context_for(self, question: str, selection: str, budget_tokens: int = RETRIEVAL_TOKENS) -> list[dict]:
+        """Hits for ``question`` that are not part of ``selection``, within ``budget_tokens``."""
+        if not self.ready.is_set() or budget_tokens <= 0 or _INSTALLED.get((_server(self.model, self.base_url), self.model)) is False:
+            return []  # vectors cached on disk are of no use once the model is gone: queries cannot be embedded
+        out, used = [], 0
+        for hit in self.search(question):
+            code = hit["code"].strip()
+            if not code or code in selection or selection.strip() and selection.strip() in code:
+                continue
+            cost = estimate_tokens(code) + 16
+            if used + cost > budget_tokens:
+                continue
+            used += cost
+            out.append(hit)
+        return out
+
+
+def format_hits(hits: list[dict], lang_of) -> str:
+    """Markdown block of retrieved chunks; ``lang_of`` maps a path to a fence language."""
+    parts = ["Possibly relevant code from elsewhere in the project:"]
+    for h in hits:
+        parts.append(f"{h['path']}:{h['start_line']}-{h['end_line']}\n```{lang_of(h['path'])}\n"
+                     f"{h['code'].rstrip()}\n```")
+    return "\n\n".join(parts)
+
+
+_INDEXES: dict[str, EmbeddingIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def embeddings_for(filepath: str | None) -> EmbeddingIndex | None:
+    """Shared embedding index for the project containing ``filepath``; refreshed in the background."""
+    root = find_project_root(filepath) if filepath and EMBED_MODEL else None
+    if not root:
+        return None
+    with _INDEXES_LOCK:
+        idx = _INDEXES.get(root)
+        if idx is None:
+            idx = _INDEXES[root] = EmbeddingIndex(root)
+    idx.refresh_async()
+    return idx
@@ -0,0 +1,139 @@
+"""Routing across one or more Ollama servers with health checks and load tracking."""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from config import HEALTH_CHECK_INTERVAL, NUM_PARALLEL, OLLAMA_URLS
+
+HEALTH_TIMEOUT = 1.5
+
+
+class Endpoint:
+    """One Ollama server and what we last learned about it."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.models: set[str] | None = None  # None until the first successful check
+        self.loaded: set[str] = set()  # models currently in memory (/api/ps)
+        self.in_flight = 0
+        self.checked_at = 0.0
+        self.error: str | None = None
+
+    def __repr__(self) -> str:
+        state = "up" if self.healthy else "down"
+        return f"Endpoint({self.url!r}, {state}, in_flight={self.in_flight})"
+
+
+def _model_names(payload: dict) -> set[str]:
+    return {m.get("name") or m.get("model") for m in payload.get("models", [])} - {None}
+
+
+class EndpointPool:
+    """Chooses the server for each request.
+
+    Preference order: healthy, has the model installed, already has it loaded,
+    fewest requests in flight, configuration order. With a single endpoint no
+    health checks run and every request goes to it. A request may name the
+    endpoint that already holds its prompt prefix (``prefer``): it goes there
+    while that server is healthy, has the model and has a free slot.
+    """
+
+    def __init__(self, urls: list[str], interval: float = HEALTH_CHECK_INTERVAL):
+        self.endpoints = [Endpoint(u) for u in urls]
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checker: threading.Thread | None = None
+
+    @property
+    def multi(self) -> bool:
+        return len(self.endpoints) > 1
+
+    # health
+    def check(self, ep: Endpoint) -> None:
+        try:
+            r = requests.get(f"{ep.url}/tags", timeout=HEALTH_TIMEOUT)
+            r.raise_for_status()
+            models = _model_names(r.json())
+            try:
+                p = requests.get(f"{ep.url}/ps", timeout=HEALTH_TIMEOUT)
+                p.raise_for_status()
+                loaded = _model_names(p.json())
+            except Exception:
+                loaded = set(ep.loaded)
+            with self._lock:
+                ep.models, ep.loaded, ep.healthy, ep.error = models, loaded, True, None
+        except Exception as e:
+            with self._lock:
+                ep.healthy, ep.error = False, str(e)
+        ep.checked_at = time.time()
+
+    def refresh(self) -> None:
+        """Check every endpoint concurrently and wait for the results."""
+        threads = [threading.Thread(target=self.check, args=(ep,), daemon=True) for ep in self.endpoints]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def start_health_checks(self) -> None:
+        """Begin periodic background checks (only meaningful with several endpoints)."""
+        with self._lock:
+            if not self.multi or (self._checker and self._checker.is_alive()):
+                return
+            self._checker = threading.Thread(target=self._check_loop, daemon=True, name="ollama-health")
+            self._checker.start()
+
+    def _check_loop(self) -> None:
+        while True:
+            self.refresh()
+            time.sleep(self.interval)
+
+    # routing
+    def choose(self, model: str | None, exclude=(), prefer: str | None = None) -> Endpoint | None:
+        if not self.multi:
+            return None if self.endpoints[0] in exclude else self.endpoints[0]
+        self.start_health_checks()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.healthy] or candidates
+            having = [e for e in healthy if e.models is None or model in e.models] or healthy
+            warm = next((e for e in having if e.url == prefer and e.healthy and e.in_flight < NUM_PARALLEL), None)
+            if warm is not None:
+                return warm
+            return min(having, key=lambda e: (model not in e.loaded, e.in_flight, self.endpoints.index(e)))
+
+    @contextmanager
+    def use(self, ep: Endpoint):
+        """Count a request as in flight on ``ep`` for the duration of the block."""
+        with self._lock:
+            ep.in_flight += 1
+        try:
+            yield ep
+        finally:
+            with self._lock:
+                ep.in_flight -= 1
+
+    def mark_failed(self, ep: Endpoint, error: Exception | str) -> None:
+        with self._lock:
+            ep.healthy, ep.error = False, str(error)
+
+    def mark_loaded(self, ep: Endpoint, model: str) -> None:
+        with self._lock:
+            ep.healthy, ep.error = True, None
+            ep.loaded.add(model)
+
+    def status(self) -> list[dict]:
+        with self._lock:
+            return [{"url": e.url, "healthy": e.healthy, "in_flight": e.in_flight,
+                     "models": sorted(e.models or ()), "loaded": sorted(e.loaded), "error": e.error}
+                    for e in self.endpoints]
+
+
+POOL = EndpointPool(OLLAMA_URLS)
@@ -5,13 +5,20 @@ from PySide6.QtNetwork import QLocalSocket
 from ui.main_window import SOCKET_NAME
 
 
-def send_open_session(code: str, file_name: str) -> bool:
-    """If a window is already running, send a message to open a new tab."""
+def send_open_session(code: str, file_name: str, filepath: str | None = None,
+                      selection_range: tuple[int, int, int, int] | None = None) -> bool:
+    """If a window is already running, send a message to open a new tab.
+
+    ``selection_range`` is the editor's (start line, start col, end line, end col), 1-based.
+    """
     sock = QLocalSocket()
     sock.connectToServer(SOCKET_NAME)
     if not sock.waitForConnected(200):
         return False
-    payload = json.dumps({"cmd": "open_session", "code": code, "file": file_name}).encode("utf-8")
+    payload = json.dumps(
+        {"cmd": "open_session", "code": code, "file": file_name, "filepath": filepath,
+         "range": list(selection_range) if selection_range else None}
+    ).encode("utf-8")
     sock.write(payload);
     sock.flush()
     sock.waitForBytesWritten(200)
@@ -0,0 +1,242 @@
+"""Crash-safe record of each tab's conversation, so an interrupted answer survives a crash.
+
+Every tab has two files in ``CACHE_DIR/sessions``:
+
+* ``<id>.json`` — the session store: pinned code and the finished messages,
+  replaced atomically (temp file + rename) when a question is asked and when
+  its answer completes. Replacing it also removes the journal: the compacted
+  store supersedes it.
+* ``<id>.journal`` — append-only JSON lines for the answer being streamed: a
+  ``begin`` record, then ``text`` records, each holding a batch of chunks.
+
+Nothing is written on the GUI thread. Chunks are queued and one writer thread
+writes them out when ``FLUSH_BYTES`` have accumulated or ``FLUSH_INTERVAL``
+has passed since the oldest queued one, with a single write and ``fsync`` per
+file and batch, so the cost per token stays negligible at any token rate. At
+most ``FLUSH_INTERVAL`` of an answer is lost in a crash. A torn last line is
+skipped when reading.
+
+Closing a tab (or the window) discards its files, so whatever is left at
+start-up belongs to tabs that were open when LocalPilot or the machine died;
+``recover`` returns them with the partial answer taken from the journal.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from config import CACHE_DIR
+
+FLUSH_BYTES = 4096  # queued text that triggers a write
+FLUSH_INTERVAL = 0.25  # seconds a chunk may wait in memory before it is written
+
+
+@dataclass
+class RecoveredSession:
+    id: str
+    state: dict  # as passed to SessionJournal.save: file_name, filepath, code, selection_range, history, ...
+    partial: str | None  # text of the answer that was streaming (None if no answer was interrupted)
+    model: str = ""
+
+
+def sessions_dir() -> Path:
+    return Path(CACHE_DIR).expanduser() / "sessions"
+
+
+class JournalWriter:
+    """One background thread that applies queued file operations in order, in batches."""
+
+    def __init__(self, flush_bytes: int = FLUSH_BYTES, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_bytes, self.flush_interval = flush_bytes, flush_interval
+        self._ops: list[tuple[str, Path, object]] = []  # ("text" | "record" | "replace" | "unlink", path, data)
+        self._bytes = 0
+        self._oldest = 0.0  # monotonic time of the oldest queued operation
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self.batches = 0  # writes done so far (for tests and benchmarks)
+
+    def text(self, path: Path, s: str) -> None:
+        self._queue("text", path, s, len(s))
+
+    def record(self, path: Path, record: dict) -> None:
+        self._queue("record", path, record)
+
+    def replace(self, path: Path, content: str) -> None:
+        self._queue("replace", path, content)
+
+    def unlink(self, path: Path) -> None:
+        self._queue("unlink", path, None)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Write everything queued now and wait for it (clean shutdown, tests)."""
+        with self._cond:
+            self._oldest = float("-inf")
+            self._cond.notify()
+            return self._cond.wait_for(lambda: not self._ops and not self._busy, timeout)
+
+    def _queue(self, kind: str, path: Path, data, size: int = 0) -> None:
+        with self._cond:
+            first = not self._ops
+            if first:
+                self._oldest = time.monotonic()
+            self._ops.append((kind, path, data))
+            self._bytes += size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="session-journal")
+                self._thread.start()
+            if first or self._bytes >= self.flush_bytes:  # start the deadline, or write now
+                self._cond.notify()
+
+    def _due(self) -> float | None:
+        """Seconds until the queued operations are due (0 when due now, None when nothing is queued)."""
+        if not self._ops:
+            return None
+        if self._bytes >= self.flush_bytes:
+            return 0.0
+        return max(0.0, self._oldest + self.flush_interval - time.monotonic())
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while (wait := self._due()) != 0.0:
+                    self._cond.wait(wait)
+                ops, self._ops, self._bytes = self._ops, [], 0
+                self._busy = True
+            try:
+                self._apply(ops)
+            except Exception as e:  # never let a full disk take the writer down
+                print(f"[journal] write failed: {e}", file=sys.stderr)
+            with self._cond:
+                self._busy = False
+                self.batches += 1
+                self._cond.notify_all()
+
+    @staticmethod
+    def _apply(ops: list[tuple[str, Path, object]]) -> None:
+        pending: dict[Path, list[str]] = {}  # journal lines per file, written together
+
+        def write_lines(path: Path):
+            lines = pending.pop(path, None)
+            if lines:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        texts: dict[Path, list[str]] = {}  # consecutive chunks of a file become one "text" record
+
+        def close_text(path: Path):
+            if texts.get(path):
+                pending.setdefault(path, []).append(json.dumps({"t": "text", "s": "".join(texts.pop(path))}) + "\n")
+
+        for kind, path, data in ops:
+            if kind == "text":
+                texts.setdefault(path, []).append(data)
+                continue
+            close_text(path)
+            if kind == "record":
+                pending.setdefault(path, []).append(json.dumps(data) + "\n")
+                continue
+            write_lines(path)
+            if kind == "replace":
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(path.name + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            else:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        for path in list(texts):
+            close_text(path)
+        for path in list(pending):
+            write_lines(path)
+
+
+WRITER = JournalWriter()
+
+
+class SessionJournal:
+    """The store and journal files of one tab."""
+
+    def __init__(self, session_id: str | None = None, directory: str | Path | None = None,
+                 writer: JournalWriter = WRITER):
+        self.id = session_id or uuid.uuid4().hex
+        directory = Path(directory) if directory else sessions_dir()
+        self.store_path = directory / f"{self.id}.json"
+        self.journal_path = directory / f"{self.id}.journal"
+        self._writer = writer
+
+    def save(self, state: dict) -> None:
+        """Compact: replace the stored session with ``state`` and drop the journal."""
+        self._writer.replace(self.store_path, json.dumps(state))
+        self._writer.unlink(self.journal_path)
+
+    def begin(self, state: dict, model: str = "") -> None:
+        """Store ``state`` (which ends with the question) and start journaling its answer."""
+        self.save(state)
+        self._writer.record(self.journal_path, {"t": "begin", "turn": len(state.get("history", ())),
+                                                "model": model, "ts": round(time.time(), 3)})
+
+    def append(self, text: str) -> None:
+        """Journal a chunk of the answer (queued; written within ``FLUSH_INTERVAL``)."""
+        if text:
+            self._writer.text(self.journal_path, text)
+
+    def discard(self) -> None:
+        """Remove both files (the tab was closed: nothing to recover)."""
+        self._writer.unlink(self.journal_path)
+        self._writer.unlink(self.store_path)
+
+
+def read_journal(path: Path) -> tuple[dict | None, str]:
+    """The last ``begin`` record of a journal and the text journaled after it."""
+    begin, parts = None, []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn write
+                if rec.get("t") == "begin":
+                    begin, parts = rec, []
+                elif rec.get("t") == "text":
+                    parts.append(rec.get("s", ""))
+    except OSError:
+        pass
+    return begin, "".join(parts)
+
+
+def recover(directory: str | Path | None = None) -> list[RecoveredSession]:
+    """Sessions left on disk by tabs that were open when the process died, oldest first."""
+    directory = Path(directory) if directory else sessions_dir()
+    found = []
+    for store in sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime):
+        try:
+            state = json.loads(store.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if not isinstance(state, dict) or not state.get("history"):
+            continue
+        begin, text = read_journal(store.with_suffix(".journal"))
+        # the answer counts as interrupted unless the store already holds it
+        interrupted = begin is not None and begin.get("turn") == len(state["history"])
+        found.append(RecoveredSession(store.stem, state, text if interrupted else None,
+                                      (begin or {}).get("model", "") if interrupted else ""))
+    for orphan in directory.glob("*.journal"):  # a journal without a store cannot be placed in a tab
+        if not orphan.with_suffix(".json").exists():
+            orphan.unlink(missing_ok=True)
+    return found
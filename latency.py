@@ -0,0 +1,269 @@
+"""Latency phases of a streaming request and a watchdog that acts on slow ones."""
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import DEFAULT_POOLBLOCK, HTTPAdapter
+from urllib3 import PoolManager
+
+from config import STALL_TIMEOUT, STATUS_DELAY, TTFT_TIMEOUT
+
+
+class StallError(RuntimeError):
+    """The server stopped producing tokens (or never started) within the thresholds."""
+
+
+_FINAL_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+                 "eval_count", "eval_duration")
+
+
+class RequestTimeline:
+    """Timestamps of one request, relative to ``started`` (time.monotonic())."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.endpoint: str | None = None
+        self.connected: float | None = None  # response headers received
+        self.first_token: float | None = None
+        self.last_token: float | None = None
+        self.max_gap = 0.0
+        self.tokens = 0
+        self.model: str | None = None
+        self.final: dict = {}  # counters and durations from the server's last ("done") record
+        self.load_s: float | None = None
+        self.prompt_eval_s: float | None = None
+        self.stop_reason: str | None = None  # server's done_reason ("stop", "length"), or "artifact"
+
+    def restart(self, endpoint: str, model: str | None = None) -> None:
+        """Start timing a new attempt (first try, failover or fallback model)."""
+        self.endpoint = endpoint
+        self.model = model
+        self.connected = None
+        self.last_token = None
+
+    def on_connected(self) -> None:
+        self.connected = time.monotonic()
+
+    def on_token(self) -> None:
+        now = time.monotonic()
+        if self.first_token is None:
+            self.first_token = now
+        elif self.last_token is not None:
+            self.max_gap = max(self.max_gap, now - self.last_token)
+        self.last_token = now
+        self.tokens += 1
+
+    def on_final(self, record: dict) -> None:
+        self.final = {k: record[k] for k in _FINAL_FIELDS if record.get(k) is not None}
+        self.stop_reason = record.get("done_reason") or self.stop_reason
+        if record.get("load_duration") is not None:
+            self.load_s = record["load_duration"] / 1e9
+        if record.get("prompt_eval_duration") is not None:
+            self.prompt_eval_s = record["prompt_eval_duration"] / 1e9
+
+    def ttft(self) -> float | None:
+        return None if self.first_token is None else self.first_token - self.started
+
+    def stats(self) -> dict:
+        """Per-request figures for the HUD and the metrics store (rates in tokens/s)."""
+        f = self.final
+
+        def rate(count, duration):
+            return round(f[count] / (f[duration] / 1e9), 1) if f.get(count) and f.get(duration) else None
+
+        ttft = self.ttft()
+        return {
+            "model": self.model,
+            "endpoint": self.endpoint,
+            "ttft_s": None if ttft is None else round(ttft, 3),
+            "load_s": None if self.load_s is None else round(self.load_s, 3),
+            "prompt_tokens": f.get("prompt_eval_count"),
+            "prompt_tps": rate("prompt_eval_count", "prompt_eval_duration"),
+            "gen_tokens": f.get("eval_count"),
+            "gen_tps": rate("eval_count", "eval_duration"),
+            "total_s": round(f["total_duration"] / 1e9, 3) if f.get("total_duration") else
+            round((self.last_token or self.started) - self.started, 3),
+            "stop_reason": self.stop_reason,
+        }
+
+    def summary(self) -> dict:
+        def rel(t):
+            return None if t is None else round(t - self.started, 3)
+        return {"endpoint": self.endpoint, "connect_s": rel(self.connected), "ttft_s": rel(self.first_token),
+                "load_s": self.load_s, "prompt_eval_s": self.prompt_eval_s, "max_gap_s": round(self.max_gap, 3),
+                "tokens": self.tokens}
+
+
+def abort_response(response) -> None:
+    """Close a streaming ``requests`` response from another thread.
+
+    Shutting the socket down wakes a reader blocked in ``iter_lines`` right
+    away and makes the server see the client disconnect.
+    """
+    try:
+        sock = getattr(getattr(response.raw, "connection", None), "sock", None) \
+            or getattr(getattr(response.raw, "_connection", None), "sock", None)
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+class _AbortablePoolManager(PoolManager):
+    """Keeps the connections it hands out, so they can be shut down while in use."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aborted = False
+        self.connections = []
+
+    def abort(self) -> None:
+        self.aborted = True
+        for conn in list(self.connections):
+            _shutdown(conn)
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        get_conn = pool._get_conn
+
+        def tracked(timeout=None):
+            conn = get_conn(timeout)
+            connect = conn.connect
+
+            def connect_unless_aborted():
+                connect()
+                if self.aborted:  # stopped while connecting
+                    _shutdown(conn)
+
+            conn.connect = connect_unless_aborted
+            self.connections.append(conn)
+            return conn
+
+        pool._get_conn = tracked
+        return pool
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK, **pool_kwargs):
+        self._pool_connections, self._pool_maxsize, self._pool_block = connections, maxsize, block
+        self.poolmanager = _AbortablePoolManager(num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+
+class AbortableSession(requests.Session):
+    """A session for one request that ``abort()`` cancels from another thread at any point.
+
+    ``abort_response`` needs the response, which only exists once the server has
+    sent its headers; Ollama sends them with the first token, after loading the
+    model and evaluating the prompt. This session shuts its socket down earlier
+    too, so the blocked ``post`` raises at once.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._adapter = _AbortableAdapter()
+        self.mount("http://", self._adapter)
+        self.mount("https://", self._adapter)
+
+    def abort(self) -> None:
+        self._adapter.poolmanager.abort()
+
+
+def _shutdown(conn) -> None:
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def model_is_loaded(base_url: str, model: str) -> bool | None:
+    """Ask the server whether ``model`` is in memory (None if unknown)."""
+    try:
+        r = requests.get(f"{base_url}/ps", timeout=1)
+        r.raise_for_status()
+        names = {m.get("name") or m.get("model") for m in r.json().get("models", [])}
+        return model in names or f"{model}:latest" in names
+    except Exception:
+        return None
+
+
+class Watchdog:
+    """Watches one attempt: reports the waiting phase and aborts stalls.
+
+    Before the first token it reports "model loading (x s)" or "evaluating
+    prompt (x s)" (asking ``/api/ps`` once) and gives up after ``ttft_timeout``.
+    After it, a gap longer than ``stall_timeout`` aborts the stream; the
+    caller then retries elsewhere.
+    """
+
+    def __init__(self, timeline: RequestTimeline, base_url: str, model: str,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 ttft_timeout: float | None = None, stall_timeout: float | None = None,
+                 status_delay: float | None = None):
+        self.timeline = timeline
+        self.base_url = base_url
+        self.model = model
+        self.on_status = on_status
+        self.ttft_timeout = TTFT_TIMEOUT if ttft_timeout is None else ttft_timeout
+        self.stall_timeout = STALL_TIMEOUT if stall_timeout is None else stall_timeout
+        self.status_delay = STATUS_DELAY if status_delay is None else status_delay
+        self.response = None
+        self.tripped: str | None = None
+        self._attempt_started = time.monotonic()
+        self._loaded: bool | None = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ttft-watchdog")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+
+    def _status(self, text: str) -> None:
+        if self.on_status:
+            self.on_status(text)
+
+    def _trip(self, reason: str) -> None:
+        self.tripped = reason
+        if self.response is not None:
+            abort_response(self.response)
+
+    def _run(self) -> None:
+        last_report = ""
+        while not self._done.wait(0.25):
+            now = time.monotonic()
+            tl = self.timeline
+            if tl.last_token is None or tl.last_token < self._attempt_started:
+                waited = now - self._attempt_started
+                if waited >= self.ttft_timeout:
+                    self._trip(f"no first token after {waited:.0f}s")
+                    return
+                if waited < self.status_delay:
+                    continue
+                if self._loaded is None:
+                    self._loaded = model_is_loaded(self.base_url, self.model)
+                phase = "evaluating prompt" if self._loaded else "model loading" if self._loaded is False \
+                    else "waiting for first token"
+                report = f"{self.model}: {phase} ({waited:.0f} s)"
+            else:
+                gap = now - tl.last_token
+                if gap >= self.stall_timeout:
+                    self._trip(f"stalled for {gap:.0f}s")
+                    return
+                report = f"{self.model}: stalled, no tokens for {gap:.0f} s" if gap >= self.status_delay * 5 else ""
+                if not report and last_report:
+                    report = f"Generating with {self.model}…"
+            if report and report != last_report:
+                self._status(report)
+                last_report = report
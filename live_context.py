@@ -0,0 +1,212 @@
+"""Keep a tab's pinned selection in step with edits to its file.
+
+The tab's system prompt (and the server's cached prefix of it) never changes.
+When the watched file is saved, the selected lines are re-located with difflib
+(only around the selection: the lines the old and new file share at both ends
+are skipped, and the rest is narrowed to lines that occur once in each version),
+and the next message is preceded by a compact unified diff of that region
+instead of the whole file. Tracking is line-based: a selection that starts or
+ends mid-line is widened to whole lines.
+"""
+from __future__ import annotations
+
+import difflib
+import re
+from dataclasses import dataclass
+
+from content_store import SharedText
+
+CONTEXT_LINES = 2  # unchanged lines around each hunk of a region diff
+WINDOW_LINES = 200  # lines diffed on each side of the selection, at least
+MAX_DIFF_LINES = 4000  # larger windows are diffed with difflib's junk heuristic (fast, less exact)
+_HUNK = re.compile(r"^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@")
+
+
+@dataclass(frozen=True)
+class RegionChange:
+    start: int  # 1-based first line of the region in the current file
+    end: int  # 1-based last line (start - 1 when the region was deleted)
+    diff: str  # unified diff of the region, numbered like the file
+    added: int
+    removed: int
+
+    def summary(self) -> str:
+        where = f"lines {self.start}–{self.end}" if self.end >= self.start else "region deleted"
+        return f"{where}, +{self.added} −{self.removed}"
+
+    def message(self, file_name: str) -> str:
+        """The chat message that tells the model about the edit."""
+        return (f"The pinned code in `{file_name or 'selection'}` was edited ({self.summary()}). "
+                f"Changes since you last saw it:\n\n```diff\n{self.diff}\n```\n\n"
+                "Treat the code after these changes as the current pinned code.")
+
+
+class LiveRegion:
+    """The line range ``[start, end)`` of a selection within a file, followed through edits.
+
+    The file's text and its lines are shared with every other tab pinned to the
+    same version of the file (see ``content_store``).
+    """
+
+    def __init__(self, text: str, start: int, end: int):
+        self._file = SharedText(text)
+        self.start, self.end = start, end
+        self._synced_file, self._synced_range = self._file, (start, end)  # the region as the model last saw it
+
+    @property
+    def _lines(self) -> list[str]:
+        return _lines(self._file)
+
+    @property
+    def _synced(self) -> list[str]:
+        return _lines(self._synced_file)[slice(*self._synced_range)]
+
+    @property
+    def _synced_start(self) -> int:
+        return self._synced_range[0]
+
+    @classmethod
+    def locate(cls, text: str, selection: str, start_line: int | None = None) -> LiveRegion | None:
+        """Find ``selection`` in ``text``, at ``start_line`` (1-based) if the editor sent one; None if absent."""
+        wanted = selection.strip("\n")
+        if not wanted.strip():
+            return None
+        count = wanted.count("\n") + 1
+        lines = text.splitlines(keepends=True)
+        if start_line and 0 < start_line <= len(lines):
+            first = start_line - 1
+            region = "".join(lines[first:first + count])
+            if wanted.strip() in region:
+                return cls(text, first, min(first + count, len(lines)))
+        offset = text.find(wanted.strip())
+        if offset < 0:
+            return None
+        first = text.count("\n", 0, offset)
+        return cls(text, first, min(first + wanted.strip().count("\n") + 1, len(lines)))
+
+    @property
+    def text(self) -> str:
+        return "".join(self._lines[self.start:self.end])
+
+    @property
+    def changed(self) -> bool:
+        """Whether the region differs from what the model last saw."""
+        return self._lines[self.start:self.end] != self._synced
+
+    def update(self, text: str) -> bool:
+        """Re-locate the region in the file's new ``text``; True if the region's content changed."""
+        new_file = SharedText(text)
+        new_lines = _lines(new_file)
+        ops = _opcodes(self._lines, new_lines, self.start, self.end)
+        before = self._lines[self.start:self.end]
+        start, end = _map_start(ops, self.start, len(new_lines)), _map_end(ops, self.end)
+        self._file, self.start, self.end = new_file, start, max(start, end)
+        return self._lines[self.start:self.end] != before
+
+    def take_change(self) -> RegionChange | None:
+        """The diff since the last call (or since the tab opened); None if the region is unchanged."""
+        current = self._lines[self.start:self.end]
+        if current == self._synced:
+            return None
+        old = [l if l.endswith("\n") else l + "\n" for l in self._synced]
+        new = [l if l.endswith("\n") else l + "\n" for l in current]
+        hunks = []
+        for line in difflib.unified_diff(old, new, n=CONTEXT_LINES, lineterm="\n"):
+            if line.startswith(("---", "+++")):
+                continue
+            m = _HUNK.match(line)
+            if m:  # renumber from region-relative to file lines
+                line = (f"@@ -{int(m.group(1)) + self._synced_start}{m.group(2) or ''} "
+                        f"+{int(m.group(3)) + self.start}{m.group(4) or ''} @@\n")
+            hunks.append(line)
+        added = sum(l.startswith("+") for l in hunks)
+        removed = sum(l.startswith("-") for l in hunks)
+        self._synced_file, self._synced_range = self._file, (self.start, self.end)
+        return RegionChange(self.start + 1, self.end, "".join(hunks).rstrip("\n"), added, removed)
+
+
+def _lines(text: SharedText) -> list[str]:
+    return text.derived("lines", lambda: text.text.splitlines(keepends=True))
+
+
+def _opcodes(old: list[str], new: list[str], start: int, end: int) -> list[tuple]:
+    """difflib opcodes from ``old`` to ``new`` that are exact for the lines around ``[start, end)``.
+
+    Lines outside the diffed window are reported as one "replace" on each side.
+    """
+    shortest = min(len(old), len(new))
+    head = 0
+    while head < shortest and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < shortest - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    old_end, new_end = len(old) - tail, len(new) - tail
+    if end <= head or start >= old_end:  # the edits are all below or all above the region
+        a0, b0, a1, b1 = head, head, head, head
+    else:
+        (a0, b0), (a1, b1) = _anchors(old, new, (head, old_end), (head, new_end),
+                                      max(head, start - WINDOW_LINES), min(old_end, end + WINDOW_LINES))
+    matcher = difflib.SequenceMatcher(None, old[a0:a1], new[b0:b1],
+                                      autojunk=max(a1 - a0, b1 - b0) > MAX_DIFF_LINES)
+    ops = [("equal", 0, head, 0, head)] if head else []
+    if (a0, b0) != (head, head):
+        ops.append(("replace", head, a0, head, b0))
+    ops += [(tag, i1 + a0, i2 + a0, j1 + b0, j2 + b0) for tag, i1, i2, j1, j2 in matcher.get_opcodes()]
+    if (a1, b1) != (old_end, new_end):
+        ops.append(("replace", a1, old_end, b1, new_end))
+    if tail:
+        ops.append(("equal", old_end, len(old), new_end, len(new)))
+    return ops
+
+
+def _anchors(old: list[str], new: list[str], old_span: tuple[int, int], new_span: tuple[int, int],
+             lo: int, hi: int) -> tuple[tuple[int, int], tuple[int, int]]:
+    """Matching (old, new) positions just outside ``[lo, hi)`` of ``old``: lines that occur once in each span.
+
+    Where there is no such line, the new side is the same window widened by the change
+    in length, so files without unique lines still get a bounded diff.
+    """
+    counts: dict[str, list[int]] = {}
+    for i in range(*old_span):
+        counts.setdefault(old[i], [0, 0, -1])[0] += 1
+    for j in range(*new_span):
+        entry = counts.get(new[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[2] = j
+
+    def match(i: int) -> int | None:
+        count_old, count_new, j = counts[old[i]]
+        return j if count_old == count_new == 1 else None
+
+    delta = (new_span[1] - new_span[0]) - (old_span[1] - old_span[0])
+    first = (lo, max(new_span[0], lo + min(0, delta)))
+    last = (hi, min(new_span[1], max(first[1], hi + max(0, delta))))
+    for i in range(lo - 1, old_span[0] - 1, -1):
+        j = match(i)
+        if j is not None:
+            first = (i + 1, j + 1)  # the anchor line itself is unchanged
+            break
+    for i in range(hi, old_span[1]):
+        j = match(i)
+        if j is not None and j >= first[1]:
+            last = (i, j)
+            break
+    return first, last
+
+
+def _map_start(ops, line: int, new_len: int) -> int:
+    """New index of the region's first line; lines inserted just before it stay outside."""
+    for tag, i1, i2, j1, j2 in ops:
+        if i1 <= line < i2:
+            return j1 + (line - i1) if tag == "equal" else j1
+    return new_len
+
+
+def _map_end(ops, line: int) -> int:
+    """New (exclusive) end of the region; lines inserted just after it stay outside."""
+    for tag, i1, i2, j1, j2 in ops:
+        if i1 < line <= i2:
+            return j1 + (line - i1) if tag == "equal" else j2
+    return 0
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 import argparse
-import json
 import os
 import sys
 
-from PySide6.QtNetwork import QLocalSocket
 from PySide6.QtWidgets import QApplication
 
-from ui.main_window import MainWindow, SOCKET_NAME
+from ipc import send_open_session
+from tracing import configure as configure_tracing
+from ui.main_window import MainWindow, load_transcript_engine
 
 
 # -------- file + selection utilities --------
@@ -76,6 +76,10 @@ def parse_args():
 
     # raw selection text
     p.add_argument("--selection", nargs="?")
+
+    # diagnostics (same as LOCALPILOT_TRACE / LOCALPILOT_PROFILE)
+    p.add_argument("--trace", help="write a Chrome trace of the session to this file")
+    p.add_argument("--profile", help="sample Python stacks and write folded stacks to this file")
     return p.parse_args()
 
 
@@ -115,20 +119,11 @@ def get_selection(args) -> tuple[str, str]:
     return "", title
 
 
-# -------- single-instance IPC --------
-
-def send_to_running_instance(code: str, file_name: str) -> bool:
-    """Return True if a running instance was found and the message was delivered."""
-    sock = QLocalSocket()
-    sock.connectToServer(SOCKET_NAME)
-    if not sock.waitForConnected(200):  # no instance listening
-        return False
-    payload = json.dumps({"cmd": "open_session", "code": code, "file": file_name}).encode("utf-8")
-    sock.write(payload)
-    sock.flush()
-    sock.waitForBytesWritten(200)
-    sock.disconnectFromServer()
-    return True
+def get_selection_range(args) -> tuple[int, int, int, int] | None:
+    """The editor's (start line, start col, end line, end col), 1-based, if all four were given."""
+    parts = tuple(_int_or_none(v)
+                  for v in (args.sel_start_line, args.sel_start_col, args.sel_end_line, args.sel_end_col))
+    return None if None in parts else parts
 
 
 # -------- entrypoint --------
@@ -136,16 +131,20 @@ def send_to_running_instance(code: str, file_name: str) -> bool:
 def main():
     args = parse_args()
     code, display_name = get_selection(args)
+    sel_range = get_selection_range(args)
 
     # If an instance is running, hand off via IPC and exit.
-    if send_to_running_instance(code, display_name):
+    if send_open_session(code, display_name, args.filepath, sel_range):
         return
 
     # Otherwise, start the UI and begin listening for future selections.
+    configure_tracing(args.trace, args.profile)
+    load_transcript_engine()
     app = QApplication(sys.argv)
-    win = MainWindow(code, display_name)
+    win = MainWindow(code, display_name, filepath=args.filepath, selection_range=sel_range)
     win.listen_ipc()
     win.show()
+    win.recover_sessions()
     sys.exit(app.exec())
 
 
@@ -0,0 +1,81 @@
+"""Run one action over the chunks of an oversized selection and merge the answers."""
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+from chunking import CodeChunk
+from config import NUM_PARALLEL
+from ollama_client import stream_ollama
+from scheduler import SlotScheduler
+from utils import build_prompt
+
+
+def chunk_task(instruction: str, chunk: CodeChunk, index: int, total: int) -> str:
+    return (
+        f"{instruction}\n\n"
+        f"This is part {index + 1} of {total} of a larger selection "
+        f"(lines {chunk.start_line}-{chunk.end_line}). Answer for this part only; "
+        "other parts are handled separately."
+    )
+
+
+def part_heading(chunk: CodeChunk, index: int, total: int) -> str:
+    return f"\n\n### Part {index + 1}/{total} · lines {chunk.start_line}-{chunk.end_line}\n\n"
+
+
+def run_map_reduce(instruction: str, chunks: list[CodeChunk], lang: str, emit: Callable[[str], None],
+                   model: str | None = None, on_progress: Callable[[int, int], None] | None = None,
+                   stop_event: Optional[threading.Event] = None, max_workers: int = NUM_PARALLEL,
+                   limiter: Optional[SlotScheduler] = None) -> None:
+    """Stream ``instruction`` over every chunk concurrently; merge results in order.
+
+    Up to ``max_workers`` chunk requests run at once. Part 1 streams through
+    ``emit`` live; later parts are buffered in their own queue and flushed as
+    soon as every earlier part is complete, so the merged answer reads top to
+    bottom. ``on_progress(finished, total)`` fires as each part completes,
+    possibly out of order and from a pool thread. Each part's request also holds
+    a slot of ``limiter`` if given (a caller's own cap, e.g. ``batch.py --jobs``).
+    """
+    total = len(chunks)
+    if not total:
+        return
+    queues: list[queue.Queue[str | None]] = [queue.Queue() for _ in chunks]
+    finished = 0
+    lock = threading.Lock()
+
+    def job(i: int) -> None:
+        nonlocal finished
+        prompt = build_prompt(chunk_task(instruction, chunks[i], i, total), chunks[i].text, lang)
+        with limiter.slot(stop_event=stop_event) if limiter else nullcontext():
+            stream_ollama(prompt, queues[i], model=model, stop_event=stop_event)
+        with lock:
+            finished += 1
+            done_now = finished
+        if on_progress:
+            on_progress(done_now, total)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, total)), thread_name_prefix="map-reduce")
+    try:
+        for i in range(total):
+            pool.submit(job, i)
+        for i, chunk in enumerate(chunks):
+            if stop_event and stop_event.is_set():  # later parts may be buffered already: drop them
+                return
+            if total > 1:
+                emit(part_heading(chunk, i, total))
+            while True:
+                try:
+                    s = queues[i].get(timeout=0.1)
+                except queue.Empty:
+                    if stop_event and stop_event.is_set():
+                        return
+                    continue
+                if s is None:
+                    break
+                emit(s)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
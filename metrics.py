@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Local store of per-request performance figures with per-model percentiles.
+
+Every finished request appends one JSON line to ``CACHE_DIR/metrics.jsonl``.
+Once the file holds ``COMPACT_FACTOR`` times the samples kept per model, it is
+rewritten with only those. ``python metrics.py`` prints the per-model report
+(``--model`` to filter).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from config import CACHE_DIR
+
+FIELDS = ("ttft_s", "load_s", "prompt_tps", "gen_tps", "total_s")
+PERCENTILES = (50, 90, 99)
+MAX_PER_MODEL = 1000  # samples kept in memory per model for the percentiles
+COMPACT_FACTOR = 2  # rewrite the file once it has this many times the lines that are kept
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """Nearest-rank percentile of ``values`` (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))  # ceil(n * p / 100)
+    return ordered[int(rank) - 1]
+
+
+class MetricsStore:
+    """Append-only JSONL of request stats, read lazily on first use and compacted as it grows."""
+
+    def __init__(self, path: str | None = None):
+        self.path = Path(path or os.path.join(CACHE_DIR, "metrics.jsonl")).expanduser()
+        self._lock = threading.Lock()
+        self._samples: dict[str, list[dict]] | None = None
+        self._lines = 0  # lines in the file, dropped samples included
+
+    def _load(self) -> dict[str, list[dict]]:
+        if self._samples is None:
+            self._samples = {}
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        self._lines += 1
+                        try:
+                            self._add(json.loads(line))
+                        except ValueError:
+                            continue
+            except OSError:
+                pass
+        return self._samples
+
+    def _add(self, stats: dict) -> None:
+        per_model = self._samples.setdefault(stats.get("model") or "?", [])
+        per_model.append(stats)
+        if len(per_model) > MAX_PER_MODEL:
+            del per_model[: len(per_model) - MAX_PER_MODEL]
+
+    def record(self, stats: dict) -> None:
+        stats = {**stats, "ts": round(time.time(), 3)}
+        with self._lock:
+            self._load()
+            self._add(stats)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(stats) + "\n")
+                self._lines += 1
+                kept = sum(len(v) for v in self._samples.values())
+                if self._lines > COMPACT_FACTOR * max(kept, MAX_PER_MODEL):
+                    self._compact()
+            except OSError as e:
+                print(f"[metrics] could not save request stats: {e}", file=sys.stderr)
+
+    def _compact(self) -> None:
+        """Rewrite the file with only the samples kept in memory, oldest first (lock held)."""
+        kept = sorted((s for v in self._samples.values() for s in v), key=lambda s: s.get("ts") or 0)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(s) + "\n" for s in kept)
+        os.replace(tmp, self.path)
+        self._lines = len(kept)
+
+    def models(self) -> list[str]:
+        with self._lock:
+            return sorted(self._load())
+
+    def recent(self, model: str, n: int = 20) -> list[dict]:
+        with self._lock:
+            return list(self._load().get(model, [])[-n:])
+
+    def percentiles(self, model: str) -> dict:
+        """``{field: {"p50": .., "p90": .., "p99": ..}, "n": count}`` for ``model``."""
+        with self._lock:
+            samples = list(self._load().get(model, []))
+        out: dict = {"n": len(samples)}
+        for field in FIELDS:
+            values = [s[field] for s in samples if s.get(field) is not None]
+            out[field] = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+        return out
+
+    def export_text(self, model: str | None = None) -> str:
+        """Plain-text table of percentiles per model (for bug reports and comparisons)."""
+        header = f"{'model':<28} {'n':>5}  " + "  ".join(f"{f:>22}" for f in FIELDS)
+        lines = [header, f"{'':<28} {'':>5}  " + "  ".join(f"{'p50 / p90 / p99':>22}" for _ in FIELDS)]
+        for name in ([model] if model else self.models()):
+            pct = self.percentiles(name)
+            cells = []
+            for field in FIELDS:
+                vals = [pct[field][f"p{p}"] for p in PERCENTILES]
+                cells.append(f"{' / '.join('-' if v is None else f'{v:g}' for v in vals):>22}")
+            lines.append(f"{name:<28} {pct['n']:>5}  " + "  ".join(cells))
+        return "\n".join(lines)
+
+
+def format_hud(stats: dict) -> str:
+    """One-line summary of a request: ``TTFT 0.42s · prompt 812 tok/s · gen 38.5 tok/s · load 0.0s``."""
+    parts = []
+    if stats.get("ttft_s") is not None:
+        parts.append(f"TTFT {stats['ttft_s']:.2f}s")
+    if stats.get("prompt_tps") is not None:
+        parts.append(f"prompt {stats['prompt_tps']:.0f} tok/s")
+    if stats.get("gen_tps") is not None:
+        parts.append(f"gen {stats['gen_tps']:.1f} tok/s")
+    if stats.get("load_s") is not None:
+        parts.append(f"load {stats['load_s']:.1f}s")
+    return " · ".join(parts)
+
+
+METRICS = MetricsStore()
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Print per-model latency/throughput percentiles.")
+    p.add_argument("--model", help="only this model")
+    p.add_argument("--file", help="metrics file (default: LOCALPILOT_CACHE/metrics.jsonl)")
+    args = p.parse_args(argv)
+    store = MetricsStore(args.file) if args.file else METRICS
+    print(store.export_text(args.model))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,18 +2,73 @@ from __future__ import annotations
 
 import json
 import queue
+import sys
 import threading
-from typing import Optional
+from typing import Callable, Optional
 
 import requests
 
-from config import MODEL, OLLAMA_BASE_URL, TEMP
+from config import CONNECT_TIMEOUT, FALLBACK_MODEL, MODEL, TEMP, TTFT_TIMEOUT
+from endpoints import POOL
+from latency import AbortableSession, RequestTimeline, StallError, Watchdog, abort_response
+from scheduler import PRIORITY_INTERACTIVE, SCHEDULER
+from tracing import span
+from utils import FenceEnd
 
-OLLAMA_URL = f"{OLLAMA_BASE_URL}/generate"
+
+class StopEvent(threading.Event):
+    """Stop flag that also aborts the request's connection the moment it is set.
+
+    A plain ``threading.Event`` is only noticed when the next line arrives; with
+    this one the socket is shut down right away, so the worker returns at once
+    and Ollama sees the disconnect and frees its parallel slot.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def on_set(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Call ``fn`` when the event is set (now, if it already is); returns an unregister function."""
+        with self._lock:
+            if not self.is_set():
+                self._callbacks.append(fn)
+                return lambda: self._discard(fn)
+        fn()
+        return lambda: None
+
+    def _discard(self, fn) -> None:
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+    def set(self) -> None:
+        with self._lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[stream_ollama] cancel callback failed: {e}", file=sys.stderr)
 
 
 def stream_ollama(prompt: str, out_q: queue.Queue, model: str | None = None,
-                  stop_event: Optional[threading.Event] = None) -> None:
+                  stop_event: Optional[threading.Event] = None, priority: int = PRIORITY_INTERACTIVE,
+                  on_status: Optional[Callable[[str], None]] = None,
+                  timeline: Optional[RequestTimeline] = None, options: Optional[dict] = None,
+                  stop_after_fence: bool = False, affinity: Optional[str] = None) -> None:
+    """Stream the completion of ``prompt`` into ``out_q`` as text chunks, then ``None``.
+
+    The request waits for a server slot from the shared scheduler at ``priority``.
+    ``on_status`` receives short progress notes ("model loading (12 s)", retries)
+    and ``timeline`` (if given) is filled with the latency phases of the request.
+    ``options`` (e.g. ``num_predict``, ``stop``) are sent along with the temperature;
+    with ``stop_after_fence`` the request ends as soon as the first code block closes.
+    ``affinity`` is the endpoint URL that served the conversation so far: its
+    server still caches the prompt prefix, so it is preferred when it is free.
+    """
     model = model or MODEL
     if not model:
         out_q.put("\n[Error] No model specified\n")
@@ -24,41 +79,131 @@ def stream_ollama(prompt: str, out_q: queue.Queue, model: str | None = None,
         out_q.put(None)
         return
 
-    print(f"[stream_ollama] requesting model={model}")
+    with SCHEDULER.slot(priority, stop_event) as granted:
+        if not granted:
+            out_q.put(None)
+            return
+        _stream(prompt, out_q, model, stop_event, on_status, timeline or RequestTimeline(),
+                {"temperature": TEMP, **(options or {})}, FenceEnd() if stop_after_fence else None, affinity)
+
+
+def _stream(prompt: str, out_q: queue.Queue, model: str, stop_event: Optional[threading.Event],
+            on_status: Optional[Callable[[str], None]], timeline: RequestTimeline,
+            options: dict, fence: Optional[FenceEnd], affinity: Optional[str] = None) -> None:
+    """Generate on the best endpoint; fail over to the next one on errors.
+
+    If a server dies or stalls mid-answer the next one continues from the text
+    produced so far (it is appended to the prompt), so the tab sees one answer.
+    When every endpoint was too slow and ``FALLBACK_MODEL`` is set, the request
+    is retried once with that model.
+    """
+    print(f"[stream_ollama] requesting model={model}", file=sys.stderr)
+    emitted: list[str] = []
+    tried = []
+    error: Exception | str = "no Ollama endpoint available"
     try:
-        with requests.post(
-                OLLAMA_URL,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps({
-                    "model": model,
-                    "prompt": prompt,
-                    "options": {"temperature": TEMP},
-                    "stream": True,
-                }),
-                stream=True,
-                timeout=180,
-        ) as r:
-            r.raise_for_status()
-            confirmed = False
+        while True:
+            ep = POOL.choose(model, exclude=tried, prefer=affinity)
+            if ep is None:
+                slow = isinstance(error, (StallError, requests.Timeout))
+                if slow and FALLBACK_MODEL and model != FALLBACK_MODEL:
+                    if on_status:
+                        on_status(f"{model} is too slow ({error}); switching to {FALLBACK_MODEL}")
+                    print(f"[stream_ollama] falling back to model={FALLBACK_MODEL}", file=sys.stderr)
+                    model, tried = FALLBACK_MODEL, []
+                    continue
+                out_q.put(f"\n[Error] {error}\n")
+                return
+            tried.append(ep)
+            timeline.restart(ep.url, model)
+            try:
+                with POOL.use(ep), Watchdog(timeline, ep.url, model, on_status) as dog:
+                    _generate(ep.url, prompt + "".join(emitted), model, out_q, stop_event, emitted, timeline, dog,
+                              options, fence)
+                POOL.mark_loaded(ep, model)
+                print(f"[stream_ollama] timeline {timeline.summary()}", file=sys.stderr)
+                return
+            except Exception as e:
+                error = e
+                if stop_event and stop_event.is_set():
+                    return
+                POOL.mark_failed(ep, e)
+                if POOL.multi:
+                    print(f"[stream_ollama] {ep.url} failed ({e}); trying another endpoint", file=sys.stderr)
+                    if on_status:
+                        on_status(f"{ep.url} failed ({e}); trying another endpoint")
+    finally:
+        out_q.put(None)
+
+
+def _generate(base_url: str, prompt: str, model: str, out_q: queue.Queue,
+              stop_event: Optional[threading.Event], emitted: list[str],
+              timeline: RequestTimeline, dog: Watchdog, options: dict, fence: Optional[FenceEnd]) -> None:
+    session = AbortableSession()  # Stop aborts it even while the server loads the model or reads the prompt
+    unregister = stop_event.on_set(session.abort) if isinstance(stop_event, StopEvent) else None
+    try:
+        _generate_on(session, base_url, prompt, model, out_q, stop_event, emitted, timeline, dog, options, fence)
+    finally:
+        if unregister:
+            unregister()
+        session.close()
+
+
+def _generate_on(session: requests.Session, base_url: str, prompt: str, model: str, out_q: queue.Queue,
+                 stop_event: Optional[threading.Event], emitted: list[str],
+                 timeline: RequestTimeline, dog: Watchdog, options: dict, fence: Optional[FenceEnd]) -> None:
+    with session.post(
+            f"{base_url}/generate",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps({
+                "model": model,
+                "prompt": prompt,
+                "options": options,
+                "stream": True,
+            }),
+            stream=True,
+            timeout=(CONNECT_TIMEOUT, TTFT_TIMEOUT),
+    ) as r:
+        timeline.on_connected()
+        dog.response = r
+        if stop_event and stop_event.is_set():  # cancelled while the server was loading/evaluating
+            return
+        r.raise_for_status()
+        confirmed = False
+        try:
             for line in r.iter_lines(decode_unicode=True):
                 if stop_event and stop_event.is_set():
                     break
                 if not line:
                     continue
-                try:
-                    obj = json.loads(line)
-                    if not confirmed and obj.get("model"):
-                        print(f"[stream_ollama] server model={obj['model']}")
-                        confirmed = True
-                    chunk = obj.get("response", "")
-                except json.JSONDecodeError:
-                    chunk = line
-                if chunk:
-                    out_q.put(chunk)
-    except Exception as e:
-        out_q.put(f"\n[Error] {e}\n")
-    finally:
-        out_q.put(None)
+                with span("stream.decode", "stream"):
+                    try:
+                        obj = json.loads(line)
+                        if not confirmed and obj.get("model"):
+                            print(f"[stream_ollama] server model={obj['model']} @ {base_url}", file=sys.stderr)
+                            confirmed = True
+                        if obj.get("done"):
+                            timeline.on_final(obj)
+                        chunk = obj.get("response", "")
+                    except json.JSONDecodeError:
+                        chunk = line
+                    end = fence.feed(chunk) if fence and chunk else None
+                    if end is not None:
+                        chunk = chunk[:end]
+                    if chunk:
+                        timeline.on_token()
+                        emitted.append(chunk)
+                        out_q.put(chunk)
+                if end is not None:  # the code block is complete: stop the server generating the rest
+                    timeline.stop_reason = "artifact"
+                    abort_response(r)
+                    break
+        except Exception:
+            if dog.tripped:
+                raise StallError(dog.tripped)
+            raise
+        if dog.tripped:
+            raise StallError(dog.tripped)
 
 
 def warm_up_model(model: str | None = None) -> None:
@@ -67,14 +212,19 @@ def warm_up_model(model: str | None = None) -> None:
     if not model:
         return
 
+    ep = POOL.choose(model)
+    if ep is None:
+        return
+
     def _warm() -> None:
         try:
             requests.post(
-                OLLAMA_URL,
+                f"{ep.url}/generate",
                 headers={"Content-Type": "application/json"},
                 data=json.dumps({"model": model, "prompt": "", "stream": False}),
                 timeout=30,
             ).raise_for_status()
+            POOL.mark_loaded(ep, model)
         except Exception:
             pass
 
@@ -0,0 +1,108 @@
+"""Markdown-to-HTML rendering on a background thread.
+
+Tabs submit render jobs keyed by ``(owner, key)`` — typically a tab and the
+index of a transcript block. Jobs run one at a time in submission order, so
+every owner sees its results in the order it asked for them. If a job for the
+same block is still queued when a newer snapshot arrives, the queued one is
+replaced: only the latest text of a message is ever rendered. Nothing here
+depends on Qt; the caller's ``done`` callback runs on the render thread and
+must hand the result over to the GUI thread itself (e.g. by emitting a signal).
+"""
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from tracing import span
+
+SYNC_RENDER_CHARS = 2000  # below this a render is cheaper inline than a thread round trip
+
+
+class RenderService:
+    """Single render thread with a latest-wins queue per ``(owner, key)``."""
+
+    def __init__(self, name: str = "markdown-render"):
+        self._jobs: OrderedDict[tuple[Hashable, Hashable], tuple[Callable[[], str], Callable[[str], None]]] = \
+            OrderedDict()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._running: Hashable | None = None  # owner of the job on the render thread
+        self._name = name
+        self._thread: threading.Thread | None = None
+        self._closing = False
+        self.dropped = 0  # snapshots replaced before they were rendered
+
+    def submit(self, owner: Hashable, key: Hashable, job: Callable[[], str], done: Callable[[str], None]) -> None:
+        """Queue ``job`` (returns HTML); ``done(html)`` is called on the render thread."""
+        with self._cond:
+            if (owner, key) in self._jobs:
+                self.dropped += 1
+            self._jobs[(owner, key)] = (job, done)  # replacing keeps the queue position of the older snapshot
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, owner: Hashable, wait: bool = True) -> int:
+        """Drop the queued jobs of ``owner`` (e.g. a closed tab); returns how many were dropped.
+
+        If one of its jobs is running, wait for it, so no ``done`` callback reaches
+        the owner after this returns (a deleted widget cannot emit its signal).
+        With ``wait=False`` a running job finishes on its own and ``done`` must
+        cope with the owner being gone.
+        """
+        with self._cond:
+            stale = [k for k in self._jobs if k[0] == owner]
+            for k in stale:
+                del self._jobs[k]
+            if wait:
+                self._cond.wait_for(lambda: self._running != owner)
+            return len(stale)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs) + self._busy
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until every queued job has run (for tests and benchmarks)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs and not self._busy, timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """Run the queued jobs, then end the render thread and join it (before the interpreter exits).
+
+        Returns False if it was still busy after ``timeout``. A later ``submit`` starts a new thread.
+        """
+        with self._cond:
+            thread = self._thread
+            if thread is not None:
+                self._closing = True
+                self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        return thread is None or not thread.is_alive()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs or self._closing)
+                if not self._jobs:
+                    self._thread, self._closing = None, False
+                    return
+                (self._running, _), (job, done) = self._jobs.popitem(last=False)
+                self._busy = True
+            try:
+                with span("render.markdown", "render"):
+                    html = job()
+                done(html)
+            except Exception as e:
+                print(f"[render_service] render failed: {e}", file=sys.stderr)
+            finally:
+                with self._cond:
+                    self._busy, self._running = False, None
+                    self._cond.notify_all()
+
+
+RENDERER = RenderService()
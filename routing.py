@@ -0,0 +1,113 @@
+"""Pick a model per request from prompt size, action and measured latency.
+
+The "Auto" entry of the model selector uses ``route()``. Models are ranked by
+parameter count parsed from their names ("qwen2.5-coder:1.5b" < ":14b"),
+falling back to measured generation speed; a model with neither is never taken
+for the small, fast one. Embedding models are not candidates. Edit-type actions on selections
+above ``ROUTE_SMALL_TOKENS`` always get the strongest model; everything else
+gets the strongest model whose predicted time to first token (from the
+metrics store) meets ``LATENCY_TARGET``.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from config import EMBED_MODEL, LATENCY_TARGET, ROUTE_SMALL_TOKENS, ROUTE_STRONG_MODEL, ROUTE_FAST_MODEL
+from metrics import METRICS, MetricsStore
+
+AUTO = "Auto"
+QUALITY_ACTIONS = ("refactor", "performance", "simplify", "tests")
+BASE_TTFT = 0.15  # request overhead assumed when only throughput has been measured
+
+_SIZE = re.compile(r"(?<![\w.])(\d+(?:\.\d+)?)\s*([bm])\b", re.I)
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    reason: str
+    predicted_ttft: float | None = None
+
+
+def parameter_count(model: str) -> float | None:
+    """Billions of parameters from a model tag such as ``qwen2.5-coder:7b`` (None if not stated)."""
+    m = _SIZE.search(model.split("/")[-1].replace("_", "-"))
+    if not m:
+        return None
+    n = float(m.group(1))
+    return n / 1000 if m.group(2).lower() == "m" else n
+
+
+def can_generate(model: str) -> bool:
+    """False for embedding models (``EMBED_MODEL``, or "embed" in the tag): they cannot answer."""
+    return model != EMBED_MODEL and "embed" not in model.lower()
+
+
+def _is_unknown(model: str, metrics: MetricsStore) -> bool:
+    """No configured role, no size in the tag and no measured generation speed."""
+    return (model not in (ROUTE_STRONG_MODEL, ROUTE_FAST_MODEL) and parameter_count(model) is None
+            and metrics.percentiles(model)["gen_tps"]["p50"] is None)
+
+
+def rank_by_strength(models: list[str], metrics: MetricsStore = METRICS) -> list[str]:
+    """Strongest first: explicit config, then parameter count, then slower measured generation.
+
+    Models of unknown strength come after the known ones but before ``ROUTE_FAST_MODEL``.
+    """
+    def key(model: str):
+        if model == ROUTE_STRONG_MODEL:
+            return (0, 0.0)
+        if model == ROUTE_FAST_MODEL:
+            return (3, 0.0)
+        size = parameter_count(model)
+        if size is not None:
+            return (1, -size)
+        gen = metrics.percentiles(model)["gen_tps"]["p50"]
+        if gen is None:
+            return (2, 0.0)
+        return (1, gen)  # unknown size: slower generation ranks as stronger
+
+    return sorted(models, key=key)
+
+
+def predicted_ttft(model: str, prompt_tokens: int, metrics: MetricsStore = METRICS) -> float | None:
+    """Expected time to first token for a prompt of ``prompt_tokens`` (None without measurements)."""
+    pct = metrics.percentiles(model)
+    if not pct["n"]:
+        return None
+    prompt_tps = pct["prompt_tps"]["p50"]
+    if prompt_tps:
+        recent = [s.get("load_s") or 0.0 for s in metrics.recent(model, 5)]
+        load = sorted(recent)[len(recent) // 2] if recent else 0.0  # median recent load (0 when it stays warm)
+        return BASE_TTFT + load + prompt_tokens / prompt_tps
+    return pct["ttft_s"]["p50"]
+
+
+def route(models: list[str], prompt_tokens: int, action: str = "chat", selection_tokens: int | None = None,
+          metrics: MetricsStore = METRICS, target: float | None = None) -> Route:
+    """Choose the model for one request; ``action`` is an ``ACTIONS`` key or "chat"."""
+    target = LATENCY_TARGET if target is None else target
+    selection_tokens = prompt_tokens if selection_tokens is None else selection_tokens
+    ranked = rank_by_strength([m for m in models if m and m != AUTO and can_generate(m)], metrics)
+    if not ranked:
+        raise ValueError("no models to route between")
+    if len(ranked) == 1:
+        return Route(ranked[0], "only model")
+    if action in QUALITY_ACTIONS and selection_tokens > ROUTE_SMALL_TOKENS:
+        return Route(ranked[0], f"{action} on a large selection")
+    predictions = {m: predicted_ttft(m, prompt_tokens, metrics) for m in ranked}
+    for model in ranked:
+        p = predictions[model]
+        if p is not None and p <= target:
+            return Route(model, f"meets the {target:g}s target", p)
+    unmeasured = [m for m in ranked if predictions[m] is None]
+    if selection_tokens <= ROUTE_SMALL_TOKENS:
+        known = [m for m in ranked if not _is_unknown(m, metrics)]
+        if known:
+            fastest = known[-1]
+            return Route(fastest, "small request, fastest model", predictions[fastest])
+    if unmeasured:
+        return Route(unmeasured[0], "no measurements yet")
+    best = min(ranked, key=lambda m: predictions[m])
+    return Route(best, "lowest predicted latency", predictions[best])
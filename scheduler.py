@@ -0,0 +1,99 @@
+"""Priority gate in front of the server's parallel request slots."""
+from __future__ import annotations
+
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from config import NUM_PARALLEL
+
+# Lower value wins a free slot first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_API = 2  # other tools talking to the local API server (api_server.py)
+PRIORITY_BACKGROUND = 5
+PRIORITY_SPECULATIVE = 10
+
+
+class SlotScheduler:
+    """Hands out at most ``slots`` concurrent request slots by priority.
+
+    Waiters are served lowest priority value first, FIFO within a priority.
+    Speculative work is additionally kept off the last free slot so it never
+    delays an interactive request that arrives a moment later; on a single-slot
+    server it therefore never starts (callers should not queue it there).
+    """
+
+    def __init__(self, slots: int = NUM_PARALLEL):
+        self.slots = max(1, slots)
+        self._in_use = 0
+        self._waiting: list[tuple[int, int]] = []
+        self._tickets: dict[threading.Event, list[tuple[int, int]]] = {}  # stop_event -> [ticket] while waiting
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def _can_start(self, ticket: tuple[int, int]) -> bool:
+        if ticket != min(self._waiting):
+            return False
+        free = self.slots - self._in_use
+        if ticket[0] >= PRIORITY_SPECULATIVE:
+            return free >= 2
+        return free >= 1
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, stop_event: Optional[threading.Event] = None) -> bool:
+        """Block until a slot is granted; return False if ``stop_event`` fires first."""
+        held = [(priority, next(self._seq))]
+        with self._cond:
+            self._waiting.append(held[0])
+            if stop_event is not None:
+                self._tickets[stop_event] = held
+            try:
+                while not self._can_start(held[0]):
+                    if stop_event and stop_event.is_set():
+                        return False
+                    self._cond.wait(0.1)
+                self._in_use += 1
+                return True
+            finally:
+                self._waiting.remove(held[0])
+                if stop_event is not None:
+                    self._tickets.pop(stop_event, None)
+                self._cond.notify_all()
+
+    def reprioritise(self, stop_event: threading.Event, priority: int) -> bool:
+        """Move the request waiting with ``stop_event`` to ``priority``, keeping its place in the queue.
+
+        Returns False if no such request is waiting (it already holds a slot, or never asked).
+        """
+        with self._cond:
+            held = self._tickets.get(stop_event)
+            if held is None:
+                return False
+            self._waiting.remove(held[0])
+            held[0] = (priority, held[0][1])
+            self._waiting.append(held[0])
+            self._cond.notify_all()
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_use = max(0, self._in_use - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, stop_event: Optional[threading.Event] = None):
+        """Context manager yielding True while a slot is held (False if cancelled while waiting)."""
+        granted = self.acquire(priority, stop_event)
+        try:
+            yield granted
+        finally:
+            if granted:
+                self.release()
+
+
+# Process-wide gate shared by every tab, worker and background job.
+SCHEDULER = SlotScheduler()
@@ -0,0 +1,57 @@
+"""Local statistics of the first action taken in a tab, used to pre-generate it."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from config import CACHE_DIR
+
+MESSAGE = "__message__"  # the tab started with a typed question instead of a quick action
+MIN_SAMPLES = 3
+
+
+class ClickStats:
+    """Counts of first actions per language, persisted as JSON."""
+
+    def __init__(self, path: str | None = None):
+        self.path = Path(path or os.path.join(CACHE_DIR, "first_actions.json")).expanduser()
+        self._lock = threading.Lock()
+        try:
+            self._counts: dict[str, dict[str, int]] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._counts = {}
+
+    def record(self, lang: str, action: str) -> None:
+        with self._lock:
+            per_lang = self._counts.setdefault(lang or "plaintext", {})
+            per_lang[action] = per_lang.get(action, 0) + 1
+            data = json.dumps(self._counts)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(data, encoding="utf-8")
+        except OSError as e:
+            print(f"[speculation] could not save click stats: {e}", file=sys.stderr)
+
+    def most_likely(self, lang: str, default: str | None = "explain") -> str | None:
+        """Most frequent first action for ``lang`` (falling back to all languages).
+
+        Returns ``default`` until there are ``MIN_SAMPLES`` observations, and
+        None when tabs usually start with a typed question.
+        """
+        with self._lock:
+            counts = dict(self._counts.get(lang or "plaintext", {}))
+            if sum(counts.values()) < MIN_SAMPLES:
+                counts = {}
+                for per_lang in self._counts.values():
+                    for action, n in per_lang.items():
+                        counts[action] = counts.get(action, 0) + n
+        if sum(counts.values()) < MIN_SAMPLES:
+            return default
+        best = max(counts, key=counts.get)
+        return None if best == MESSAGE else best
+
+
+CLICK_STATS = ClickStats()
@@ -0,0 +1,354 @@
+"""On-disk index of project definitions used to enrich the pinned context."""
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+from config import CACHE_DIR
+from utils import estimate_tokens, lang_hint
+
+ROOT_MARKERS = (".git", "pyproject.toml", "setup.py", "package.json", "pom.xml", "build.gradle",
+                "build.gradle.kts", "settings.gradle", "go.mod", "Cargo.toml", "Gemfile", ".idea")
+SKIP_DIRS = {".git", ".hg", ".svn", ".idea", ".gradle", ".venv", "venv", "env", "node_modules", "__pycache__",
+             "build", "dist", "target", "out", ".mypy_cache", ".pytest_cache", ".tox", ".next", "Pods"}
+MAX_FILE_BYTES = 1_000_000
+MAX_SNIPPET_LINES = 60
+INDEX_VERSION = 1
+
+_BRACE_LANGS = {"java", "kotlin", "typescript", "tsx", "javascript", "jsx", "go", "csharp", "c", "cpp",
+                "objectivec", "scss", "css"}
+
+# One regex per construct; the ``name`` group is the defined symbol.
+_NAME_PATTERNS: dict[str, list[str]] = {
+    # fallback for selections that are not valid Python on their own
+    "python": [r"(async\s+)?def\s+(?P<name>\w+)", r"class\s+(?P<name>\w+)"],
+    "java": [r"(class|interface|enum|record|@interface)\s+(?P<name>\w+)",
+             r"[\w<>\[\],.? ]+\s+(?P<name>\w+)\s*\([^;]*$"],
+    "kotlin": [r"(class|interface|object)\s+(?P<name>\w+)", r"fun\s+(<[^>]*>\s*)?([\w.]+\.)?(?P<name>\w+)\s*\("],
+    "javascript": [r"function\s*\*?\s*(?P<name>\w+)", r"class\s+(?P<name>\w+)",
+                   r"(const|let|var)\s+(?P<name>\w+)\s*=\s*(async\s*)?(function|\(|\w+\s*=>)"],
+    "typescript": [r"function\s*\*?\s*(?P<name>\w+)", r"class\s+(?P<name>\w+)", r"interface\s+(?P<name>\w+)",
+                   r"type\s+(?P<name>\w+)\s*(<[^>]*>)?\s*=", r"enum\s+(?P<name>\w+)",
+                   r"(const|let|var)\s+(?P<name>\w+)\s*(:[^=]+)?=\s*(async\s*)?(function|\(|\w+\s*=>)"],
+    "go": [r"func\s+(\([^)]*\)\s*)?(?P<name>\w+)", r"type\s+(?P<name>\w+)"],
+    "ruby": [r"def\s+(self\.)?(?P<name>\w+[?!]?)", r"(class|module)\s+(?P<name>\w+)"],
+    "csharp": [r"(class|interface|struct|enum|record)\s+(?P<name>\w+)",
+               r"[\w<>\[\],.? ]+\s+(?P<name>\w+)\s*\([^;]*$"],
+    "c": [r"(struct|enum|union|class)\s+(?P<name>\w+)\s*\{?\s*$", r"#define\s+(?P<name>\w+)",
+          r"[A-Za-z_][\w\s\*&:<>]*[\s\*&](?P<name>[A-Za-z_]\w*)\s*\([^;]*$"],
+}
+_NAME_PATTERNS["tsx"] = _NAME_PATTERNS["typescript"]
+_NAME_PATTERNS["jsx"] = _NAME_PATTERNS["javascript"]
+_NAME_PATTERNS["cpp"] = _NAME_PATTERNS["c"]
+_NAME_PATTERNS["objectivec"] = _NAME_PATTERNS["c"]
+
+_MODIFIERS = re.compile(r"((export|default|declare|abstract|async|public|private|protected|internal|static|final|"
+                        r"open|override|data|sealed|inline|suspend|virtual|partial|synchronized|readonly)\s+)*")
+_STATEMENTS = re.compile(r"(if|else|for|while|switch|catch|return|new|throw|do|try|await|yield|case)\b")
+_IDENT = re.compile(r"[A-Za-z_]\w*")
+_KEYWORDS = {
+    "and", "as", "assert", "async", "await", "break", "case", "catch", "class", "const", "continue", "def",
+    "default", "del", "do", "elif", "else", "enum", "except", "export", "extends", "false", "False", "final",
+    "finally", "for", "from", "func", "function", "global", "if", "implements", "import", "in", "interface",
+    "is", "lambda", "let", "new", "nil", "None", "nonlocal", "not", "null", "or", "package", "pass", "private",
+    "protected", "public", "raise", "return", "self", "static", "struct", "super", "switch", "this", "throw",
+    "throws", "true", "True", "try", "type", "var", "void", "while", "with", "yield", "int", "str", "string",
+    "bool", "float", "double", "char", "long", "print", "len", "range", "list", "dict", "set", "tuple",
+}
+
+
+def find_project_root(filepath: str) -> str | None:
+    """Nearest ancestor of ``filepath`` holding a VCS/build marker, else its directory."""
+    if not filepath:
+        return None
+    p = Path(filepath).expanduser().resolve()
+    start = p.parent if not p.is_dir() else p
+    if not start.is_dir():
+        return None
+    for d in (start, *start.parents):
+        if any((d / m).exists() for m in ROOT_MARKERS):
+            return str(d)
+    return str(start)
+
+
+def iter_source_files(root: str):
+    """Yield ``(path, lang)`` for supported source files, skipping vendored/build dirs."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        for fn in filenames:
+            lang = lang_hint(fn)
+            if lang in _NAME_PATTERNS:
+                yield os.path.join(dirpath, fn), lang
+
+
+# ---------------------------------------------------------------------------
+# Parsers: return [name, kind, start_line, end_line] with 1-based inclusive lines
+
+
+def _python_symbols(text: str) -> list[list]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return _regex_symbols(text, "python")
+    out: list[list] = []
+
+    def visit(body, nested=False):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                kind = "class" if isinstance(node, ast.ClassDef) else "function"
+                out.append([node.name, kind, start, node.end_lineno or node.lineno])
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, nested=True)
+            elif not nested and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for t in targets:
+                    if isinstance(t, ast.Name):
+                        out.append([t.id, "variable", node.lineno, node.end_lineno or node.lineno])
+
+    visit(tree.body)
+    return out
+
+
+def _block_end(lines: list[str], start: int, lang: str) -> int:
+    """Index of the last line of the block opened at ``start`` (0-based)."""
+    if lang in _BRACE_LANGS:
+        depth = 0
+        opened = False
+        for i in range(start, min(len(lines), start + 2000)):
+            line = re.sub(r'"(\\.|[^"\\])*"|\'(\\.|[^\'\\])*\'|//.*$', "", lines[i])
+            depth += line.count("{") - line.count("}")
+            opened = opened or "{" in line
+            if opened and depth <= 0:
+                return i
+            if not opened and (line.rstrip().endswith(";") or i - start > 5):
+                return i
+        return start
+    if lang == "ruby":
+        indent = len(lines[start]) - len(lines[start].lstrip())
+        for i in range(start + 1, len(lines)):
+            s = lines[i]
+            if s.strip() == "end" and len(s) - len(s.lstrip()) == indent:
+                return i
+        return start
+    return start
+
+
+def _regex_symbols(text: str, lang: str) -> list[list]:
+    patterns = [re.compile(p) for p in _NAME_PATTERNS.get(lang, [])]
+    if not patterns:
+        return []
+    lines = text.splitlines()
+    out: list[list] = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or _STATEMENTS.match(stripped) or stripped.startswith(("//", "*", "/*")):
+            continue
+        decl = stripped[_MODIFIERS.match(stripped).end():]
+        for pat in patterns:
+            m = pat.match(decl)
+            if m and m.group("name") not in _KEYWORDS:
+                kind = "type" if re.match(r"(class|interface|struct|enum|record|type|module|object)\b",
+                                          decl) else "function"
+                out.append([m.group("name"), kind, i + 1, _block_end(lines, i, lang) + 1])
+                break
+    return out
+
+
+def parse_symbols(text: str, lang: str) -> list[list]:
+    """Definitions in ``text``: AST for Python, line patterns for the other languages."""
+    if lang == "python":
+        return _python_symbols(text)
+    return _regex_symbols(text, lang)
+
+
+def referenced_identifiers(code: str, lang: str) -> list[str]:
+    """Identifiers used in ``code`` but not defined by it, most frequent first."""
+    defined = {s[0] for s in parse_symbols(code, lang)}
+    counts = Counter(t for t in _IDENT.findall(code) if t not in _KEYWORDS and t not in defined and len(t) > 1)
+    return [name for name, _ in counts.most_common()]
+
+
+# ---------------------------------------------------------------------------
+# Index
+
+
+class SymbolIndex:
+    """Definitions of every supported source file under ``root``.
+
+    The index is persisted as JSON in the cache directory and refreshed
+    incrementally: files whose mtime/size are unchanged are skipped and files
+    whose content hash is unchanged are not re-parsed. Lookups only touch the
+    in-memory name table, never the file tree.
+    """
+
+    def __init__(self, root: str, cache_dir: str = CACHE_DIR):
+        self.root = str(Path(root).resolve())
+        key = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+        self.path = Path(cache_dir).expanduser() / "symbols" / f"{key}.json"
+        self._files: dict[str, dict] = {}
+        self._by_name: dict[str, list[tuple[str, str, int, int]]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.ready = threading.Event()
+        self._load()
+
+    # persistence
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION and data.get("root") == self.root:
+                self._files = data.get("files", {})
+                self._rebuild_names()
+                self.ready.set()
+        except (OSError, ValueError):
+            pass
+
+    def _save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "root": self.root, "files": self._files}),
+                           encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[symbol_index] could not save index: {e}", file=sys.stderr)
+
+    def _rebuild_names(self) -> None:
+        by_name: dict[str, list[tuple[str, str, int, int]]] = {}
+        for rel, entry in self._files.items():
+            for name, kind, start, end in entry.get("symbols", []):
+                by_name.setdefault(name, []).append((rel, kind, start, end))
+        self._by_name = by_name
+
+    # scanning
+    def update(self) -> int:
+        """Re-scan the tree; return the number of files (re)parsed or dropped."""
+        with self._lock:
+            files = dict(self._files)
+        seen: set[str] = set()
+        changed = 0
+        for path, lang in iter_source_files(self.root):
+            rel = os.path.relpath(path, self.root)
+            seen.add(rel)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            old = files.get(rel)
+            if old and old.get("mtime") == st.st_mtime and old.get("size") == st.st_size:
+                continue
+            if st.st_size > MAX_FILE_BYTES:
+                continue
+            try:
+                raw = Path(path).read_bytes()
+            except OSError:
+                continue
+            digest = hashlib.sha1(raw).hexdigest()
+            if old and old.get("hash") == digest:
+                files[rel] = {**old, "mtime": st.st_mtime, "size": st.st_size}
+                continue
+            text = raw.decode("utf-8", errors="replace")
+            files[rel] = {"mtime": st.st_mtime, "size": st.st_size, "hash": digest, "lang": lang,
+                          "symbols": parse_symbols(text, lang)}
+            changed += 1
+        for rel in set(files) - seen:
+            del files[rel]
+            changed += 1
+        with self._lock:
+            self._files = files
+            self._rebuild_names()
+        if changed or not self.path.exists():
+            self._save()
+        self.ready.set()
+        return changed
+
+    def refresh_async(self) -> None:
+        """Start a background update unless one is already running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._safe_update, daemon=True, name="symbol-index")
+            self._thread.start()
+
+    def _safe_update(self) -> None:
+        try:
+            self.update()
+        except Exception as e:
+            print(f"[symbol_index] update failed: {e}", file=sys.stderr)
+
+    # lookups
+    def lookup(self, name: str) -> list[tuple[str, str, int, int]]:
+        with self._lock:
+            return list(self._by_name.get(name, ()))
+
+    def _snippet(self, rel: str, start: int, end: int) -> str | None:
+        try:
+            with open(os.path.join(self.root, rel), "r", encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        end = min(end, start + MAX_SNIPPET_LINES - 1, len(lines))
+        return "\n".join(lines[start - 1:end])
+
+    def context_for(self, code: str, lang: str, budget_tokens: int, exclude: str | None = None) -> list[dict]:
+        """Definitions of symbols referenced by ``code``, within ``budget_tokens``.
+
+        ``exclude`` is an absolute file path whose definitions are skipped when
+        the same name also exists elsewhere (the selection's own file).
+        """
+        if not self.ready.is_set() or budget_tokens <= 0:
+            return []
+        with self._lock:
+            files = self._files
+        exclude_rel = os.path.relpath(exclude, self.root) if exclude else None
+        out: list[dict] = []
+        used = 0
+        for name in referenced_identifiers(code, lang):
+            hits = self.lookup(name)
+            if not hits:
+                continue
+            hits.sort(key=lambda h: h[0] == exclude_rel)
+            rel, kind, start, end = hits[0]
+            snippet = self._snippet(rel, start, end)
+            if not snippet or snippet in code:
+                continue
+            cost = estimate_tokens(snippet) + 16
+            if used + cost > budget_tokens:
+                continue
+            used += cost
+            out.append({"name": name, "kind": kind, "path": rel, "line": start,
+                        "lang": files.get(rel, {}).get("lang", lang), "code": snippet})
+        return out
+
+
+_INDEXES: dict[str, SymbolIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def index_for(filepath: str | None) -> SymbolIndex | None:
+    """Shared index for the project containing ``filepath``; refreshed in the background."""
+    root = find_project_root(filepath) if filepath else None
+    if not root:
+        return None
+    with _INDEXES_LOCK:
+        idx = _INDEXES.get(root)
+        if idx is None:
+            idx = _INDEXES[root] = SymbolIndex(root)
+    idx.refresh_async()
+    return idx
+
+
+def format_context(defs: list[dict]) -> str:
+    """Markdown block listing ``defs`` for the system message."""
+    parts = ["Related definitions from the project (reference only):"]
+    for d in defs:
+        parts.append(f"{d['path']}:{d['line']} ({d['kind']} {d['name']})\n```{d['lang']}\n{d['code']}\n```")
+    return "\n\n".join(parts)
@@ -0,0 +1,112 @@
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+requests = pytest.importorskip("requests")
+
+from bench.fake_ollama import FakeOllama
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    servers = []
+
+    def start(srv, key=''):
+        monkeypatch.setenv('OLLAMA_URLS', srv.base_url)
+        monkeypatch.delenv('MODEL_LIST', raising=False)
+        monkeypatch.setenv('LOCALPILOT_CACHE', str(tmp_path))
+        monkeypatch.setenv('LOCALPILOT_API_KEY', key)
+        for name in ('config', 'endpoints', 'scheduler', 'latency', 'metrics', 'ollama_client', 'routing',
+                     'api_server'):
+            sys.modules.pop(name, None)
+        import api_server
+        server = api_server.APIServer().start()
+        servers.append(server)
+        return server, api_server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_streams_sse_chunks_through_the_shared_client(api):
+    with FakeOllama(models=['m1', 'm2'], tokens=['Hel', 'lo']) as srv:
+        server, api_server = api(srv)
+        r = requests.post(f'{server.base_url}/chat/completions', stream=True, timeout=10, json={
+            'model': 'm2', 'stream': True, 'max_tokens': 50, 'stop': 'END', 'temperature': 0.7,
+            'messages': [{'role': 'system', 'content': 'Be brief.'},
+                         {'role': 'user', 'content': [{'type': 'text', 'text': 'hi'}]}]})
+        assert r.headers['Content-Type'] == 'text/event-stream'
+        events = [line[len('data: '):] for line in r.iter_lines(decode_unicode=True) if line]
+        call = srv.calls('/api/generate')[0]
+    assert events[-1] == '[DONE]'
+    chunks = [json.loads(e) for e in events[:-1]]
+    assert ''.join(c['choices'][0]['delta'].get('content', '') for c in chunks) == 'Hello'
+    assert chunks[0]['choices'][0]['delta']['role'] == 'assistant'
+    assert chunks[-1]['choices'][0]['finish_reason'] == 'stop'
+    assert chunks[-1]['usage']['completion_tokens'] == 2
+    assert call['model'] == 'm2' and call['prompt'] == 'Be brief.\nuser: hi\nassistant:'
+    assert call['options'] == {'temperature': 0.7, 'num_predict': 50, 'stop': ['END']}
+    assert api_server.METRICS.recent('m2')[-1]['client'] == 'api'
+
+
+def test_non_streaming_completion_and_errors(api):
+    with FakeOllama(models=['m'], tokens=['a', 'b', 'c']) as srv:
+        server, _ = api(srv)
+        body = requests.post(f'{server.base_url}/chat/completions', timeout=10, json={
+            'model': 'auto', 'max_tokens': 2, 'messages': [{'role': 'user', 'content': 'x'}]}).json()
+        assert body['object'] == 'chat.completion' and body['model'] == 'm'
+        assert body['choices'][0]['message']['content'] == 'ab'
+        assert body['choices'][0]['finish_reason'] == 'length'
+        missing = requests.post(f'{server.base_url}/chat/completions', timeout=10, json={
+            'model': 'nope', 'messages': [{'role': 'user', 'content': 'x'}]})
+        assert missing.status_code == 404 and missing.json()['error']['type'] == 'model_not_found'
+        assert requests.post(f'{server.base_url}/chat/completions', json={}, timeout=10).status_code == 400
+        models = requests.get(f'{server.base_url}/models', timeout=10).json()
+        assert [m['id'] for m in models['data']] == ['m']
+
+
+def test_api_key_is_required_when_configured(api):
+    with FakeOllama() as srv:
+        server, _ = api(srv, key='secret')
+        assert requests.get(f'{server.base_url}/models', timeout=10).status_code == 401
+        ok = requests.get(f'{server.base_url}/models', headers={'Authorization': 'Bearer secret'}, timeout=10)
+        assert ok.status_code == 200
+
+
+def test_browser_requests_are_refused(api):
+    with FakeOllama() as srv:
+        server, _ = api(srv)
+        url = f'{server.base_url}/chat/completions'
+        body = json.dumps({'messages': [{'role': 'user', 'content': 'x'}]})
+        plain = requests.post(url, data=body, headers={'Content-Type': 'text/plain'}, timeout=10)
+        assert plain.status_code == 415
+        page = requests.post(url, data=body, timeout=10,
+                             headers={'Content-Type': 'application/json', 'Origin': 'https://example.com'})
+        assert page.status_code == 403 and page.json()['error']['type'] == 'permission_error'
+        assert not srv.calls('/api/generate')
+
+
+def test_a_disconnected_client_cancels_a_non_streaming_request(api):
+    with FakeOllama(tokens=['t'] * 200, token_delay=0.05) as srv:
+        server, _ = api(srv)
+        scheduler = sys.modules['scheduler']
+        body = json.dumps({'messages': [{'role': 'user', 'content': 'x'}]}).encode()
+        client = socket.create_connection((server.host, server.port), timeout=10)
+        client.sendall(b'POST /v1/chat/completions HTTP/1.1\r\nHost: localhost\r\n'
+                       b'Content-Type: application/json\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+        deadline = time.monotonic() + 5
+        while not scheduler.SCHEDULER.in_use and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert scheduler.SCHEDULER.in_use == 1
+        client.close()
+        closed = time.monotonic()
+        while scheduler.SCHEDULER.in_use and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert scheduler.SCHEDULER.in_use == 0 and time.monotonic() - closed < 2  # not after all 10 s of tokens
@@ -9,29 +9,66 @@ import pytest
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 
-def load_app(monkeypatch):
-    sys.modules.pop("app", None)
+class FakeWindow:
+    """Stands in for ui.main_window.MainWindow; records how the entry point drives it."""
+
+    def __init__(self, calls, *args, **kwargs):
+        self.calls = calls
+        calls.append(("MainWindow", args, kwargs))
+
+    def listen_ipc(self):
+        self.calls.append("listen_ipc")
+
+    def show(self):
+        self.calls.append("show")
+
+    def recover_sessions(self):
+        self.calls.append("recover_sessions")
+        return 0
+
+
+def stub_modules(monkeypatch, calls):
+    """Replace PySide6, ipc and ui.main_window; ``calls`` collects what the entry point does, in order."""
     pyside6 = types.ModuleType("PySide6")
     qtwidgets = types.ModuleType("PySide6.QtWidgets")
-    qtwidgets.QApplication = type("QApplication", (), {"__init__": lambda self, *a, **k: None})
+    qtwidgets.QApplication = type("QApplication", (), {
+        "__init__": lambda self, *a, **k: calls.append("QApplication"),
+        "exec": lambda self: 0,
+    })
     qtnetwork = types.ModuleType("PySide6.QtNetwork")
-    qtnetwork.QLocalSocket = type("QLocalSocket", (), {"__init__": lambda self, *a, **k: None})
+    qtnetwork.QLocalSocket = type("QLocalSocket", (), {  # no running instance to hand off to
+        "__init__": lambda self, *a, **k: None,
+        "connectToServer": lambda self, name: None,
+        "waitForConnected": lambda self, ms: False,
+    })
     monkeypatch.setitem(sys.modules, "PySide6", pyside6)
     monkeypatch.setitem(sys.modules, "PySide6.QtWidgets", qtwidgets)
     monkeypatch.setitem(sys.modules, "PySide6.QtNetwork", qtnetwork)
 
     ipc_mod = types.ModuleType("ipc")
-    ipc_mod.send_open_session = lambda *a, **k: None
+    ipc_mod.send_open_session = lambda *a, **k: calls.append(("send_open_session", a, k)) and False
     monkeypatch.setitem(sys.modules, "ipc", ipc_mod)
     ui_mod = types.ModuleType("ui.main_window")
     ui_mod.SOCKET_NAME = "dummy"
-    ui_mod.MainWindow = object
+    ui_mod.MainWindow = lambda *a, **k: FakeWindow(calls, *a, **k)
+    ui_mod.load_transcript_engine = lambda: calls.append("load_transcript_engine")
     monkeypatch.setitem(sys.modules, "ui.main_window", ui_mod)
 
+
+def load_app(monkeypatch, calls=None):
+    sys.modules.pop("app", None)
+    stub_modules(monkeypatch, [] if calls is None else calls)
     import app
     return importlib.reload(app)
 
 
+def load_main(monkeypatch, calls):
+    sys.modules.pop("main", None)
+    stub_modules(monkeypatch, calls)
+    import main
+    return importlib.reload(main)
+
+
 def test_read_selection_from_ranges(monkeypatch):
     app = load_app(monkeypatch)
     with tempfile.NamedTemporaryFile("w+", delete=False) as tmp:
@@ -39,3 +76,38 @@ def test_read_selection_from_ranges(monkeypatch):
         tmp.flush()
         text = app._read_selection_from_ranges(tmp.name, 1, 2, 2, 3)
     assert text == "ine1\nli"
+
+
+@pytest.mark.parametrize("entry", ["app", "main"])
+def test_entry_points_load_the_transcript_engine_before_the_application(monkeypatch, entry):
+    calls = []
+    module = (load_app if entry == "app" else load_main)(monkeypatch, calls)
+    monkeypatch.setattr(sys, "argv", [f"{entry}.py", "--selection", "x = 1"])
+    with pytest.raises(SystemExit):
+        module.main()
+    assert calls.index("load_transcript_engine") < calls.index("QApplication")
+
+
+@pytest.mark.parametrize("entry", ["app", "main"])
+def test_entry_points_recover_crashed_sessions(monkeypatch, entry):
+    calls = []
+    module = (load_app if entry == "app" else load_main)(monkeypatch, calls)
+    monkeypatch.setattr(sys, "argv", [f"{entry}.py", "--selection", "x = 1"])
+    with pytest.raises(SystemExit):
+        module.main()
+    assert "recover_sessions" in calls and "listen_ipc" in calls
+
+
+@pytest.mark.parametrize("entry", ["app", "main"])
+def test_entry_points_forward_the_selection_range(monkeypatch, tmp_path, entry):
+    path = tmp_path / "mod.py"
+    path.write_text("a = 1\nb = 2\nc = 3\n")
+    calls = []
+    module = (load_app if entry == "app" else load_main)(monkeypatch, calls)
+    monkeypatch.setattr(sys, "argv", [f"{entry}.py", "--filepath", str(path), "--sel-start-line", "2",
+                                      "--sel-start-col", "1", "--sel-end-line", "3", "--sel-end-col", "6"])
+    with pytest.raises(SystemExit):
+        module.main()
+    (_, sent, _), (_, args, kwargs) = [c for c in calls if isinstance(c, tuple)]
+    assert sent[0] == "b = 2\nc = 3" and sent[3] == (2, 1, 3, 6)
+    assert args[0] == "b = 2\nc = 3" and kwargs["selection_range"] == (2, 1, 3, 6)
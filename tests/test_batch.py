@@ -0,0 +1,113 @@
+import importlib
+import io
+import json
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def load_batch(monkeypatch, stream_impl=None):
+    def no_server(*a, **k):
+        raise RuntimeError("offline")
+    import latency  # imports the real requests before it is replaced
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(get=no_server, post=no_server))
+    for name in list(sys.modules):
+        if name == 'PySide6' or name.startswith('PySide6.'):
+            monkeypatch.delitem(sys.modules, name)
+    for name in ('config', 'scheduler', 'ollama_client', 'map_reduce', 'batch'):
+        sys.modules.pop(name, None)
+    import batch
+    batch = importlib.reload(batch)
+    if stream_impl:
+        monkeypatch.setattr(batch, 'stream_ollama', stream_impl)
+    return batch
+
+
+def test_headless_path_does_not_import_qt(monkeypatch):
+    load_batch(monkeypatch)
+    assert not any(name.startswith('PySide6') for name in sys.modules)
+
+
+def test_expand_inputs_globs_ranges_and_stdin(monkeypatch, tmp_path):
+    batch = load_batch(monkeypatch)
+    (tmp_path / 'a.py').write_text('one\ntwo\nthree\nfour\n')
+    (tmp_path / 'b.js').write_text('x\n')
+    reqs = batch.expand_inputs(
+        [str(tmp_path / '*.py'), f"{tmp_path / 'a.py'}:2-3", str(tmp_path / 'b.js'), '-'],
+        stdin_name='snippet.go', stdin=io.StringIO('package main\n'),
+    )
+    assert [(r.file.rsplit('/', 1)[-1], r.lang, r.start_line) for r in reqs] == [
+        ('a.py', 'python', None), ('a.py', 'python', 2), ('b.js', 'javascript', None), ('snippet.go', 'go', None),
+    ]
+    assert reqs[1].code == 'two\nthree\n'
+    assert [r.id for r in reqs] == [0, 1, 2, 3]
+
+
+def test_run_batch_streams_jsonl_concurrently(monkeypatch, tmp_path):
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_stream(prompt, out_q, model=None, stop_event=None, **kwargs):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.03)
+        out_q.put('answer for ' + prompt.split('```')[1].split('\n', 1)[1].strip())
+        with lock:
+            active -= 1
+        if 'bad' in prompt:
+            out_q.put('\n[Error] boom\n')
+        out_q.put(None)
+
+    batch = load_batch(monkeypatch, fake_stream)
+    reqs = [batch.BatchRequest(i, f'f{i}.py', f'code{i}' if i != 3 else 'bad', 'python') for i in range(6)]
+    out = io.StringIO()
+    failed = batch.run_batch(reqs, 'Explain', 'm', 'explain', jobs=3, out=out)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert failed == 1
+    assert peak == 3
+    assert sorted(r['id'] for r in records) == list(range(6))
+    by_id = {r['id']: r for r in records}
+    assert by_id[0]['output'] == 'answer for code0'
+    assert by_id[0]['ok'] and by_id[0]['timing']['ttft_s'] is not None
+    assert by_id[3]['ok'] is False and by_id[3]['error'] == '[Error] boom'
+
+
+def test_jobs_caps_every_part_without_touching_the_scheduler(monkeypatch, tmp_path, capsys):
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_stream(prompt, out_q, model=None, stop_event=None, **kwargs):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.1)  # the first token takes a while
+        out_q.put('part answer')
+        with lock:
+            active -= 1
+        out_q.put(None)
+
+    batch = load_batch(monkeypatch, fake_stream)
+    import map_reduce
+    import scheduler
+    monkeypatch.setattr(map_reduce, 'stream_ollama', fake_stream)
+    monkeypatch.setattr(batch, 'LARGE_SELECTION_TOKENS', 10)
+    monkeypatch.setattr(batch, 'CHUNK_TOKENS', 20)
+    code = ''.join(f'def f{i}(x):\n    return x + {i}\n\n' for i in range(12))
+    for name in ('a.py', 'b.py'):
+        (tmp_path / name).write_text(code)
+    before = scheduler.SCHEDULER.slots
+    assert batch.main([str(tmp_path / '*.py'), '--model', 'm', '--jobs', '1']) == 0
+    assert scheduler.SCHEDULER.slots == before
+    assert peak == 1
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(records) == 2 and all('### Part 1/' in r['output'] for r in records)
+    assert all(r['timing']['ttft_s'] >= 0.1 for r in records)  # not the moment the first heading was written
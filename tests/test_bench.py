@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bench.replay import RECORDINGS, load_recording, rechunk
+from bench.run_bench import compare, flatten
+
+
+def test_recording_replays_in_requested_chunk_sizes():
+    chunks = load_recording(RECORDINGS / 'explain_python.ndjson')
+    text = ''.join(chunks)
+    assert '```python' in text and len(chunks) > 100
+    assert rechunk(chunks, 0) == chunks
+    resized = rechunk(chunks, 16)
+    assert ''.join(resized) == text
+    assert all(len(c) == 16 for c in resized[:-1])
+
+
+def test_compare_flags_only_meaningful_regressions():
+    baseline = {'results': {'stream': {'chunks_per_s': 400.0, 'total_s': 4.0, 'ttft_ms': 5.0},
+                            'ui': {'gui_busy_pct': 4.0, 'frames': 70}}}
+    current = {'results': {'stream': {'chunks_per_s': 300.0, 'total_s': 4.1, 'ttft_ms': 6.5},
+                           'ui': {'gui_busy_pct': 9.0, 'frames': 70}}}
+    regressions = compare(current, baseline, tolerance=0.15)
+    assert [r.split(':')[0] for r in regressions] == ['stream.chunks_per_s', 'ui.gui_busy_pct']
+    assert compare(baseline, baseline, tolerance=0.0) == []
+    assert 'stream.ttft_ms' in flatten(current['results'])
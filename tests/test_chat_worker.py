@@ -24,6 +24,7 @@ def load_worker(monkeypatch):
 
     monkeypatch.setitem(sys.modules, 'PySide6', pyside6)
     monkeypatch.setitem(sys.modules, 'PySide6.QtCore', qtcore)
+    import latency  # imports the real requests before it is replaced
     monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(post=lambda *a, **k: None))
     import workers.chat_worker as cw
     return importlib.reload(cw)
@@ -56,6 +57,7 @@ def load_worker_thread(monkeypatch, stream_impl):
 
     monkeypatch.setitem(sys.modules, 'PySide6', pyside6)
     monkeypatch.setitem(sys.modules, 'PySide6.QtCore', qtcore)
+    import latency  # imports the real requests before it is replaced
     monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(post=lambda *a, **k: None))
     import workers.chat_worker as cw
     cw = importlib.reload(cw)
@@ -78,7 +80,7 @@ def test_build_prompt(monkeypatch):
 
 
 def test_worker_stop(monkeypatch):
-    def fake_stream(prompt, out_q, model=None, stop_event=None):
+    def fake_stream(prompt, out_q, model=None, stop_event=None, **kwargs):
         out_q.put('hi')
         while not (stop_event and stop_event.is_set()):
             time.sleep(0.01)
@@ -93,3 +95,25 @@ def test_worker_stop(monkeypatch):
     worker.stop()
     worker.wait(500)
     assert chunks == ['hi']
+
+
+def test_set_priority_raises_the_running_thread(monkeypatch):
+    qtcore = pytest.importorskip('PySide6.QtCore')
+    import latency  # noqa: F401  (the real requests, before other tests replace it)
+    monkeypatch.delitem(sys.modules, 'workers.chat_worker', raising=False)
+    import workers.chat_worker as cw
+    from scheduler import PRIORITY_INTERACTIVE, PRIORITY_SPECULATIVE
+
+    def fake_stream(prompt, out_q, model=None, stop_event=None, **kwargs):
+        stop_event.wait(5)
+        out_q.put(None)
+
+    monkeypatch.setattr(cw, 'stream_ollama', fake_stream)
+    worker = cw.ChatWorker([], model='x', priority=PRIORITY_SPECULATIVE)
+    worker.start(qtcore.QThread.LowestPriority)
+    try:
+        worker.set_priority(PRIORITY_INTERACTIVE)
+        assert qtcore.QThread.priority(worker) == qtcore.QThread.NormalPriority  # the attribute shadows priority()
+    finally:
+        worker.stop()
+        assert worker.wait(2000)
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from chunking import split_code
+from utils import estimate_tokens
+
+
+def _python_module(n_funcs: int, body_lines: int = 20) -> str:
+    parts = []
+    for i in range(n_funcs):
+        body = "".join(f"    x{j} = {j} * {i}\n" for j in range(body_lines))
+        parts.append(f"@decorator\ndef func_{i}(a, b):\n{body}    return a\n\n")
+    return "".join(parts)
+
+
+def test_small_code_is_single_chunk():
+    chunks = split_code("print(1)\n", "python", 100)
+    assert len(chunks) == 1
+    assert chunks[0].start_line == 1 and chunks[0].end_line == 1
+
+
+def test_chunks_cover_code_in_order_and_respect_budget():
+    code = _python_module(12)
+    chunks = split_code(code, "python", 400)
+    assert len(chunks) > 1
+    assert "".join(c.text for c in chunks) == code
+    assert all(estimate_tokens(c.text) <= 400 for c in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur.start_line == prev.end_line + 1
+
+
+def test_cuts_land_on_definitions_with_their_decorators():
+    chunks = split_code(_python_module(12), "python", 400)
+    for c in chunks:
+        assert c.text.startswith("@decorator\ndef func_")
+
+
+def test_falls_back_to_member_level_when_class_is_too_big():
+    methods = "".join(
+        f"    def m{i}(self):\n" + "".join(f"        y = {j}\n" for j in range(30)) + "\n"
+        for i in range(10)
+    )
+    code = "class Big:\n" + methods
+    chunks = split_code(code, "python", 300)
+    assert len(chunks) > 1
+    assert all(c.text.lstrip().startswith(("class Big", "def m")) for c in chunks)
+
+
+def test_unknown_language_hard_splits_at_blank_lines():
+    code = "".join(("word " * 20 + "\n") * 5 + "\n" for _ in range(10))
+    chunks = split_code(code, "plaintext", 200)
+    assert "".join(c.text for c in chunks) == code
+    assert len(chunks) > 1
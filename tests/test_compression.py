@@ -0,0 +1,84 @@
+import ast
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from compression import compress
+
+PY = '''#!/usr/bin/env python
+# Copyright 2024 Example Corp.
+# Licensed under the MIT license.
+"""Module summary.
+
+Details that the model does not need.
+"""
+import os  # for paths
+
+TABLE = [
+''' + "".join(f"    {i}, {i * 2}, 0x{i:02x},\n" for i in range(30)) + '''
+]
+BLOB = "''' + "x" * 400 + '''"
+
+
+class Thing:
+    """Thing summary.
+
+    More text.
+    """
+
+    def only_doc(self):
+        """Body is just this docstring."""
+
+    def join(self, parts):
+        marker = "# not a comment"
+        return """-""".join(parts) + marker
+'''
+
+
+def test_python_strips_comments_and_shortens_docstrings_but_stays_valid():
+    result = compress(PY, 'python')
+    text = result.text
+    ast.parse(text)
+    assert text.startswith('#!/usr/bin/env python')
+    assert 'Copyright' not in text and 'for paths' not in text
+    assert '"""Module summary."""' in text and 'More text' not in text
+    assert '"# not a comment"' in text and '"""-""".join' in text
+    assert '"…(402 chars)"' in text
+    assert '… 27 similar lines elided …' in text
+    assert '\n  def join(self, parts):\n    marker' in text  # 4-space indentation halved
+    assert result.removed == {'comments': 3, 'docstrings': 2, 'literals': 1, 'data_lines': 27}
+    assert result.after_tokens < result.before_tokens / 3
+    assert result.summary().startswith(f'{result.before_tokens} → {result.after_tokens} tokens (−')
+
+
+def test_c_like_comments_respect_strings_and_keep_doc_summary():
+    js = '''/*
+ * License header
+ */
+/**
+ * Adds two numbers.
+ * @param a first
+ */
+function add(a, b) {
+    // explain
+    const url = "http://example.com/a"; // trailing
+    return a + b; /* inline */
+}
+'''
+    text = compress(js, 'javascript').text
+    assert text == '''/** Adds two numbers. */
+function add(a, b) {
+  const url = "http://example.com/a";
+  return a + b;
+}'''
+
+
+def test_fragments_and_unknown_languages_fall_back_safely():
+    fragment = '    def method(self):\n        x = "unterminated (\n        # note\n        return x\n'
+    text = compress(fragment, 'python').text
+    assert 'note' not in text and text.startswith('def method(self):')
+    shell = 'echo ${#items[@]} $#  # count\n# only a comment\necho done\n'
+    assert compress(shell, 'bash').text == 'echo ${#items[@]} $#\necho done'
+    plain = 'keep # this\n\n\n\nand this'
+    assert compress(plain, 'plaintext').text == 'keep # this\n\nand this'
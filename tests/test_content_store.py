@@ -0,0 +1,48 @@
+import gc
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from content_store import STORE, Message, SharedText
+from live_context import LiveRegion
+from utils import chat_prompt
+
+
+def test_equal_texts_are_stored_once_and_dropped_with_the_last_reference():
+    before = STORE.stats()["texts"]
+    a = SharedText("".join(["x = 1\n"] * 1000))  # built at runtime: not the same string object
+    b = SharedText("".join(["x = 1\n"] * 1000))
+    assert a.key == b.key and a.text is b.text
+    assert STORE.stats()["texts"] == before + 1
+    del a
+    gc.collect()
+    assert b.text.startswith("x = 1")
+    del b
+    gc.collect()
+    assert STORE.stats()["texts"] == before
+
+
+def test_derived_values_are_computed_once_per_text():
+    calls = []
+    a, b = SharedText("def f(): pass"), SharedText("def f(): pass")
+    make = lambda: calls.append(1) or "compressed"
+    assert a.derived("compress", make) == b.derived("compress", make) == "compressed"
+    assert calls == [1]
+    assert SharedText("def g(): pass").derived("compress", make) and calls == [1, 1]
+
+
+def test_messages_read_like_dicts():
+    history = [Message("system", "You are helpful."), Message("user", "Explain")]
+    assert chat_prompt(history) == chat_prompt([m.as_dict() for m in history])
+    assert history[1]["role"] == "user" and history[1].get("content") == "Explain"
+    assert history[1].get("images") is None
+
+
+def test_regions_on_the_same_file_share_its_lines():
+    text = "".join(f"line {i}\n" for i in range(100))
+    first, second = LiveRegion(text, 10, 20), LiveRegion(str(text.encode().decode()), 10, 20)
+    assert first._lines is second._lines
+    assert not second.update(text.replace("line 0\n", ""))  # lines above moved, the region did not change
+    assert second._lines is not first._lines
+    assert (second.start, second.end) == (9, 19)
@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from diff_apply import DiffError, StreamingDiffCheck, apply_markdown_diff, extract_diff, parse_hunks
+
+ORIGINAL = ''.join(f'line {i}\n' for i in range(1, 41))
+
+ANSWER = '''Here is the change:
+
+```diff
+--- a/x.py
++++ b/x.py
+@@ -3,3 +3,3 @@
+ line 3
+-line 4
++LINE FOUR
+ line 5
+@@ -90,2 +90,3 @@
+ line 30
++inserted
+ line 31
+```
+
+- renamed line 4
+'''
+
+
+def test_applies_hunks_by_context_even_with_wrong_line_numbers():
+    patched = apply_markdown_diff(ORIGINAL, ANSWER)
+    lines = patched.splitlines()
+    assert lines[3] == 'LINE FOUR'
+    assert lines[29:32] == ['line 30', 'inserted', 'line 31']
+    assert len(lines) == 41 and patched.endswith('\n')
+
+
+def test_file_headers_are_not_hunk_lines_but_removed_dashes_are():
+    hunks = parse_hunks('--- a/f\n+++ b/f\n@@ -1,2 +1,1 @@\n--- not a header\n keep\n')
+    assert hunks[0].old == ['-- not a header', 'keep'] and hunks[0].new == ['keep']
+
+
+def test_whitespace_tolerant_match_and_missing_context_space():
+    original = 'a = 1   \n\nb = 2\n'
+    patched = apply_markdown_diff(original, '```diff\n@@ -1,3 +1,3 @@\n a = 1\n\n-b = 2\n+b = 3\n```')
+    assert patched == 'a = 1\n\nb = 3\n'
+
+
+def test_mismatch_raises():
+    with pytest.raises(DiffError):
+        apply_markdown_diff(ORIGINAL, '```diff\n@@ -1,1 +1,1 @@\n-not in the file\n+x\n```')
+    with pytest.raises(DiffError):
+        apply_markdown_diff(ORIGINAL, 'I rewrote it:\n```python\nprint(1)\n```')
+
+
+def test_extract_diff_skips_other_blocks():
+    md = '```python\nx = 1\n```\n\n```\n@@ -1 +1 @@\n-a\n+b\n```'
+    assert extract_diff(md) == '@@ -1 +1 @@\n-a\n+b'
+
+
+def test_stream_check_fails_at_first_bad_hunk():
+    bad = ANSWER.replace(' line 30\n', ' line 300\n')
+    check = StreamingDiffCheck(ORIGINAL)
+    errors = []
+    for i in range(0, len(bad), 7):
+        errors.append(check.feed(bad[i:i + 7]))
+    first = next(i for i, e in enumerate(errors) if e)
+    assert 'does not match' in errors[first]
+    # reported once the bad hunk is complete, before the explanation streams in
+    assert first * 7 < bad.index('- renamed')
+
+
+def test_stream_check_accepts_good_diff_and_rejects_full_rewrite():
+    check = StreamingDiffCheck(ORIGINAL)
+    assert all(check.feed(ANSWER[i:i + 5]) is None for i in range(0, len(ANSWER), 5))
+    check = StreamingDiffCheck(ORIGINAL)
+    assert check.feed('Sure:\n```python\n') == 'the answer started a python block instead of a diff'
+
+
+def test_stream_check_looks_at_each_hunk_once(monkeypatch):
+    import diff_apply
+    original = ''.join(f'line {i}\n' for i in range(1, 2001))
+    answer = '```diff\n' + ''.join(f'@@ -{i},1 +{i},1 @@\n-line {i}\n+LINE {i}\n' for i in range(1, 2001, 10)) + '```\n'
+    located, reparsed = [], []
+    real = diff_apply.locate
+    monkeypatch.setattr(diff_apply, 'locate', lambda *a: located.append(a[1].old_start) or real(*a))
+    monkeypatch.setattr(diff_apply, 'extract_diff', lambda *a: reparsed.append(1))
+    check = StreamingDiffCheck(original)
+    assert all(check.feed(answer[i:i + 3]) is None for i in range(0, len(answer), 3))
+    assert located == list(range(1, 2001, 10)) and not reparsed  # no rescan of the text so far
+    monkeypatch.undo()
+    assert apply_markdown_diff(original, answer).count('LINE') == 200
@@ -0,0 +1,121 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("requests")
+
+from bench.fake_ollama import FakeOllama
+
+
+def load_index(monkeypatch, cache_dir):
+    monkeypatch.setenv('MODEL_LIST', 'm')
+    monkeypatch.setenv('LOCALPILOT_CACHE', str(cache_dir))
+    for name in ('requests', 'config', 'chunking', 'symbol_index', 'embedding_index'):
+        sys.modules.pop(name, None)
+    import embedding_index
+    return importlib.reload(embedding_index)
+
+
+def make_project(root: Path):
+    (root / ".git").mkdir(parents=True)
+    (root / "billing.py").write_text(
+        "def compute_invoice_total(lines):\n    return sum(l.price for l in lines)\n\n\n"
+        "def render_invoice(invoice):\n    return str(invoice)\n"
+    )
+    (root / "shipping.py").write_text("def estimate_shipping_cost(parcel):\n    return parcel.weight * 2\n")
+
+
+def test_mentions_outside_code(monkeypatch, tmp_path):
+    ei = load_index(monkeypatch, tmp_path)
+    selection = "def f(x):\n    return helper_fn(x)\n"
+    assert ei.mentions_outside_code("where is this called from?", selection)
+    assert ei.mentions_outside_code("how does `parse_config` relate?", selection)
+    assert ei.mentions_outside_code("compare with loadUser()", selection)
+    assert not ei.mentions_outside_code("what does helper_fn return here?", selection)
+    assert not ei.mentions_outside_code("explain this", selection)
+
+
+def test_index_batches_searches_and_updates_incrementally(monkeypatch, tmp_path):
+    ei = load_index(monkeypatch, tmp_path / "cache")
+    root = tmp_path / "proj"
+    make_project(root)
+    with FakeOllama() as server:
+        idx = ei.EmbeddingIndex(str(root), model="emb", cache_dir=str(tmp_path / "cache"),
+                                base_url=server.base_url)
+        assert idx.update() == 2
+        assert len(server.calls("/api/embed")) == 1  # both chunks in one batch
+
+        hits = idx.search("estimate_shipping_cost parcel weight", k=1)
+        assert hits[0]["path"] == "shipping.py"
+        assert hits[0]["code"].startswith("def estimate_shipping_cost")
+
+        assert idx.update() == 0
+        assert len(server.calls("/api/embed")) == 2  # only the query above
+
+        # a fresh process reuses the on-disk vectors (memory-mapped) without re-embedding
+        reloaded = ei.EmbeddingIndex(str(root), model="emb", cache_dir=str(tmp_path / "cache"),
+                                     base_url=server.base_url)
+        assert reloaded.ready.is_set()
+        assert isinstance(reloaded._vectors, np.memmap)
+        (root / "shipping.py").write_text(
+            "def estimate_shipping_cost(parcel):\n    return parcel.weight * 2\n\n\n"
+            "def track_parcel(code):\n    return code\n"
+        )
+        os.utime(root / "shipping.py", (1, 1))
+        embedded_before = len(server.calls("/api/embed"))
+        assert reloaded.update() == 1
+        assert len(server.calls("/api/embed")) == embedded_before + 1
+        assert server.calls("/api/embed")[-1]["input"][0].startswith("shipping.py\n")
+
+
+def test_context_for_skips_selection_and_formats(monkeypatch, tmp_path):
+    ei = load_index(monkeypatch, tmp_path / "cache")
+    root = tmp_path / "proj"
+    make_project(root)
+    with FakeOllama() as server:
+        idx = ei.EmbeddingIndex(str(root), model="emb", cache_dir=str(tmp_path / "cache"),
+                                base_url=server.base_url)
+        idx.update()
+        selection = (root / "shipping.py").read_text()
+        hits = idx.context_for("how is compute_invoice_total used with estimate_shipping_cost?", selection)
+        assert [h["path"] for h in hits] == ["billing.py"]
+        text = ei.format_hits(hits, lambda p: "python")
+        assert "billing.py:1-" in text and "```python" in text
+
+
+def test_missing_model_is_checked_once_and_never_embedded(monkeypatch, tmp_path):
+    ei = load_index(monkeypatch, tmp_path / "cache")
+    root = tmp_path / "proj"
+    make_project(root)
+    with FakeOllama(models=("m",)) as server:
+        for _ in range(3):  # a tab per file of the project
+            idx = ei.EmbeddingIndex(str(root), model="emb", cache_dir=str(tmp_path / "cache"),
+                                    base_url=server.base_url)
+            idx.refresh_async()
+            idx._thread.join(5)
+            assert idx.context_for("where is compute_invoice_total used?", "") == []
+        assert len(server.calls("/api/tags")) == 1
+        assert server.calls("/api/embed") == []
+
+
+def test_reindex_goes_through_the_pool_and_waits_for_a_free_slot(monkeypatch, tmp_path):
+    ei = load_index(monkeypatch, tmp_path / "cache")
+    from endpoints import EndpointPool
+    from scheduler import PRIORITY_INTERACTIVE, SlotScheduler
+    root = tmp_path / "proj"
+    make_project(root)
+    with FakeOllama(models=("m", "emb")) as server:
+        monkeypatch.setattr(ei, "POOL", EndpointPool([server.base_url]))
+        monkeypatch.setattr(ei, "SCHEDULER", SlotScheduler(1))
+        assert ei.SCHEDULER.acquire(PRIORITY_INTERACTIVE)  # an answer is streaming
+        idx = ei.EmbeddingIndex(str(root), model="emb", cache_dir=str(tmp_path / "cache"))
+        idx.refresh_async()
+        assert not idx.ready.wait(0.3) and server.calls("/api/embed") == []
+        ei.SCHEDULER.release()
+        assert idx.ready.wait(5) and len(server.calls("/api/embed")) == 1
@@ -0,0 +1,111 @@
+import importlib
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("requests")
+
+from bench.fake_ollama import FakeOllama
+
+
+def load_modules(monkeypatch, urls):
+    monkeypatch.setenv('MODEL_LIST', 'm')
+    monkeypatch.setenv('OLLAMA_URLS', ','.join(urls))
+    for name in ('requests', 'config', 'endpoints', 'scheduler', 'ollama_client'):
+        sys.modules.pop(name, None)
+    import endpoints
+    import ollama_client
+    return importlib.reload(endpoints), importlib.reload(ollama_client)
+
+
+def drain(q):
+    out = []
+    while (item := q.get(timeout=5)) is not None:
+        out.append(item)
+    return out
+
+
+def test_choose_prefers_loaded_then_least_busy(monkeypatch):
+    ep_mod, _ = load_modules(monkeypatch, ['http://a/api', 'http://b/api', 'http://c/api'])
+    pool = ep_mod.EndpointPool(['http://a/api', 'http://b/api', 'http://c/api'])
+    monkeypatch.setattr(pool, 'start_health_checks', lambda: None)
+    a, b, c = pool.endpoints
+    a.models, b.models, c.models = {'m'}, {'m'}, {'other'}
+    b.loaded = {'m'}
+    assert pool.choose('m') is b
+    b.in_flight = 1
+    assert pool.choose('m') is b  # loaded beats idle-but-cold
+    b.loaded = set()
+    assert pool.choose('m') is a  # least loaded once neither has it in memory
+    a.healthy = False
+    assert pool.choose('m') is b
+    assert pool.choose('m', exclude=[b]) is c  # nothing else left: try anyway
+    assert pool.choose('m', exclude=[a, b, c]) is None
+
+
+def test_choose_keeps_a_conversation_on_its_warm_endpoint(monkeypatch):
+    monkeypatch.setenv('OLLAMA_NUM_PARALLEL', '2')
+    ep_mod, _ = load_modules(monkeypatch, ['http://a/api', 'http://b/api'])
+    pool = ep_mod.EndpointPool(['http://a/api', 'http://b/api'])
+    monkeypatch.setattr(pool, 'start_health_checks', lambda: None)
+    a, b = pool.endpoints
+    a.models = b.models = a.loaded = b.loaded = {'m'}
+    a.in_flight = 1
+    assert pool.choose('m') is b
+    assert pool.choose('m', prefer='http://a/api') is a  # its server caches the prefix and has a free slot
+    a.in_flight = 2
+    assert pool.choose('m', prefer='http://a/api') is b  # full: waiting would cost more than the prefix
+    a.in_flight, a.healthy = 0, False
+    assert pool.choose('m', prefer='http://a/api') is b
+    assert pool.choose('m', prefer='http://gone/api') is b
+
+
+def test_routes_to_server_with_model_loaded(monkeypatch):
+    with FakeOllama(models=['m'], tokens=['cold']) as cold, \
+            FakeOllama(models=['m'], loaded=['m'], tokens=['warm']) as warm:
+        ep_mod, client = load_modules(monkeypatch, [cold.base_url, warm.base_url])
+        ep_mod.POOL.refresh()
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='m')
+        assert drain(q) == ['warm']
+        assert not cold.calls('/api/generate')
+        assert all(e['in_flight'] == 0 for e in ep_mod.POOL.status())
+
+
+def test_fails_over_when_endpoint_is_down(monkeypatch):
+    with FakeOllama(models=['m'], tokens=['ok']) as alive:
+        dead = FakeOllama(models=['m'], loaded=['m'])
+        dead_url = dead.base_url
+        dead._httpd.server_close()
+        ep_mod, client = load_modules(monkeypatch, [dead_url, alive.base_url])
+        monkeypatch.setattr(ep_mod.POOL, 'start_health_checks', lambda: None)
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='m')
+        assert drain(q) == ['ok']
+        assert ep_mod.POOL.endpoints[0].healthy is False
+
+
+def test_mid_stream_failure_continues_on_next_endpoint(monkeypatch):
+    with FakeOllama(models=['m'], loaded=['m'], tokens=['one ', 'two ', 'three'], fail_after=2) as flaky, \
+            FakeOllama(models=['m'], tokens=['three']) as backup:
+        ep_mod, client = load_modules(monkeypatch, [flaky.base_url, backup.base_url])
+        monkeypatch.setattr(ep_mod.POOL, 'start_health_checks', lambda: None)
+        ep_mod.POOL.endpoints[0].loaded = {'m'}
+        q = queue.Queue()
+        client.stream_ollama('prompt:', q, model='m')
+        assert ''.join(drain(q)) == 'one two three'
+        assert backup.calls('/api/generate')[0]['prompt'] == 'prompt:one two '
+
+
+def test_all_endpoints_down_reports_error(monkeypatch):
+    dead = FakeOllama()
+    url = dead.base_url
+    dead._httpd.server_close()
+    _, client = load_modules(monkeypatch, [url])
+    q = queue.Queue()
+    client.stream_ollama('p', q, model='m')
+    assert drain(q)[0].startswith('\n[Error]')
@@ -0,0 +1,69 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from journal import JournalWriter, SessionJournal, read_journal, recover
+
+STATE = {"file_name": "a.py", "filepath": None, "code": "x = 1", "selection_range": None,
+         "history": [{"role": "system", "content": "s"}, {"role": "user", "content": "Explain"}]}
+
+
+def test_chunks_are_written_in_batches(tmp_path):
+    writer = JournalWriter(flush_bytes=1 << 20, flush_interval=60)
+    journal = SessionJournal("s1", tmp_path, writer)
+    journal.begin(STATE, "m")
+    for i in range(200):
+        journal.append(f"tok{i} ")
+    assert not journal.journal_path.exists()  # nothing due yet: below the size bound, within the interval
+    assert writer.flush(5)
+    lines = journal.journal_path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(l)["t"] for l in lines] == ["begin", "text"]
+    assert read_journal(journal.journal_path)[1] == "".join(f"tok{i} " for i in range(200))
+    assert writer.batches == 1
+
+
+def test_size_bound_writes_before_the_interval(tmp_path):
+    writer = JournalWriter(flush_bytes=64, flush_interval=60)
+    journal = SessionJournal("s1", tmp_path, writer)
+    journal.begin(STATE)
+    journal.append("x" * 100)
+    deadline = time.monotonic() + 5
+    while not journal.journal_path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert read_journal(journal.journal_path)[1] == "x" * 100
+
+
+def test_interrupted_answer_is_recovered_and_a_torn_line_skipped(tmp_path):
+    writer = JournalWriter(flush_interval=0.01)
+    journal = SessionJournal("s1", tmp_path, writer)
+    journal.begin(STATE, "qwen")
+    journal.append("The function ")
+    journal.append("adds one.")
+    writer.flush(5)
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"t": "text", "s": "lost in the cra')  # the process died mid-write
+
+    [session] = recover(tmp_path)
+    assert session.id == "s1" and session.model == "qwen"
+    assert session.partial == "The function adds one."
+    assert session.state["history"] == STATE["history"]
+
+
+def test_completed_answer_compacts_into_the_store(tmp_path):
+    writer = JournalWriter(flush_interval=0.01)
+    journal = SessionJournal("s1", tmp_path, writer)
+    journal.begin(STATE)
+    journal.append("done")
+    journal.save({**STATE, "history": STATE["history"] + [{"role": "assistant", "content": "done"}]})
+    writer.flush(5)
+    assert not journal.journal_path.exists()
+    [session] = recover(tmp_path)
+    assert session.partial is None and session.state["history"][-1]["content"] == "done"
+
+    journal.discard()  # tab closed
+    (tmp_path / "orphan.journal").write_text('{"t": "begin", "turn": 1}\n', encoding="utf-8")
+    writer.flush(5)
+    assert recover(tmp_path) == [] and list(tmp_path.iterdir()) == []
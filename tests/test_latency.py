@@ -0,0 +1,177 @@
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("requests")
+
+from bench.fake_ollama import FakeOllama
+
+
+def load_client(monkeypatch, urls, **thresholds):
+    monkeypatch.setenv('MODEL_LIST', 'm')
+    monkeypatch.setenv('OLLAMA_URLS', ','.join(urls))
+    for name in ('requests', 'config', 'endpoints', 'scheduler', 'latency', 'ollama_client'):
+        sys.modules.pop(name, None)
+    import latency
+    import ollama_client
+    for key, value in thresholds.items():
+        monkeypatch.setattr(latency, key, value)
+    return ollama_client
+
+
+def drain(q):
+    out = []
+    while (item := q.get(timeout=10)) is not None:
+        out.append(item)
+    return out
+
+
+def test_timeline_records_phases(monkeypatch):
+    with FakeOllama(tokens=['a', 'b', 'c'], token_delay=0.05) as srv:
+        client = load_client(monkeypatch, [srv.base_url])
+        timeline = client.RequestTimeline()
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='m', timeline=timeline)
+        assert drain(q) == ['a', 'b', 'c']
+    summary = timeline.summary()
+    assert summary['endpoint'] == srv.base_url
+    assert summary['tokens'] == 3
+    assert 0 <= summary['connect_s'] <= summary['ttft_s']
+    assert summary['max_gap_s'] >= 0.03
+
+
+def test_reports_model_loading_while_waiting(monkeypatch):
+    with FakeOllama(tokens=['hi'], first_delay=0.8) as srv:
+        client = load_client(monkeypatch, [srv.base_url], STATUS_DELAY=0.2)
+        notes = []
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='m', on_status=notes.append)
+        assert drain(q) == ['hi']
+    assert any('model loading' in n for n in notes)
+    assert srv.calls('/api/ps')
+
+
+def test_stall_fails_over_and_continues(monkeypatch):
+    with FakeOllama(loaded=['m'], tokens=['one ', 'two ', 'three'], stall_after=2, stall_for=2) as slow, \
+            FakeOllama(tokens=['three']) as backup:
+        client = load_client(monkeypatch, [slow.base_url, backup.base_url], STALL_TIMEOUT=0.3)
+        monkeypatch.setattr(client.POOL, 'start_health_checks', lambda: None)
+        client.POOL.endpoints[0].loaded = {'m'}
+        q = queue.Queue()
+        client.stream_ollama('prompt:', q, model='m')
+        assert ''.join(drain(q)) == 'one two three'
+        assert backup.calls('/api/generate')[0]['prompt'] == 'prompt:one two '
+        assert 'stalled' in client.POOL.endpoints[0].error
+
+
+def test_slow_first_token_switches_to_fallback_model(monkeypatch):
+    with FakeOllama(models=['big', 'small'], tokens=['ok'], first_delay={'big': 2}) as srv:
+        client = load_client(monkeypatch, [srv.base_url], TTFT_TIMEOUT=0.3)
+        monkeypatch.setattr(client, 'FALLBACK_MODEL', 'small')
+        notes = []
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='big', on_status=notes.append)
+        assert drain(q) == ['ok']
+    assert [c['model'] for c in srv.calls('/api/generate')] == ['big', 'small']
+    assert any('switching to small' in n for n in notes)
+
+
+def test_stats_from_final_record(monkeypatch):
+    with FakeOllama(tokens=['a', 'b'], first_delay=0.2) as srv:
+        client = load_client(monkeypatch, [srv.base_url])
+        timeline = client.RequestTimeline()
+        q = queue.Queue()
+        client.stream_ollama('four', q, model='m', timeline=timeline)
+        drain(q)
+    stats = timeline.stats()
+    assert stats['model'] == 'm'
+    assert stats['gen_tokens'] == 2 and stats['gen_tps'] > 0
+    assert stats['prompt_tokens'] == 4 and stats['prompt_tps'] == 4000.0
+    assert stats['load_s'] == pytest.approx(0.2, abs=0.01)
+    assert stats['ttft_s'] >= 0.2
+
+
+def test_stop_event_aborts_connection_and_releases_slot(monkeypatch):
+    import threading
+    import time
+
+    with FakeOllama(tokens=['a', 'b', 'c'], token_delay=1.0) as srv:
+        client = load_client(monkeypatch, [srv.base_url])
+        stop = client.StopEvent()
+        q = queue.Queue()
+        t = threading.Thread(target=client.stream_ollama, args=('p', q), kwargs={'model': 'm', 'stop_event': stop})
+        t.start()
+        assert q.get(timeout=5) == 'a'
+        assert client.SCHEDULER.in_use == 1
+        started = time.perf_counter()
+        stop.set()
+        t.join(timeout=5)
+        assert time.perf_counter() - started < 0.5  # not waiting for the next token
+        assert q.get(timeout=1) is None
+        assert client.SCHEDULER.in_use == 0
+        assert client.POOL.endpoints[0].healthy  # a cancel is not an endpoint failure
+
+
+def test_stop_before_the_response_headers_aborts_the_request(monkeypatch):
+    import threading
+    import time
+
+    with FakeOllama(tokens=['a'], header_delay=3.0) as srv:  # loading the model: no headers yet
+        client = load_client(monkeypatch, [srv.base_url])
+        stop = client.StopEvent()
+        q = queue.Queue()
+        t = threading.Thread(target=client.stream_ollama, args=('p', q), kwargs={'model': 'm', 'stop_event': stop})
+        t.start()
+        deadline = time.monotonic() + 5
+        while not srv.calls('/api/generate') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        started = time.perf_counter()
+        stop.set()
+        t.join(timeout=5)
+        assert time.perf_counter() - started < 0.5  # not waiting for the headers
+        assert q.get(timeout=1) is None
+        assert client.SCHEDULER.in_use == 0
+        assert client.POOL.endpoints[0].healthy
+
+
+def test_stop_event_callbacks():
+    sys.modules.pop('ollama_client', None)
+    from ollama_client import StopEvent
+
+    calls = []
+    stop = StopEvent()
+    unregister = stop.on_set(lambda: calls.append('first'))
+    stop.on_set(lambda: calls.append('second'))
+    unregister()
+    stop.set()
+    stop.on_set(lambda: calls.append('late'))  # already set: runs immediately
+    assert calls == ['second', 'late'] and stop.is_set()
+
+
+def test_generation_options_and_early_stop_at_closing_fence(monkeypatch):
+    tokens = ['Sure:\n```py\n', 'x = 1\n', '```\n', 'Explanation ', 'that goes on']
+    with FakeOllama(tokens=tokens, token_delay=0.05) as srv:
+        client = load_client(monkeypatch, [srv.base_url])
+        timeline = client.RequestTimeline()
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='m', timeline=timeline, options={'num_predict': 99, 'stop': ['\nuser:']},
+                             stop_after_fence=True)
+        assert ''.join(drain(q)) == 'Sure:\n```py\nx = 1\n```\n'
+        assert srv.calls('/api/generate')[0]['options'] == {'temperature': client.TEMP, 'num_predict': 99,
+                                                             'stop': ['\nuser:']}
+    assert timeline.stats()['stop_reason'] == 'artifact'
+
+
+def test_token_budget_reports_length_stop(monkeypatch):
+    with FakeOllama(tokens=['a', 'b', 'c']) as srv:
+        client = load_client(monkeypatch, [srv.base_url])
+        timeline = client.RequestTimeline()
+        q = queue.Queue()
+        client.stream_ollama('p', q, model='m', timeline=timeline, options={'num_predict': 2})
+        assert drain(q) == ['a', 'b']
+    assert timeline.stats()['stop_reason'] == 'length'
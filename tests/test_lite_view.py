@@ -0,0 +1,65 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+QtWidgets = pytest.importorskip('PySide6.QtWidgets')
+
+from PySide6.QtCore import QUrl
+from PySide6.QtGui import QGuiApplication
+
+from ui.lite_view import LiteTranscript, highlight
+
+ANSWER = '<p>Use this:</p>\n<pre><code class="language-python">x = 1  # one\nprint(&quot;x&quot;)\n</code></pre>\n'
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def test_incremental_updates_match_a_full_render(app):
+    view = LiteTranscript()
+    blocks = ['<div class="role">you</div>', '<p>question</p>', '<div class="role">assistant</div>', '']
+    view.set_blocks(blocks)
+    start = view._starts[3]
+    for end in range(10, len(ANSWER), 10):
+        blocks[3] = ANSWER[:end]
+        view.set_blocks(blocks)
+        assert view._starts[3] == start  # earlier blocks were not re-inserted
+    blocks[3] = ANSWER
+    view.set_blocks(blocks)
+    full = LiteTranscript()
+    full.set_blocks(list(blocks))
+    assert view.toPlainText() == full.toPlainText()
+    assert view.toPlainText().startswith('you\nquestion\nassistant\nUse this:\nx = 1  # one')
+    view.set_blocks(blocks[:2])
+    assert view.toPlainText() == 'you\nquestion' and view._code == {}
+
+
+def test_code_blocks_get_copy_links_and_highlighting(app):
+    view = LiteTranscript()
+    done = []
+    view.set_blocks(['<p>intro</p>', ANSWER], lambda: done.append(True))
+    assert done == [True]
+    assert 'Copy python' in view.toPlainText()
+    view._on_anchor(QUrl('copy:1/0'))
+    assert QGuiApplication.clipboard().text() == 'x = 1  # one\nprint("x")'
+    html = highlight('s = "# no"  # yes\nif x: return 0x1F', 'python')
+    assert '<span style="color:#98c379">&quot;# no&quot;</span>' in html
+    assert '<span style="color:#7f848e"># yes</span>' in html
+    assert html.count('font-weight:bold') == 2 and '#d19a66">0x1F<' in html
+    assert highlight('-a\n+b\n c', 'diff').endswith('+b</span>\n c')
+
+
+def test_localpilot_links_become_commands(app):
+    view = LiteTranscript()
+    seen = []
+    view.command.connect(lambda url: seen.append(url.toString()))
+    view.set_blocks(['<div class="role">you <a href="localpilot://fork/1">fork</a></div>', '<p>q</p>'])
+    view._on_anchor(QUrl('localpilot://fork/1'))
+    assert seen == ['localpilot://fork/1']
@@ -0,0 +1,75 @@
+import difflib
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import live_context
+from live_context import WINDOW_LINES, LiveRegion
+
+SRC = "import os\n\ndef f(x):\n    y = x + 1\n    return y\n\ndef g():\n    pass\n"
+SELECTION = "def f(x):\n    y = x + 1\n    return y"
+
+
+def test_locate_prefers_the_editor_line_and_falls_back_to_search():
+    twice = SRC + "\n" + SELECTION + "\n"
+    assert LiveRegion.locate(twice, SELECTION, start_line=10).start == 9
+    region = LiveRegion.locate(twice, SELECTION, start_line=1)  # stale line number
+    assert (region.start, region.end) == (2, 5)
+    assert region.text == SELECTION + "\n"
+    assert LiveRegion.locate(SRC, "not there") is None
+    assert LiveRegion.locate(SRC, "  \n") is None
+
+
+def test_region_follows_edits_and_reports_a_file_numbered_diff():
+    region = LiveRegion.locate(SRC, SELECTION)
+    edited = "import os\nimport sys\n\n\ndef f(x):\n    y = x + 2\n    z = y * 2\n    return y\n\ndef g():\n    pass\n"
+    assert region.update(edited)
+    assert (region.start, region.end) == (4, 8)
+    change = region.take_change()
+    assert change.summary() == "lines 5–8, +2 −1"
+    assert change.diff.splitlines() == [
+        "@@ -3,3 +5,4 @@", " def f(x):", "-    y = x + 1", "+    y = x + 2", "+    z = y * 2", "     return y"]
+    assert "```diff\n@@ -3,3 +5,4 @@" in change.message("a.py")
+    assert region.take_change() is None  # the model is up to date
+
+
+def test_edits_outside_or_reverted_do_not_produce_a_change():
+    region = LiveRegion.locate(SRC, SELECTION)
+    assert not region.update("# header\n" + SRC + "# tail\n")
+    assert (region.start, region.end) == (3, 6) and not region.changed
+    region.update(SRC.replace("x + 1", "x - 1"))
+    assert region.changed
+    region.update(SRC)
+    assert not region.changed and region.take_change() is None
+
+
+def test_deleting_the_region_leaves_an_empty_range():
+    region = LiveRegion.locate(SRC, SELECTION)
+    region.update("import os\n\ndef g():\n    pass\n")
+    assert region.start == region.end
+    change = region.take_change()
+    assert change.removed == 3 and change.added == 0
+    assert change.summary().startswith("region deleted")
+
+
+def test_large_files_are_diffed_around_the_region_only(monkeypatch):
+    diffed = []
+    matcher = difflib.SequenceMatcher
+    monkeypatch.setattr(live_context.difflib, "SequenceMatcher",
+                        lambda junk, a, b, autojunk=True: diffed.append(len(a)) or matcher(junk, a, b, autojunk=autojunk))
+    body = "".join(f"    v{i} = {i}\n" for i in range(40))
+    text = "".join(f"def block_{k}():\n{body}\n" for k in range(300))  # 12k lines, mostly repeated
+    start = 150 * 42 + 11  # "    v10 = 10" of block_150
+    region = LiveRegion(text, start, start + 5)
+    edited = text.splitlines(keepends=True)
+    edited[start + 2] = "    v12 = -1\n"
+    edited[start + 400] = "    moved = 2\n"
+    for i in range(1000, len(edited), 2000):  # edits elsewhere in the file
+        edited[i] = f"# note {i}\n"
+    edited[:0] = ["# header\n"] * 7
+    assert region.update("".join(edited))
+    assert (region.start, region.end) == (start + 7, start + 12)
+    assert max(diffed) < 3 * WINDOW_LINES  # not the 12k lines of the file
+    assert region.take_change().diff.splitlines()[1:] == [
+        "     v10 = 10", "     v11 = 11", "-    v12 = 12", "+    v12 = -1", "     v13 = 13", "     v14 = 14"]
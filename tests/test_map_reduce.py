@@ -0,0 +1,86 @@
+import importlib
+import sys
+import threading
+import time
+import types
+
+
+def load_map_reduce(monkeypatch, stream_impl):
+    def no_server(*a, **k):
+        raise RuntimeError("offline")
+    import latency  # imports the real requests before it is replaced
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(get=no_server, post=no_server))
+    for name in ('config', 'ollama_client', 'map_reduce'):
+        sys.modules.pop(name, None)
+    import map_reduce
+    mr = importlib.reload(map_reduce)
+    monkeypatch.setattr(mr, 'stream_ollama', stream_impl)
+    return mr
+
+
+def test_parts_run_concurrently_and_merge_in_order(monkeypatch):
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_stream(prompt, out_q, model=None, stop_event=None):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        part = prompt.split('This is part ')[1].split(' ')[0]
+        # later parts finish first to exercise the ordered merge
+        time.sleep(0.05 if part == '1' else 0.01)
+        out_q.put(f'<{part}a>')
+        out_q.put(f'<{part}b>')
+        with lock:
+            active -= 1
+        out_q.put(None)
+
+    mr = load_map_reduce(monkeypatch, fake_stream)
+    from chunking import CodeChunk
+    chunks = [CodeChunk(i * 10 + 1, i * 10 + 10, f'code{i}') for i in range(4)]
+    out = []
+    progress = []
+    mr.run_map_reduce('Explain', chunks, 'python', out.append, model='m',
+                      on_progress=lambda done, total: progress.append((done, total)), max_workers=2)
+    text = ''.join(out)
+    assert text.index('<1a><1b>') < text.index('<2a>') < text.index('<3a>') < text.index('<4a>')
+    assert '### Part 3/4 · lines 21-30' in text
+    assert peak == 2
+    assert sorted(progress) == [(1, 4), (2, 4), (3, 4), (4, 4)]
+
+
+def test_single_chunk_has_no_heading(monkeypatch):
+    def fake_stream(prompt, out_q, model=None, stop_event=None):
+        out_q.put('answer')
+        out_q.put(None)
+
+    mr = load_map_reduce(monkeypatch, fake_stream)
+    from chunking import CodeChunk
+    out = []
+    mr.run_map_reduce('Explain', [CodeChunk(1, 1, 'x')], 'python', out.append)
+    assert out == ['answer']
+
+
+def test_stop_event_ends_merge(monkeypatch):
+    stop = threading.Event()
+
+    def fake_stream(prompt, out_q, model=None, stop_event=None):
+        if '```python\nb' in prompt:  # the second part is done and buffered before the stop
+            out_q.put('b answer')
+            out_q.put(None)
+            return
+        out_q.put('a answer')
+        stop_event.wait()
+        out_q.put(None)  # like stream_ollama: the stream ends as soon as it is stopped
+
+    mr = load_map_reduce(monkeypatch, fake_stream)
+    from chunking import CodeChunk
+    out = []
+    stopped_at = []
+    threading.Timer(0.1, lambda: stopped_at.append(time.perf_counter()) or stop.set()).start()
+    mr.run_map_reduce('Explain', [CodeChunk(1, 1, 'a'), CodeChunk(2, 2, 'b')], 'python',
+                      out.append, stop_event=stop)
+    assert stopped_at and time.perf_counter() - stopped_at[0] < 0.5
+    assert out[1:] == ['a answer'] and 'Part 1/2' in out[0]  # nothing of part 2 after the stop
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from metrics import MetricsStore, format_hud, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 90) == 90
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 90) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_store_persists_and_aggregates_per_model(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    store = MetricsStore(str(path))
+    for i in range(10):
+        store.record({'model': 'a', 'ttft_s': 0.1 * (i + 1), 'gen_tps': 30.0 + i})
+    store.record({'model': 'b', 'ttft_s': 2.0, 'gen_tps': None})
+
+    reloaded = MetricsStore(str(path))
+    assert reloaded.models() == ['a', 'b']
+    pct = reloaded.percentiles('a')
+    assert pct['n'] == 10
+    assert pct['ttft_s']['p50'] == 0.5
+    assert pct['gen_tps']['p90'] == 38.0
+    assert reloaded.percentiles('b')['gen_tps']['p50'] is None
+
+    text = reloaded.export_text()
+    assert text.splitlines()[0].split()[:3] == ['model', 'n', 'ttft_s']
+    assert any(line.startswith('a ') and ' 10 ' in line for line in text.splitlines())
+
+
+def test_format_hud_skips_missing_figures():
+    stats = {'ttft_s': 0.4213, 'prompt_tps': 812.4, 'gen_tps': 38.46, 'load_s': None}
+    assert format_hud(stats) == 'TTFT 0.42s · prompt 812 tok/s · gen 38.5 tok/s'
+
+
+def test_file_is_compacted_to_the_kept_samples(tmp_path, monkeypatch):
+    monkeypatch.setitem(MetricsStore.record.__globals__, 'MAX_PER_MODEL', 10)  # other tests may reload metrics
+    path = tmp_path / 'metrics.jsonl'
+    store = MetricsStore(str(path))
+    for i in range(45):
+        store.record({'model': 'a' if i % 3 else 'b', 'ttft_s': float(i)})
+    lines = path.read_text().splitlines()
+    assert len(lines) <= 2 * 20  # two models, 10 samples each
+    reloaded = MetricsStore(str(path))
+    assert reloaded.recent('a', 10) == store.recent('a', 10)
+    assert [s['ttft_s'] for s in reloaded.recent('b', 2)] == [39.0, 42.0]
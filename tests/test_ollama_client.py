@@ -7,10 +7,22 @@ import pytest
 
 
 def load_client(monkeypatch, post_impl):
-    dummy = types.SimpleNamespace(post=post_impl)
+    import latency  # imports the real requests before it is replaced
+    dummy = types.SimpleNamespace(post=post_impl, Timeout=type('Timeout', (OSError,), {}))
     monkeypatch.setitem(sys.modules, 'requests', dummy)
     import ollama_client
-    return importlib.reload(ollama_client)
+    client = importlib.reload(ollama_client)
+    monkeypatch.setattr(client, 'AbortableSession', lambda: DummySession(post_impl))
+    return client
+
+
+class DummySession:
+    def __init__(self, post_impl):
+        self.post = post_impl
+    def abort(self):
+        pass
+    def close(self):
+        pass
 
 
 class DummyResponse:
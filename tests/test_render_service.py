@@ -0,0 +1,88 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from render_service import RenderService
+
+
+def blocking_job(started, gate, html):
+    def job():
+        started.set()
+        gate.wait(5)
+        return html
+    return job
+
+
+def test_results_arrive_in_submission_order_per_owner():
+    service = RenderService()
+    out = []
+    for i in range(50):
+        service.submit('tab', i, lambda i=i: f'<p>{i}</p>', out.append)
+    assert service.wait_idle(5)
+    assert out == [f'<p>{i}</p>' for i in range(50)]
+
+
+def test_newer_snapshot_replaces_queued_one():
+    service = RenderService()
+    started, gate = threading.Event(), threading.Event()
+    out = []
+    service.submit('tab', 'block', blocking_job(started, gate, 'first'), out.append)
+    assert started.wait(5)
+    for text in ('stale 1', 'stale 2', 'latest'):
+        service.submit('tab', 'answer', lambda text=text: text, out.append)
+    service.submit('other', 'answer', lambda: 'other tab', out.append)
+    gate.set()
+    assert service.wait_idle(5)
+    assert out == ['first', 'latest', 'other tab']
+    assert service.dropped == 2
+
+
+def test_cancel_drops_owner_jobs_and_errors_do_not_kill_the_thread(capsys):
+    service = RenderService()
+    started, gate = threading.Event(), threading.Event()
+    out = []
+    service.submit('a', 0, blocking_job(started, gate, 'blocker'), out.append)
+    assert started.wait(5)
+    service.submit('closed', 0, lambda: 'never', out.append)
+    service.submit('a', 1, lambda: 1 / 0, out.append)
+    service.submit('a', 2, lambda: 'after error', out.append)
+    assert service.cancel('closed') == 1
+    gate.set()
+    assert service.wait_idle(5)
+    assert out == ['blocker', 'after error']
+    assert 'render failed' in capsys.readouterr().err
+
+
+def test_cancel_waits_for_the_owner_running_job():
+    service = RenderService()
+    started, gate = threading.Event(), threading.Event()
+    out = []
+    service.submit('closing', 0, blocking_job(started, gate, 'last'), out.append)
+    assert started.wait(5)
+    canceller = threading.Thread(target=service.cancel, args=('closing',))
+    canceller.start()
+    canceller.join(0.2)
+    assert canceller.is_alive()  # its done callback has not run yet
+    assert service.cancel('someone else') == 0
+    gate.set()
+    canceller.join(5)
+    assert not canceller.is_alive() and out == ['last']
+
+
+def test_close_runs_queued_jobs_and_joins_the_thread():
+    service = RenderService()
+    started, gate = threading.Event(), threading.Event()
+    out = []
+    service.submit('tab', 'block', blocking_job(started, gate, 'first'), out.append)
+    assert started.wait(5)
+    service.submit('tab', 'answer', lambda: 'queued', out.append)
+    thread = service._thread
+    assert not service.close(0.05)  # still rendering
+    gate.set()
+    assert service.close(5)
+    assert not thread.is_alive() and out == ['first', 'queued']
+    service.submit('tab', 'answer', lambda: 'after', out.append)
+    assert service.wait_idle(5) and out[-1] == 'after'
+    assert service.close(5)
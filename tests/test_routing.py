@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from metrics import MetricsStore
+from routing import AUTO, parameter_count, predicted_ttft, rank_by_strength, route
+
+SMALL, LARGE = 'qwen2.5-coder:1.5b', 'qwen2.5-coder:14b'
+
+
+def _store(tmp_path, **prompt_tps):
+    store = MetricsStore(str(tmp_path / 'metrics.jsonl'))
+    for model, tps in prompt_tps.items():
+        for _ in range(5):
+            store.record({'model': model, 'prompt_tps': tps, 'load_s': 0.0, 'ttft_s': 0.3})
+    return store
+
+
+def test_parameter_count_from_tags():
+    assert parameter_count(SMALL) == 1.5
+    assert parameter_count('llama3.1:8b-instruct-q4_K_M') == 8
+    assert parameter_count('smollm:360m') == 0.36
+    assert parameter_count('codellama') is None
+    assert rank_by_strength([SMALL, 'smollm:360m', LARGE], MetricsStore('/nonexistent')) == \
+        [LARGE, SMALL, 'smollm:360m']
+
+
+def test_predicted_ttft_uses_prompt_throughput(tmp_path):
+    store = _store(tmp_path, **{LARGE: 1000.0})
+    assert abs(predicted_ttft(LARGE, 2000, store) - 2.15) < 1e-9
+    assert predicted_ttft(SMALL, 2000, store) is None
+
+
+def test_route_prefers_strongest_model_within_target(tmp_path):
+    store = _store(tmp_path, **{LARGE: 1000.0, SMALL: 8000.0})
+    models = [AUTO, SMALL, LARGE]
+    assert route(models, 500, 'explain', metrics=store, target=1.0).model == LARGE
+    long = route(models, 4000, 'explain', selection_tokens=400, metrics=store, target=1.0)
+    assert long.model == SMALL and long.predicted_ttft < 1.0
+
+
+def test_route_sends_large_edits_to_strongest_model(tmp_path):
+    store = _store(tmp_path, **{LARGE: 100.0, SMALL: 8000.0})
+    decision = route([SMALL, LARGE], 3000, 'refactor', metrics=store)
+    assert decision.model == LARGE and 'refactor' in decision.reason
+    assert route([SMALL, LARGE], 3000, 'explain', metrics=store).model == SMALL
+
+
+def test_route_without_measurements(tmp_path):
+    store = MetricsStore(str(tmp_path / 'metrics.jsonl'))
+    assert route([SMALL, LARGE], 100, metrics=store).model == SMALL
+    assert route([SMALL, LARGE], 5000, metrics=store).model == LARGE
+    assert route([AUTO, SMALL], 5000, 'refactor', metrics=store).reason == 'only model'
+
+
+def test_route_skips_embedding_models_and_never_takes_an_unknown_model_as_fast(tmp_path):
+    store = MetricsStore(str(tmp_path / 'metrics.jsonl'))
+    models = ['qwen2.5-coder:7b', SMALL, 'nomic-embed-text:latest']
+    assert route(models, 200, 'explain', metrics=store).model == SMALL
+    assert route(['qwen2.5-coder:7b', 'nomic-embed-text:latest'], 200, metrics=store).reason == 'only model'
+    assert route(['qwen2.5-coder:7b', 'codellama:latest'], 200, 'explain', metrics=store).model == 'qwen2.5-coder:7b'
+    assert rank_by_strength(['codellama:latest', SMALL, LARGE], store) == [LARGE, SMALL, 'codellama:latest']
+
+
+def test_route_skips_the_configured_embedding_model(tmp_path, monkeypatch):
+    monkeypatch.setitem(route.__globals__, 'EMBED_MODEL', 'bge-m3:567m')  # the module route() reads it from
+    assert route([LARGE, 'bge-m3:567m'], 200, metrics=MetricsStore(str(tmp_path / 'm.jsonl'))).model == LARGE
@@ -0,0 +1,112 @@
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def load_scheduler(monkeypatch):
+    def no_server(*a, **k):
+        raise RuntimeError("offline")
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(get=no_server, post=no_server))
+    for name in ('config', 'scheduler'):
+        sys.modules.pop(name, None)
+    import scheduler
+    return scheduler
+
+
+def test_slots_are_bounded(monkeypatch):
+    sch = load_scheduler(monkeypatch)
+    s = sch.SlotScheduler(2)
+    peak = 0
+    lock = threading.Lock()
+
+    def job():
+        nonlocal peak
+        with s.slot():
+            with lock:
+                peak = max(peak, s.in_use)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=job) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak == 2
+    assert s.in_use == 0
+
+
+def test_higher_priority_waiter_is_served_first(monkeypatch):
+    sch = load_scheduler(monkeypatch)
+    s = sch.SlotScheduler(1)
+    order = []
+    assert s.acquire()
+
+    def waiter(name, priority):
+        with s.slot(priority):
+            order.append(name)
+
+    low = threading.Thread(target=waiter, args=('background', sch.PRIORITY_BACKGROUND))
+    low.start()
+    time.sleep(0.05)
+    high = threading.Thread(target=waiter, args=('interactive', sch.PRIORITY_INTERACTIVE))
+    high.start()
+    time.sleep(0.05)
+    s.release()
+    low.join()
+    high.join()
+    assert order == ['interactive', 'background']
+
+
+def test_speculative_work_leaves_a_slot_free(monkeypatch):
+    sch = load_scheduler(monkeypatch)
+    s = sch.SlotScheduler(2)
+    assert s.acquire()
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    assert s.acquire(sch.PRIORITY_SPECULATIVE, stop_event=stop) is False
+    assert s.in_use == 1
+    s.release()
+    assert s.acquire(sch.PRIORITY_SPECULATIVE)
+
+
+def test_speculative_work_never_takes_the_only_slot(monkeypatch):
+    sch = load_scheduler(monkeypatch)
+    s = sch.SlotScheduler(1)
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    assert s.acquire(sch.PRIORITY_SPECULATIVE, stop_event=stop) is False
+    assert s.in_use == 0
+
+
+def test_a_waiting_request_can_be_reprioritised(monkeypatch):
+    sch = load_scheduler(monkeypatch)
+    s = sch.SlotScheduler(2)
+    assert s.acquire()
+    order = []
+    prefetch, background = threading.Event(), threading.Event()
+
+    def waiter(name, priority, stop):
+        with s.slot(priority, stop) as granted:
+            if granted:
+                order.append(name)
+                time.sleep(0.05)
+
+    spec = threading.Thread(target=waiter, args=('prefetch', sch.PRIORITY_SPECULATIVE, prefetch))
+    spec.start()
+    time.sleep(0.05)
+    assert s.acquire(sch.PRIORITY_BACKGROUND)  # the last free slot is not lent to speculation
+    assert order == []
+    assert s.reprioritise(prefetch, sch.PRIORITY_INTERACTIVE)
+    waiting = threading.Thread(target=waiter, args=('background', sch.PRIORITY_BACKGROUND, background))
+    waiting.start()
+    time.sleep(0.05)
+    s.release()
+    spec.join()
+    s.release()
+    waiting.join()
+    assert order == ['prefetch', 'background']
+    assert not s.reprioritise(prefetch, sch.PRIORITY_INTERACTIVE)
@@ -0,0 +1,382 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+QtWidgets = pytest.importorskip('PySide6.QtWidgets')
+
+from PySide6.QtCore import QEventLoop, QSettings, QThread, QTimer, Signal
+
+import ui.session_widget as sw
+from journal import RecoveredSession
+
+CODE = 'def f(x):\n    return x\n'
+
+
+class FakeWorker(QThread):
+    """Stands in for ChatWorker: answers with the next of ``SCRIPT``, else ``ANSWERS[model]``.
+
+    An answer is a list of chunks, or an error string; ``(delay, answer)`` delays that one answer.
+    """
+    chunk = Signal(str)
+    done = Signal()
+    error = Signal(str)
+    status = Signal(str)
+    stats = Signal(dict)
+    ANSWERS: dict = {}
+    SCRIPT: list = []
+    DELAYS: dict = {}
+    started_with: list = []
+
+    def __init__(self, messages, model=None, prepare=None, priority=0, profile=None, affinity=None):
+        super().__init__()
+        self.messages, self.model, self.priority, self.profile = list(messages), model or 'm', priority, profile
+        self.stopped = False
+        self.answer = self.SCRIPT.pop(0) if self.SCRIPT else self.ANSWERS.get(self.model, ['Hello', ' world'])
+        self.delay = self.DELAYS.get(self.model, 0.0)
+        if isinstance(self.answer, tuple):
+            self.delay, self.answer = self.answer
+        FakeWorker.started_with.append(self)
+
+    def stop(self):
+        self.stopped = True
+
+    def set_priority(self, priority):
+        self.priority = priority
+
+    def run(self):
+        answer = self.answer
+        deadline = time.monotonic() + self.delay
+        while time.monotonic() < deadline and not self.stopped:
+            time.sleep(0.005)
+        if self.stopped:
+            answer = []
+        if isinstance(answer, str):
+            self.error.emit(answer)
+        elif answer:
+            for piece in answer:
+                self.chunk.emit(piece)
+            self.stats.emit({'model': self.model, 'tokens': len(answer), 'ttft_s': 0.01, 'tok_per_s': 50.0})
+        self.done.emit()
+
+
+def spin(until, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not until() and time.monotonic() < deadline:
+        loop = QEventLoop()
+        QTimer.singleShot(10, loop.quit)
+        loop.exec()
+    return until()
+
+
+@pytest.fixture
+def tab(monkeypatch, tmp_path):
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, str(tmp_path))  # keep the user's settings out
+    monkeypatch.setattr(sw, 'TRANSCRIPT', 'lite')
+    monkeypatch.setattr(sw, 'JOURNAL', False)
+    monkeypatch.setattr(sw, 'SPECULATE', False)
+    monkeypatch.setattr(sw, 'ChatWorker', FakeWorker)
+    monkeypatch.setattr(sw, 'fetch_ollama_models', lambda: ['m'])
+    monkeypatch.setattr(FakeWorker, 'ANSWERS', {})
+    monkeypatch.setattr(FakeWorker, 'DELAYS', {})
+    monkeypatch.setattr(FakeWorker, 'SCRIPT', [])
+    monkeypatch.setattr(FakeWorker, 'started_with', [])
+    tabs = []
+
+    def make(code=CODE, **kwargs):
+        widget = sw.SessionWidget(code, 'f.py', **kwargs)
+        tabs.append(widget)
+        return widget
+
+    yield make
+    for widget in tabs:
+        widget.shutdown()
+    app.processEvents()
+
+
+def test_pinned_code_is_compressed_off_the_gui_thread_when_switched_on(tab, monkeypatch):
+    calls = []
+    real = sw.compress
+    monkeypatch.setattr(sw, 'compress', lambda code, lang: calls.append(code) or real(code, lang))
+    code = '# a long comment about f\n' * 20 + 'def f(x):\n    """Return x."""\n    return x  # same\n'
+    widget = tab(code)
+    assert widget._compressed is None and not calls and '# a long comment' in widget.history[0].content
+
+    widget.compress_btn.click()
+    assert spin(lambda: widget._compressed is not None)
+    assert calls == [code] and '# a long comment' not in widget.history[0].content
+    assert 'compressed' in widget.status.currentMessage()
+
+    widget.compress_btn.click()
+    assert '# a long comment' in widget.history[0].content
+    widget.compress_btn.click()  # computed once: switching back on is immediate
+    assert calls == [code] and '# a long comment' not in widget.history[0].content
+
+
+def idle(widget):
+    return spin(lambda: not widget._busy())
+
+
+def test_restore_shows_a_finished_and_an_interrupted_answer(tab):
+    history = [{'role': 'system', 'content': 's'}, {'role': 'user', 'content': 'Explain'},
+               {'role': 'assistant', 'content': 'It returns **x**.'}, {'role': 'user', 'content': 'Why?'}]
+    state = {'file_name': 'f.py', 'code': CODE, 'history': history}
+
+    finished = tab()
+    finished.restore(RecoveredSession('a', {**state, 'history': history[:3]}, None, 'm'))
+    assert [m.as_dict() for m in finished.history] == history[:3]
+    assert 'returns' in finished._html[-1] and '<strong>x</strong>' in finished._html[-1]
+    assert 'It returns x.' in finished.view.toPlainText()
+
+    interrupted = tab()
+    interrupted.restore(RecoveredSession('b', state, 'Because it is the identity', 'm'))
+    assert interrupted.history[-1].content == 'Because it is the identity'
+    text = interrupted.view.toPlainText()
+    assert 'It returns x.' in text and 'Because it is the identity' in text and 'interrupted' in text
+
+
+LONG = ''.join(f'def f{i}(x):\n    return x + {i}\n' for i in range(30))
+
+
+def test_a_diff_that_does_not_apply_is_replaced_by_a_full_answer(tab, monkeypatch):
+    monkeypatch.setattr(sw, 'DIFF_MODE', 'on')
+    FakeWorker.SCRIPT = [['```diff\n@@ -1,1 +1,1 @@\n-not in the file\n+x\n```\n'], ['Full ', 'rewrite']]
+    widget = tab(LONG)
+    blocks = len(widget._html)
+    widget.run_action('refactor')
+    assert idle(widget) and spin(lambda: widget.status.currentMessage().startswith('Done'))
+    assert len(FakeWorker.started_with) == 2 and widget.history[-1].content == 'Full rewrite'
+    assert widget.history[-2].content == sw.ACTIONS['refactor']
+    assert len(widget._html) == blocks + 4  # the question and one answer: the failed diff is gone
+    assert 'not in the file' not in widget.view.toPlainText()
+
+
+def test_a_failed_diff_request_is_not_asked_again(tab, monkeypatch):
+    monkeypatch.setattr(sw, 'DIFF_MODE', 'on')
+    FakeWorker.SCRIPT = ['[Error] server unreachable']
+    widget = tab(LONG)
+    widget.run_action('refactor')
+    assert idle(widget) and spin(lambda: widget.status.currentMessage().startswith('Done'))
+    assert len(FakeWorker.started_with) == 1 and widget._diff is None
+
+
+def test_no_diff_check_without_a_model(tab, monkeypatch):
+    monkeypatch.setattr(sw, 'DIFF_MODE', 'on')
+    widget = tab(LONG)
+    monkeypatch.setattr(widget, '_selected_model', lambda action='chat': None)
+    widget.run_action('refactor')
+    assert widget._diff is None and not FakeWorker.started_with
+
+
+def speculating(monkeypatch):
+    monkeypatch.setattr(sw, 'SPECULATE', True)
+    monkeypatch.setattr(sw.CLICK_STATS, 'most_likely', lambda lang: 'explain')
+    monkeypatch.setattr(sw.CLICK_STATS, 'record', lambda lang, action: None)
+
+
+def test_an_adopted_prefetch_is_raised_to_interactive_priority(tab, monkeypatch):
+    speculating(monkeypatch)
+    monkeypatch.setattr(sw.SCHEDULER, 'slots', 2)
+    FakeWorker.DELAYS = {'m': 0.3}
+    widget = tab()
+    assert spin(lambda: widget._spec_worker is not None)
+    prefetch = widget._spec_worker
+    assert prefetch.priority == sw.PRIORITY_SPECULATIVE
+    widget.run_action('explain')
+    assert widget._worker is prefetch and prefetch.priority == sw.PRIORITY_INTERACTIVE
+    assert idle(widget) and widget.history[-1].content == 'Hello world' and len(FakeWorker.started_with) == 1
+
+
+def test_no_speculation_on_a_single_slot(tab, monkeypatch):
+    speculating(monkeypatch)
+    monkeypatch.setattr(sw.SCHEDULER, 'slots', 1)
+    widget = tab()
+    spin(lambda: False, timeout=0.1)
+    assert widget._spec_worker is None and not FakeWorker.started_with
+
+
+def run_all(widget, *keys):
+    for act in widget._fanout_menu.actions():
+        act.setChecked(act.data() in keys)
+    widget.run_fan_out()
+
+
+def test_run_all_keeps_the_menu_order_and_reports_the_slowest_action(tab, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(sw.CLICK_STATS, 'record', lambda lang, action: recorded.append(action))
+    FakeWorker.SCRIPT = [(0.3, ['Slow ', 'explanation']), ['Quick tests']]
+    widget = tab()
+    run_all(widget, 'explain', 'tests')
+    assert [w.messages[-1].content for w in FakeWorker.started_with] == [sw.ACTIONS['explain'], sw.ACTIONS['tests']]
+    assert spin(lambda: widget._fan['tests']['elapsed'] is not None) and widget._busy()
+    assert widget._fan['explain']['elapsed'] is None
+    assert idle(widget) and spin(lambda: widget.status.currentMessage().startswith('Done'))
+    assert widget._fan['tests']['elapsed'] < widget._fan['explain']['elapsed']
+    assert widget.history[-1].content == '## Explain\n\nSlow explanation\n\n## Tests\n\nQuick tests'
+    assert widget.status.currentMessage().startswith('Done 2 actions in ')
+    assert '| slowest Explain ' in widget.status.currentMessage()
+    assert recorded == []  # "Run all" is not an action the first-action statistics can prefetch
+
+
+def test_stopping_run_all_keeps_the_finished_sections(tab):
+    FakeWorker.SCRIPT = [['Quick explanation'], (5.0, ['never'])]
+    widget = tab()
+    run_all(widget, 'explain', 'refactor')
+    assert spin(lambda: widget._fan['explain']['elapsed'] is not None)
+    slow = widget._fan['refactor']['worker']
+    widget._stop_generation()
+    assert slow.stopped and not widget._busy()
+    assert widget.status.currentMessage().startswith('Generation stopped')
+    assert widget.history[-1].content == '## Explain\n\nQuick explanation\n\n## Refactor\n\n'
+    assert spin(lambda: slow not in sw._DETACHED)  # the stopped thread ends on its own
+
+
+def compare(widget, race):
+    for act in widget._compare_menu.actions():
+        act.setChecked(act.data() in ('a', 'b'))
+    widget._race_action.setChecked(race)
+    widget.input.setPlainText('Which is faster?')
+    widget.run_compare()
+
+
+@pytest.fixture
+def two_models(monkeypatch):
+    monkeypatch.setattr(sw, 'fetch_ollama_models', lambda: ['a', 'b'])
+    monkeypatch.setattr(sw.SCHEDULER, 'slots', 2)
+
+
+def test_compare_keeps_every_answer(tab, two_models):
+    FakeWorker.ANSWERS = {'a': ['A says'], 'b': ['B says']}
+    widget = tab()
+    compare(widget, race=False)
+    assert sorted(w.model for w in FakeWorker.started_with) == ['a', 'b']
+    assert idle(widget) and spin(lambda: widget.status.currentMessage().startswith('Compared'))
+    assert widget.history[-1].content == '## a\n\nA says\n\n## b\n\nB says'
+
+
+def test_the_first_model_to_finish_wins_the_race(tab, two_models):
+    FakeWorker.ANSWERS = {'a': ['A says'], 'b': ['B says']}
+    FakeWorker.DELAYS = {'a': 5.0}
+    widget = tab()
+    compare(widget, race=True)
+    loser = next(w for w in FakeWorker.started_with if w.model == 'a')
+    assert spin(lambda: 'won' in widget.status.currentMessage())
+    assert loser.stopped and not widget._busy()
+    assert widget.history[-1].content == 'B says'
+    assert widget.status.currentMessage().startswith('b won in ') and widget.status.currentMessage().endswith('cancelled a')
+
+
+def test_a_failed_model_does_not_win_the_race(tab, two_models):
+    FakeWorker.ANSWERS = {'a': '[Error] out of memory', 'b': '[Error] model not found'}
+    FakeWorker.DELAYS = {'b': 0.2}
+    widget = tab()
+    compare(widget, race=True)
+    assert idle(widget) and spin(lambda: widget.status.currentMessage().startswith('No model'))
+    assert not any(w.stopped for w in FakeWorker.started_with)
+    assert widget.status.currentMessage().startswith('No model finished the race: all 2 failed')
+    assert 'out of memory' in widget.history[-1].content and 'model not found' in widget.history[-1].content
+
+
+def test_race_is_off_on_a_single_slot(tab, monkeypatch):
+    monkeypatch.setattr(sw, 'fetch_ollama_models', lambda: ['a', 'b'])
+    monkeypatch.setattr(sw.SCHEDULER, 'slots', 1)
+    FakeWorker.DELAYS = {'a': 0.1}
+    widget = tab()
+    assert not widget._race_action.isEnabled() and 'OLLAMA_NUM_PARALLEL' in widget._race_action.text()
+    compare(widget, race=True)
+    assert idle(widget) and spin(lambda: widget.status.currentMessage().startswith('Compared 2 models'))
+    assert not any(w.stopped for w in FakeWorker.started_with)
+
+
+def test_a_fork_shares_the_parent_messages_and_transcript(tab):
+    parent = tab()
+    parent.run_action('explain')
+    assert idle(parent) and spin(lambda: parent.status.currentMessage().startswith('Done'))
+    parent.auto_run('Why?')
+    assert idle(parent) and len(parent.history) == 5
+
+    child = tab(fork_of=(parent, 2))
+    assert [m is p for m, p in zip(child.history, parent.history)] == [True] * 3 and len(child.history) == 3
+    end = parent._msg_blocks[2] + 2
+    assert len(child._html) == end and all(c is p for c, p in zip(child._html, parent._html[:end]))
+    assert child._msg_blocks == {1: parent._msg_blocks[1], 2: parent._msg_blocks[2]}
+    assert child.status.currentMessage().startswith('Forked after message 2')
+    spin(lambda: False, timeout=0.1)
+    assert len(FakeWorker.started_with) == 2  # nothing is asked again
+
+
+DIFF = '```diff\n@@ -1,3 +1,3 @@\n def f0(x):\n-    return x + 0\n+    return x\n def f1(x):\n```\n'
+
+
+def test_a_fork_at_a_diff_question_applies_the_new_diff(tab, monkeypatch):
+    monkeypatch.setattr(sw, 'DIFF_MODE', 'on')
+    FakeWorker.SCRIPT = [[DIFF], [DIFF]]
+    parent = tab(LONG)
+    parent.run_action('refactor')
+    assert idle(parent) and spin(lambda: parent.status.currentMessage().startswith('Done'))
+
+    child = tab(LONG, fork_of=(parent, 1))
+    assert spin(lambda: len(FakeWorker.started_with) == 2) and idle(child)
+    assert spin(lambda: child.status.currentMessage().startswith('Done'))
+    assert FakeWorker.started_with[1].messages[-1].content == sw.diff_prompt('refactor', 'f.py')
+    assert [m.role for m in child.history] == ['system', 'user', 'assistant']
+    assert '**Patched code**' in child.history[-1].content
+    assert child.view.toPlainText().count('answer as a diff') == 1
+
+
+class SlowIndex:
+    """A project index that is still being built when the tab opens."""
+
+    def __init__(self):
+        self.ready = threading.Event()
+
+    def context_for(self, code, lang, budget_tokens, exclude=None):
+        assert self.ready.is_set()
+        return [{'name': 'helper', 'kind': 'function', 'path': 'util.py', 'line': 3, 'lang': 'python',
+                 'code': 'def helper():\n    pass'}]
+
+
+def test_project_context_is_added_once_the_index_is_ready(tab):
+    widget = tab()
+    widget._symbols = index = SlowIndex()
+    widget.auto_run('What does f do?')
+    assert idle(widget) and 'def helper' not in widget.history[0].content
+
+    system = widget.history[0]
+    index.ready.set()
+    widget.auto_run('And now?')
+    assert idle(widget) and widget.history[0] is system  # the prefix the model answered with stays as it was
+    late = widget.history[3]
+    assert late.role == 'system' and 'def helper' in late.content and widget.history[4].content == 'And now?'
+    assert FakeWorker.started_with[-1].messages[3] is late
+    widget.auto_run('Once more')
+    assert idle(widget) and sum('def helper' in m.content for m in widget.history) == 1
+
+
+def test_project_context_ready_before_the_first_question_goes_into_the_system_message(tab):
+    widget = tab()
+    widget._symbols = index = SlowIndex()
+    index.ready.set()
+    widget.auto_run('What does f do?')
+    assert idle(widget) and 'def helper' in widget.history[0].content
+    assert [m.role for m in widget.history] == ['system', 'user', 'assistant']
+
+
+def test_the_percentile_tooltip_is_built_on_hover_only(tab, monkeypatch):
+    from PySide6.QtCore import QEvent, QPoint
+    from PySide6.QtGui import QHelpEvent
+    tables = []
+    monkeypatch.setattr(sw.METRICS, 'export_text', lambda model=None: tables.append(model) or f'table for {model}')
+    widget = tab()
+    widget.auto_run('Why?')
+    assert idle(widget) and spin(lambda: widget.hud.text())
+    assert tables == []
+    QtWidgets.QApplication.sendEvent(widget.hud, QHelpEvent(QEvent.ToolTip, QPoint(1, 1), QPoint(1, 1)))
+    assert tables == ['m'] and widget.hud.toolTip() == 'table for m'
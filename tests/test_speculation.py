@@ -0,0 +1,43 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def load_speculation(monkeypatch):
+    def no_server(*a, **k):
+        raise RuntimeError("offline")
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(get=no_server, post=no_server))
+    for name in ('config', 'speculation'):
+        sys.modules.pop(name, None)
+    import speculation
+    return speculation
+
+
+def test_default_until_enough_samples(monkeypatch, tmp_path):
+    sp = load_speculation(monkeypatch)
+    stats = sp.ClickStats(str(tmp_path / 'clicks.json'))
+    assert stats.most_likely('python') == 'explain'
+    stats.record('python', 'tests')
+    assert stats.most_likely('python') == 'explain'
+
+
+def test_most_likely_per_language_with_global_fallback(monkeypatch, tmp_path):
+    sp = load_speculation(monkeypatch)
+    path = str(tmp_path / 'clicks.json')
+    stats = sp.ClickStats(path)
+    for action in ('tests', 'tests', 'refactor', 'tests'):
+        stats.record('python', action)
+    stats.record('go', 'refactor')
+    reloaded = sp.ClickStats(path)
+    assert reloaded.most_likely('python') == 'tests'
+    assert reloaded.most_likely('go') == 'tests'  # too few go samples: use all languages
+
+
+def test_typed_questions_disable_speculation(monkeypatch, tmp_path):
+    sp = load_speculation(monkeypatch)
+    stats = sp.ClickStats(str(tmp_path / 'clicks.json'))
+    for _ in range(3):
+        stats.record('python', sp.MESSAGE)
+    assert stats.most_likely('python') is None
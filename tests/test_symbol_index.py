@@ -0,0 +1,95 @@
+import importlib
+import os
+import sys
+import types
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def load_index(monkeypatch, cache_dir):
+    def no_server(*a, **k):
+        raise RuntimeError("offline")
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(get=no_server, post=no_server))
+    monkeypatch.setenv('LOCALPILOT_CACHE', str(cache_dir))
+    for name in ('config', 'symbol_index'):
+        sys.modules.pop(name, None)
+    import symbol_index
+    return importlib.reload(symbol_index)
+
+
+def make_project(root: Path):
+    (root / ".git").mkdir(parents=True)
+    (root / "pkg").mkdir()
+    (root / "pkg" / "helpers.py").write_text(
+        "RATE = 3\n\n"
+        "@cache\n"
+        "def compute_total(items):\n"
+        "    return sum(items) * RATE\n\n"
+        "class Cart:\n"
+        "    def add(self, item):\n"
+        "        pass\n"
+    )
+    (root / "web").mkdir()
+    (root / "web" / "util.ts").write_text(
+        "export function formatPrice(value: number): string {\n"
+        "  return `$${value}`;\n"
+        "}\n"
+    )
+    (root / "node_modules").mkdir()
+    (root / "node_modules" / "junk.js").write_text("function ignored() {}\n")
+    (root / "app.py").write_text("print(1)\n")
+
+
+def test_find_project_root(tmp_path, monkeypatch):
+    si = load_index(monkeypatch, tmp_path / "cache")
+    make_project(tmp_path / "proj")
+    assert si.find_project_root(str(tmp_path / "proj" / "pkg" / "helpers.py")) == str((tmp_path / "proj").resolve())
+
+
+def test_parse_symbols_python_and_regex_languages(tmp_path, monkeypatch):
+    si = load_index(monkeypatch, tmp_path / "cache")
+    py = si.parse_symbols("@d\ndef f():\n    pass\n\nclass C:\n    def m(self):\n        pass\n", "python")
+    assert ["f", "function", 1, 3] in py
+    assert ["C", "class", 5, 7] in py
+    assert ["m", "function", 6, 7] in py
+    ts = si.parse_symbols("export class A {\n  run() {\n  }\n}\nif (x) {\n}\n", "typescript")
+    assert ts == [["A", "type", 1, 4]]
+    go = si.parse_symbols("func (s *S) Run(x int) error {\n\treturn nil\n}\n", "go")
+    assert go == [["Run", "function", 1, 3]]
+
+
+def test_index_builds_persists_and_updates_incrementally(tmp_path, monkeypatch):
+    si = load_index(monkeypatch, tmp_path / "cache")
+    root = tmp_path / "proj"
+    make_project(root)
+    idx = si.SymbolIndex(str(root), cache_dir=str(tmp_path / "cache"))
+    assert idx.update() == 3
+    assert idx.lookup("compute_total")[0][:2] == (os.path.join("pkg", "helpers.py"), "function")
+    assert idx.lookup("ignored") == []
+    assert idx.update() == 0
+
+    reloaded = si.SymbolIndex(str(root), cache_dir=str(tmp_path / "cache"))
+    assert reloaded.ready.is_set()
+    assert reloaded.lookup("formatPrice")
+
+    (root / "app.py").write_text("def main():\n    pass\n")
+    os.utime(root / "app.py", (1, 1))
+    (root / "web" / "util.ts").unlink()
+    assert reloaded.update() == 2
+    assert reloaded.lookup("main")
+    assert reloaded.lookup("formatPrice") == []
+
+
+def test_context_for_respects_budget_and_skips_selection(tmp_path, monkeypatch):
+    si = load_index(monkeypatch, tmp_path / "cache")
+    root = tmp_path / "proj"
+    make_project(root)
+    idx = si.SymbolIndex(str(root), cache_dir=str(tmp_path / "cache"))
+    idx.update()
+    selection = "def checkout(cart):\n    return compute_total(cart.items)\n"
+    defs = idx.context_for(selection, "python", 500)
+    assert [d["name"] for d in defs] == ["compute_total"]
+    assert defs[0]["code"].startswith("@cache\ndef compute_total")
+    assert idx.context_for(selection, "python", 5) == []
+    assert "compute_total" in si.format_context(defs)
@@ -0,0 +1,62 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tracing import SamplingProfiler, Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span('work'):
+        pass
+    assert tracer.events == []
+    assert tracer.write() is None
+
+
+def test_spans_are_written_as_chrome_trace(tmp_path):
+    tracer = Tracer()
+    tracer.path = str(tmp_path / 'trace.json')  # enable without registering an atexit hook
+
+    def worker():
+        with tracer.span('stream.decode', 'stream', n=1):
+            time.sleep(0.002)
+
+    t = threading.Thread(target=worker, name='ollama-stream')
+    t.start()
+    t.join()
+    with tracer.span('render.markdown', 'ui'):
+        pass
+    tracer.complete('page.setHtml', 10.0, 250.0, cat='page', tid=0, thread_name='page (JS)')
+    tracer.write()
+
+    data = json.loads((tmp_path / 'trace.json').read_text())
+    spans = {e['name']: e for e in data['traceEvents'] if e['ph'] == 'X'}
+    assert set(spans) == {'stream.decode', 'render.markdown', 'page.setHtml'}
+    assert spans['stream.decode']['dur'] >= 2000 and spans['stream.decode']['args'] == {'n': 1}
+    names = {e['args']['name'] for e in data['traceEvents'] if e['ph'] == 'M'}
+    assert {'ollama-stream', 'page (JS)'} <= names
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_folds_stacks():
+    stop = threading.Event()
+    t = threading.Thread(target=busy_loop, args=(stop,), name='busy')
+    profiler = SamplingProfiler(interval=0.001)
+    t.start()
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    stop.set()
+    t.join()
+    folded = profiler.folded()
+    busy = [line for line in folded.splitlines() if line.startswith('busy;')]
+    assert busy and any('busy_loop (test_tracing.py' in line for line in busy)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in folded.splitlines())
@@ -3,7 +3,7 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from utils import lang_hint, build_prompt
+from utils import FenceEnd, build_prompt, describe_profile, generation_profile, lang_hint
 
 
 def test_lang_hint_known_extensions():
@@ -21,3 +21,25 @@ def test_build_prompt_includes_task_code_and_lang():
     prompt = build_prompt('Do something', 'print(1)', 'python')
     assert 'Task:\nDo something' in prompt
     assert '```python\nprint(1)\n```' in prompt
+
+
+def test_generation_profile_overrides_and_scaling():
+    overrides = {'*': {'*': {'stop': ['END']}}, 'small:1b': {'explain': {'num_predict': 300}}}
+    assert generation_profile('explain', 'small:1b', overrides)['num_predict'] == 300
+    assert generation_profile('explain', 'other', overrides) == \
+        {'num_predict': 700, 'stop': ['END'], 'stop_after_fence': False}
+    refactor = generation_profile('refactor', code_tokens=2000)
+    assert refactor['num_predict'] == 3000 and refactor['stop_after_fence']
+    assert not generation_profile('refactor', code_tokens=2000, diff=True)['stop_after_fence']
+    assert not generation_profile('tests')['stop_after_fence']  # test answers often span several files
+    assert generation_profile('unknown')['num_predict'] == generation_profile('chat')['num_predict']
+    assert describe_profile(refactor) == '≤3000 tokens · ends after the code block'
+
+
+def test_fence_end_finds_closing_fence_across_chunks():
+    fence = FenceEnd()
+    stream = ['Here:\n``', '`python\nx = 1\n``', '`\nThe change ', 'keeps...']
+    assert [fence.feed(c) for c in stream[:2]] == [None, None]
+    assert fence.feed(stream[2]) == 2
+    tilde = FenceEnd()
+    assert tilde.feed('~~~\n```\nstill code\n~~~~\nafter') == len('~~~\n```\nstill code\n~~~~\n')
@@ -0,0 +1,165 @@
+"""Opt-in span tracing (Chrome trace-event JSON) and a sampling profiler.
+
+Enable with ``LOCALPILOT_TRACE=/path/trace.json`` (or ``app.py --trace PATH``)
+and open the file in chrome://tracing or https://ui.perfetto.dev.
+``LOCALPILOT_PROFILE=/path/stacks.txt`` (or ``--profile PATH``) samples every
+thread's Python stack and writes folded stacks for flamegraph.pl/speedscope.
+Both are written when the process exits. When disabled, ``span()`` costs one
+attribute check.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+MAX_EVENTS = 1_000_000  # stop recording (rather than grow without bound) on very long sessions
+_NULL = nullcontext()
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000
+
+
+class Tracer:
+    """Collects complete ("X") events per thread; thread-safe."""
+
+    def __init__(self):
+        self.path: str | None = None
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._named: set[int] = set()
+        self._pid = os.getpid()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def enable(self, path: str) -> None:
+        if self.path is None:
+            atexit.register(self.write)
+        self.path = path
+
+    def _thread_meta(self, tid: int, name: str) -> None:
+        if tid not in self._named:
+            self._named.add(tid)
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                                "args": {"name": name}})
+
+    def complete(self, name: str, start_us: float, dur_us: float, cat: str = "app",
+                 tid: int | None = None, thread_name: str | None = None, args: dict | None = None) -> None:
+        """Record a finished span (also used for timings measured elsewhere, e.g. in the page)."""
+        if tid is None:
+            t = threading.current_thread()
+            tid, thread_name = threading.get_ident(), thread_name or t.name
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start_us, "dur": dur_us, "pid": self._pid, "tid": tid}
+        if args:
+            event["args"] = args
+        with self._lock:
+            if len(self.events) >= MAX_EVENTS:
+                return
+            self._thread_meta(tid, thread_name or str(tid))
+            self.events.append(event)
+
+    @contextmanager
+    def _span(self, name: str, cat: str, args: dict | None):
+        start = _now_us()
+        try:
+            yield
+        finally:
+            self.complete(name, start, _now_us() - start, cat, args=args)
+
+    def span(self, name: str, cat: str = "app", **args):
+        """Context manager timing the enclosed block (a no-op when tracing is off)."""
+        if self.path is None:
+            return _NULL
+        return self._span(name, cat, args or None)
+
+    def write(self, path: str | None = None) -> str | None:
+        path = path or self.path
+        if not path:
+            return None
+        with self._lock:
+            data = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            print(f"[tracing] wrote {len(data['traceEvents'])} events to {path}", file=sys.stderr)
+        except OSError as e:
+            print(f"[tracing] could not write {path}: {e}", file=sys.stderr)
+        return path
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of all threads every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """Stacks in the "folded" format: ``thread;outer;...;inner count`` per line."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+    def write(self, path: str) -> None:
+        self.stop()
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.folded())
+            print(f"[tracing] wrote {sum(self.samples.values())} stack samples to {path}", file=sys.stderr)
+        except OSError as e:
+            print(f"[tracing] could not write {path}: {e}", file=sys.stderr)
+
+
+TRACER = Tracer()
+span = TRACER.span
+
+
+def start_profiler(path: str, interval: float = 0.005) -> SamplingProfiler:
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    atexit.register(profiler.write, path)
+    return profiler
+
+
+def configure(trace: str | None = None, profile: str | None = None) -> None:
+    """Turn on tracing/profiling from arguments or ``LOCALPILOT_TRACE`` / ``LOCALPILOT_PROFILE``."""
+    trace = trace or os.environ.get("LOCALPILOT_TRACE")
+    profile = profile or os.environ.get("LOCALPILOT_PROFILE")
+    if trace:
+        TRACER.enable(trace)
+    if profile:
+        start_profiler(profile)
@@ -0,0 +1,151 @@
+import re
+from html import escape, unescape
+
+from PySide6.QtCore import QUrl, Signal
+from PySide6.QtGui import QCursor, QDesktopServices, QGuiApplication, QTextBlockFormat, QTextCharFormat, QTextCursor
+from PySide6.QtWidgets import QTextBrowser, QToolTip
+
+from content_store import SharedText
+from tracing import span
+
+# Qt's rich text understands a subset of CSS: enough for the template's colours, not for its layout
+_CSS = """
+pre { background-color: #23272e; }
+code { background-color: #23272e; }
+h1, h2, h3 { color: #4ec9b0; }
+a { color: #4ec9b0; }
+.role { color: #9aa5b1; font-size: small; }
+"""
+_CODE_BLOCK = re.compile(r'<pre><code(?: class="language-([\w+#-]+)")?>(.*?)</code></pre>', re.S)
+_KEYWORDS = (
+    "def|class|return|if|elif|else|for|while|in|not|and|or|is|import|from|as|with|try|except|finally|raise|yield|"
+    "lambda|pass|break|continue|async|await|function|const|let|var|new|this|self|public|private|protected|static|"
+    "void|int|float|double|bool|boolean|string|struct|enum|interface|type|fn|func|package|switch|case|default|"
+    "None|True|False|null|nil|true|false"
+)
+# one alternation, so a "#" inside a string or a keyword inside a comment is never coloured twice
+_TOKEN = re.compile(
+    r"(?P<comment>(?:#|//|--(?=\s)).*?$|/\*.*?\*/)"
+    r"|(?P<string>\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`[^`]*`)"
+    rf"|(?P<keyword>\b(?:{_KEYWORDS})\b)"
+    r"|(?P<number>\b(?:0[xX][\da-fA-F_]+|\d[\d_]*\.?\d*(?:[eE][-+]?\d+)?)\b)"
+    r"|(?P<type>@\w+|\b[A-Z][A-Za-z0-9_]*\b)",
+    re.M | re.S,
+)
+_COLORS = {"comment": "#7f848e", "string": "#98c379", "keyword": "#c678dd", "number": "#d19a66", "type": "#e5c07b",
+           "added": "#98c379", "removed": "#e06c75"}
+
+
+def _span(kind: str, text: str) -> str:
+    style = f"color:{_COLORS[kind]}" + (";font-weight:bold" if kind == "keyword" else "")
+    return f'<span style="{style}">{escape(text)}</span>'
+
+
+def highlight(code: str, lang: str | None) -> str:
+    """``code`` as HTML with keywords, strings, numbers and comments coloured (one regex pass, any language)."""
+    if lang == "diff":
+        return "\n".join(_span("added", l) if l.startswith("+") else _span("removed", l) if l.startswith("-")
+                         else escape(l) for l in code.split("\n"))
+    pieces, pos = [], 0
+    for m in _TOKEN.finditer(code):
+        pieces += [escape(code[pos:m.start()]), _span(m.lastgroup, m.group(0))]
+        pos = m.end()
+    return "".join(pieces) + escape(code[pos:])
+
+
+def _prepare(index: int, html: str) -> tuple[str, list[str]]:
+    """Block ``index`` with its code highlighted and a Copy link under each code block, and those codes."""
+    codes: list[str] = []
+
+    def code_block(m: re.Match) -> str:
+        lang, code = m.group(1), unescape(m.group(2))
+        codes.append(code.rstrip("\n"))
+        label = f"Copy {lang}" if lang else "Copy"
+        return (f"<pre><code>{highlight(code, lang)}</code></pre>"
+                f'<p align="right"><a href="copy:{index}/{len(codes) - 1}">{label}</a></p>')
+
+    return _CODE_BLOCK.sub(code_block, html), codes
+
+
+class LiteTranscript(QTextBrowser):
+    """Transcript in a native rich-text widget: no Chromium process, far less memory.
+
+    Only the blocks from the first changed one onwards are replaced, so a streaming
+    answer appends to the document instead of re-laying out the conversation, and
+    only the code in those blocks is highlighted again (as coloured spans in the
+    inserted HTML, without a Python callback per line). Tabs showing the same block
+    (the pinned code of one file, a fork's shared prefix) highlight it once.
+    Collapsible sections and side-by-side columns show as plain stacked blocks.
+    """
+    command = Signal(QUrl)  # a localpilot:// link was clicked (e.g. "fork from here")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ready = True
+        self._blocks: list[str] = []
+        self._starts: list[int] = []  # document position where each block starts
+        self._code: dict[int, list[str]] = {}  # block index -> its code blocks, for the Copy links
+        self._shared: dict[int, SharedText] = {}  # block index -> its HTML, keeping the prepared form alive
+        self.setOpenLinks(False)
+        self.anchorClicked.connect(self._on_anchor)
+        self.setStyleSheet("QTextBrowser { background:#0f1115; color:#e6e6e6; border:0; padding:10px; }")
+        self.document().setDefaultStyleSheet(_CSS)
+
+    def set_blocks(self, blocks: list[str], done=None) -> None:
+        """Show the transcript ``blocks``, re-inserting only those from the first changed one."""
+        first = 0
+        while first < min(len(blocks), len(self._blocks)) and blocks[first] == self._blocks[first]:
+            first += 1
+        if first == len(blocks) == len(self._blocks):
+            if done is not None:
+                done()
+            return
+        bar = self.verticalScrollBar()
+        at_bottom = bar.value() >= bar.maximum() - 80
+        with span("render.setHtml", "ui", bytes=sum(len(b) for b in blocks[first:])):
+            cursor = QTextCursor(self.document())
+            cursor.beginEditBlock()
+            if first < len(self._starts):
+                cursor.setPosition(self._starts[first])
+                cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+                cursor.removeSelectedText()
+                del self._starts[first:]
+            else:
+                cursor.movePosition(QTextCursor.End)
+            for index in range(first, len(blocks)):
+                self._starts.append(cursor.position())
+                if cursor.position() > 0:  # insertHtml would merge the first paragraph into the previous block
+                    cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+                cursor.insertHtml(self._prepare(index, blocks[index]))
+            cursor.endEditBlock()
+            for index in [i for i in self._shared if i >= len(blocks)]:
+                del self._shared[index]
+                self._code.pop(index, None)
+            self._blocks = list(blocks)
+        if at_bottom:
+            bar.setValue(bar.maximum())
+        if done is not None:
+            done()
+
+    def _prepare(self, index: int, html: str) -> str:
+        shared = self._shared[index] = SharedText(html)
+        html, codes = shared.derived(("lite", index), lambda: _prepare(index, shared.text))
+        if codes:
+            self._code[index] = codes
+        else:
+            self._code.pop(index, None)
+        return html
+
+    def _on_anchor(self, url: QUrl):
+        if url.scheme() == "copy":
+            block, _, n = url.path().partition("/")
+            try:
+                code = self._code[int(block)][int(n)]
+            except (KeyError, IndexError, ValueError):
+                return
+            QGuiApplication.clipboard().setText(code)
+            QToolTip.showText(QCursor.pos(), "Copied", self)
+        elif url.scheme() == "localpilot":
+            self.command.emit(url)
+        elif url.scheme() in ("http", "https"):
+            QDesktopServices.openUrl(url)
@@ -9,14 +9,22 @@ from PySide6.QtWidgets import (
     QToolButton, QLabel, QMessageBox
 )
 
-from ui.session_widget import SessionWidget
+from api_server import serve as serve_api
+from config import API_PORT, JOURNAL, SOCKET_NAME, TRANSCRIPT
+from journal import WRITER as JOURNAL_WRITER, recover
+from ui.session_widget import SessionWidget, wait_for_detached
 
-SOCKET_NAME = "LocalPilot"
+
+def load_transcript_engine() -> None:
+    """Import QtWebEngine for the "web" transcript; entry points call this before creating the QApplication."""
+    if TRANSCRIPT != "lite":
+        import PySide6.QtWebEngineWidgets  # noqa: F401  (must be loaded before the QApplication exists)
 
 
 class MainWindow(QMainWindow):
     """Holds tabs; manages IPC; persistent Always-On-Top toggle with visible status."""
-    def __init__(self, code: str, file_name: str):
+    def __init__(self, code: str, file_name: str, filepath: str | None = None,
+                 selection_range: tuple[int, int, int, int] | None = None):
         super().__init__()
         self.setWindowTitle("Local Pilot - Ameer J.")
         self.resize(1100, 820)
@@ -76,6 +84,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(container)
 
         self._server: QLocalServer | None = None
+        self._api = None  # api_server.APIServer when LOCALPILOT_API_PORT is set
 
         # Restore pin state and apply
         pinned = self._settings.value("ui/pin_on_top", False, type=bool)
@@ -85,7 +94,7 @@ class MainWindow(QMainWindow):
         self._apply_pin(pinned)
 
         # First tab
-        self.new_tab(code, file_name, select=True)
+        self.new_tab(code, file_name, select=True, filepath=filepath, selection_range=selection_range)
 
     # Pin logic
     def _apply_pin(self, checked: bool):
@@ -129,13 +138,37 @@ class MainWindow(QMainWindow):
             w.input.setFocus(Qt.ActiveWindowFocusReason)
 
     # Tabs
-    def new_tab(self, code: str, file_name: str, select: bool = True):
-        w = SessionWidget(code, file_name)
+    def new_tab(self, code: str, file_name: str, select: bool = True, filepath: str | None = None,
+                selection_range: tuple[int, int, int, int] | None = None,
+                session_id: str | None = None, fork_of: tuple[SessionWidget, int] | None = None) -> SessionWidget:
+        w = SessionWidget(code, file_name, filepath=filepath, selection_range=selection_range, session_id=session_id,
+                          fork_of=fork_of)
         w.asked.connect(self.bring_to_front)
-        idx = self.tabs.addTab(w, file_name or "selection")
+        w.fork_requested.connect(self.fork_tab)
+        title = file_name or "selection"
+        idx = self.tabs.addTab(w, f"{title} ⑂" if fork_of else title)
         if select:
             self.tabs.setCurrentIndex(idx)
         QTimer.singleShot(0, w.focus_input)
+        return w
+
+    def fork_tab(self, parent: SessionWidget, index: int) -> SessionWidget:
+        """Open a tab that continues ``parent``'s conversation after message ``index``."""
+        return self.new_tab(parent.code, parent.file_name, filepath=parent.filepath,
+                            selection_range=parent._selection_range, fork_of=(parent, index))
+
+    def recover_sessions(self) -> int:
+        """Reopen the tabs that were open when LocalPilot last died; returns how many."""
+        if not JOURNAL:
+            return 0
+        sessions = recover()
+        for s in sessions:
+            sel_range = s.state.get("selection_range")
+            w = self.new_tab(s.state.get("code", ""), s.state.get("file_name", "selection"), select=False,
+                             filepath=s.state.get("filepath"), selection_range=tuple(sel_range) if sel_range else None,
+                             session_id=s.id)
+            w.restore(s)
+        return len(sessions)
 
     def _on_tab_close(self, index: int):
         w = self.tabs.widget(index)
@@ -146,16 +179,33 @@ class MainWindow(QMainWindow):
                 QMessageBox.Yes | QMessageBox.No, QMessageBox.No
         ) != QMessageBox.Yes:
             return
+        self.close_tab(index)
+
+    def close_tab(self, index: int):
+        """Stop the tab's work and delete it (removeTab alone keeps the widget and its transcript alive)."""
+        w = self.tabs.widget(index)
         try:
-            if getattr(w, "_worker", None) and w._worker.isRunning():
-                w._worker.stop()
-                w._worker.wait()
+            if hasattr(w, "shutdown"):
+                w.shutdown()
         except Exception:
             pass
         self.tabs.removeTab(index)
+        w.deleteLater()
         if self.tabs.count() == 0:
             self.close()
 
+    def closeEvent(self, event):
+        for i in range(self.tabs.count()):
+            w = self.tabs.widget(i)
+            if hasattr(w, "shutdown"):
+                w.shutdown()
+        if self._api is not None:
+            self._api.shutdown()
+            self._api = None
+        wait_for_detached()
+        JOURNAL_WRITER.flush(2.0)  # the closed tabs' files are gone before the process is
+        super().closeEvent(event)
+
     # IPC (single window)
     def listen_ipc(self):
         try:
@@ -166,10 +216,14 @@ class MainWindow(QMainWindow):
         if not self._server.listen(SOCKET_NAME):
             return
         self._server.newConnection.connect(self._on_new_ipc_connection)
+        # the single listening instance also serves the local API, so all LLM traffic shares its slots
+        if API_PORT and self._api is None:
+            self._api = serve_api(API_PORT)
 
     def _on_new_ipc_connection(self):
         sock = self._server.nextPendingConnection()
         sock.readyRead.connect(lambda s=sock: self._on_ipc_ready(s))
+        sock.disconnected.connect(sock.deleteLater)  # otherwise every hand-off leaves a socket on the server
 
     def _on_ipc_ready(self, sock: QLocalSocket):
         try:
@@ -178,7 +232,9 @@ class MainWindow(QMainWindow):
             if msg.get("cmd") == "open_session":
                 code = msg.get("code", "")
                 file_name = msg.get("file", "selection")
-                self.new_tab(code, file_name, select=True)
+                sel_range = msg.get("range")
+                self.new_tab(code, file_name, select=True, filepath=msg.get("filepath"),
+                             selection_range=tuple(sel_range) if sel_range else None)
                 self.bring_to_front()
         finally:
             sock.disconnectFromServer()
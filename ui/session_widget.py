@@ -1,14 +1,12 @@
 from __future__ import annotations
 
-import json
 import os
 import shutil
 import subprocess
 import time
 from html import escape
 
-from PySide6.QtCore import Qt, QTimer, Signal, QSettings
-from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtCore import Qt, QEvent, QThread, QTimer, QUrl, Signal, QSettings, QFileSystemWatcher
 from PySide6.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -17,31 +15,140 @@ from PySide6.QtWidgets import (
     QLabel,
     QStatusBar,
     QComboBox,
+    QMenu,
+    QToolButton,
 )
 from markdown_it import MarkdownIt
 
-from config import fetch_ollama_models, MODEL, is_ollama_running
+from chunking import split_code
+from compression import compress
+from config import (
+    fetch_ollama_models, MODEL, is_ollama_running, LARGE_SELECTION_TOKENS, CHUNK_TOKENS, SYMBOL_CONTEXT_TOKENS,
+    SPECULATE, DIFF_MODE, DIFF_MIN_LINES, MODEL_PROFILES, COMPRESS_CONTEXT, WATCH_PINNED, TRANSCRIPT, JOURNAL,
+)
+from diff_apply import DiffError, StreamingDiffCheck, apply_markdown_diff
+from embedding_index import embeddings_for, format_hits, mentions_outside_code
+from content_store import Message, SharedText
+from journal import RecoveredSession, SessionJournal
+from live_context import LiveRegion
+from metrics import METRICS, format_hud
 from ollama_client import warm_up_model
-from resources.html_template import HTML_TEMPLATE
+from render_service import RENDERER, SYNC_RENDER_CHARS, RenderService
+from routing import AUTO, route
+from scheduler import PRIORITY_INTERACTIVE, PRIORITY_SPECULATIVE, SCHEDULER
+from speculation import CLICK_STATS, MESSAGE
+from symbol_index import index_for, format_context
+from tracing import span
 from ui.input_widget import AutoResizingTextEdit
-from utils import ACTIONS, lang_hint
+from utils import ACTIONS, DIFF_ACTIONS, describe_profile, diff_prompt, estimate_tokens, generation_profile, lang_hint
 from workers.chat_worker import ChatWorker
+from workers.map_reduce_worker import MapReduceWorker
 
 md = MarkdownIt()
 
 
+def transcript_view() -> QWidget:
+    """The transcript widget for ``LOCALPILOT_TRANSCRIPT``; QtWebEngine is only imported in "web" mode."""
+    if TRANSCRIPT == "lite":
+        from ui.lite_view import LiteTranscript
+        return LiteTranscript()
+    from ui.web_view import WebTranscript
+    return WebTranscript()
+
+# Stopped workers whose threads are still winding down. Module level so they
+# outlive a closed tab: destroying a running QThread aborts the process.
+_DETACHED: set[QThread] = set()
+# compressing a large selection takes seconds: its own thread, so it never holds up markdown rendering
+_COMPRESSOR = RenderService("compress")
+
+
+class _HudLabel(QLabel):
+    """Figures of the last request; the model's percentile table is only built when its tooltip is shown."""
+
+    def __init__(self):
+        super().__init__()
+        self.model: str | None = None
+
+    def event(self, e: QEvent) -> bool:
+        if e.type() == QEvent.ToolTip and self.model:
+            self.setToolTip(METRICS.export_text(self.model))
+        return super().event(e)
+
+
+def wait_for_detached(timeout_ms: int = 2000) -> None:
+    """Give stopped workers a moment to finish (called when the window closes)."""
+    for w in list(_DETACHED):
+        w.wait(timeout_ms)
+
+
+def join_background_threads(timeout_ms: int = 2000) -> None:
+    """Wait for stopped workers and end the render and compression threads.
+
+    For scripts that drive tabs and then exit: no thread is left to call into Qt
+    while the interpreter tears the objects down.
+    """
+    wait_for_detached(timeout_ms)
+    for service in (RENDERER, _COMPRESSOR):
+        service.close(timeout_ms / 1000)
+
+
 class SessionWidget(QWidget):
     """One chat session pinned to a specific code selection."""
     asked = Signal()  # emitted whenever a question is sent (used to bring window to front)
+    fork_requested = Signal(object, int)  # this tab, index of the last message the new tab shares
+    _rendered = Signal(int, int, str)  # transcript block index, render sequence, HTML (from the render thread)
+    _compressed_ready = Signal(str, object)  # pinned code key, its compression.Compressed (from _COMPRESSOR)
 
-    def __init__(self, code: str, file_name: str):
+    def __init__(self, code: str, file_name: str, filepath: str | None = None,
+                 selection_range: tuple[int, int, int, int] | None = None, session_id: str | None = None,
+                 fork_of: tuple[SessionWidget, int] | None = None):
+        """``fork_of`` is (parent tab, message index): the new tab continues the parent's
+        conversation after that message, sharing its messages, pinned code and transcript."""
         super().__init__()
-        self.code = code
+        parent, fork_at = fork_of or (None, 0)
+        self._pinned = SharedText(code)  # one copy per process, however many tabs pin the same code
         self.lang = lang_hint(file_name)
         self.file_name = file_name
+        self.filepath = filepath
+
+        # Project definitions referenced by the selection (index refreshes in the background)
+        self._symbols = index_for(filepath) if code.strip() and SYMBOL_CONTEXT_TOKENS > 0 else None
+        self._embeddings = embeddings_for(filepath)
+
+        # Conversation state (the model may get a compressed copy of the pinned code, computed off the
+        # GUI thread the first time compression is switched on)
+        self._compressed = None
+        self._apply_compressed = False  # put the result in the system message (not after a live edit)
+        self._compressed_ready.connect(self._on_compressed)
+        if parent is not None:  # a fork references the parent's prefix: the message objects are shared, not copied
+            self._pinned, self._compress = parent._pinned, parent._compress
+            self._compressed = parent._compressed
+            self._project_context = parent._project_context
+            self.history = parent.history[:fork_at + 1]
+        else:
+            self._compress = COMPRESS_CONTEXT
+            self._project_context = ""
+            self._build_system_message()
+        if self._compress and self._compressed is None:
+            self._apply_compressed = parent is None
+            self._compress_pinned()
+        self._endpoint = parent._endpoint if parent is not None else None  # server that caches our prefix
+
+        # Crash recovery: the conversation is stored and each streamed answer journaled
+        self._journal = SessionJournal(session_id) if JOURNAL else None
 
-        # Conversation state
-        self._build_system_message()
+        # Live pinned context: edits to the selected lines of the file reach the model as diffs
+        self._selection_range = selection_range
+        self._live = self._locate_region(selection_range)
+        self._watch = WATCH_PINNED and self._live is not None
+        self._watcher: QFileSystemWatcher | None = None
+        if self._live is not None:
+            self._watcher = QFileSystemWatcher([self.filepath], self)
+            self._reload_timer = QTimer(self)
+            self._reload_timer.setSingleShot(True)
+            self._reload_timer.setInterval(300)  # editors write in several steps
+            self._reload_timer.timeout.connect(self._on_file_changed)
+            self._watcher.fileChanged.connect(lambda _path: self._reload_timer.start())
 
         # Settings for persisting model selection
         self._settings = QSettings("AskAboutSelection", "Assistant")
@@ -49,12 +156,60 @@ class SessionWidget(QWidget):
         # Initialize Status bar FIRST (as moved in previous fix)
         self.status = QStatusBar()
         self.status.showMessage("Ready")
+        # Per-request figures from the server's final record (TTFT, tok/s, load time)
+        self.hud = _HudLabel()
+        self.status.addPermanentWidget(self.hud)
+        self._last_stats: dict | None = None
 
         # Top bar
         top = QHBoxLayout()
+        self._action_buttons: dict[str, QPushButton] = {}
         for action_key, action_value in ACTIONS.items():
             button_name = action_key.capitalize()
-            top.addWidget(self._mk_btn(button_name, self.create_button_handler(action_key)))
+            self._action_buttons[action_key] = self._mk_btn(button_name, self.create_button_handler(action_key))
+            top.addWidget(self._action_buttons[action_key])
+
+        # Fan-out: run the checked actions concurrently, each in its own section
+        top.addWidget(self._mk_btn("Run all", self.run_fan_out))
+        saved_fanout = self._settings.value("chat/fanout_actions", ",".join(ACTIONS), type=str).split(",")
+        self._fanout_menu = QMenu(self)
+        for action_key in ACTIONS:
+            act = self._fanout_menu.addAction(action_key.capitalize())
+            act.setData(action_key)
+            act.setCheckable(True)
+            act.setChecked(action_key in saved_fanout)
+            act.toggled.connect(self._save_fanout_selection)
+        fanout_pick = QToolButton()
+        fanout_pick.setText("▾")
+        fanout_pick.setToolTip("Choose the actions Run all dispatches")
+        fanout_pick.setFixedHeight(36)
+        fanout_pick.setPopupMode(QToolButton.InstantPopup)
+        fanout_pick.setMenu(self._fanout_menu)
+        top.addWidget(fanout_pick)
+
+        # Compare: the same question to several models side by side (or raced)
+        top.addWidget(self._mk_btn("Compare", self.run_compare))
+        self._compare_menu = QMenu(self)
+        compare_pick = QToolButton()
+        compare_pick.setText("▾")
+        compare_pick.setToolTip("Choose the models Compare asks, and whether they race")
+        compare_pick.setFixedHeight(36)
+        compare_pick.setPopupMode(QToolButton.InstantPopup)
+        compare_pick.setMenu(self._compare_menu)
+        top.addWidget(compare_pick)
+        self.compress_btn = self._mk_btn("Compress", self._toggle_compression)
+        self.compress_btn.setCheckable(True)
+        self.compress_btn.setChecked(self._compress)
+        self.compress_btn.setVisible(bool(self.code.strip()))
+        self._update_compress_tooltip()
+        top.addWidget(self.compress_btn)
+        self.live_btn = self._mk_btn("Live", self._toggle_live)
+        self.live_btn.setCheckable(True)
+        self.live_btn.setChecked(self._watch)
+        self.live_btn.setVisible(self._live is not None)
+        self.live_btn.setToolTip(f"Follow edits to the pinned lines of {self.file_name}: "
+                                 "changes go to the model as a diff with the next message")
+        top.addWidget(self.live_btn)
         top.addStretch(1)
 
         # Model selector and label
@@ -63,6 +218,7 @@ class SessionWidget(QWidget):
         self.model_lbl.setText("Current Model")
 
         self.model_combo = QComboBox()
+        self.model_combo.currentTextChanged.connect(self._on_model_changed)
 
         # Refresh button
         self.refresh_btn = self._mk_btn("Refresh", self._setup_model_selector)
@@ -81,11 +237,8 @@ class SessionWidget(QWidget):
         self.warm_up()
 
         # Transcript view
-        self.view = QWebEngineView()
-        self.view.setHtml(HTML_TEMPLATE)
-        self._page_ready = False
-        self._pending_html = None
-        self.view.loadFinished.connect(self._on_page_ready)
+        self.view = transcript_view()
+        self.view.command.connect(self._on_view_command)
 
         # Input row
         bottom = QHBoxLayout()
@@ -107,19 +260,52 @@ class SessionWidget(QWidget):
         # Streaming state
         self._render_buf: list[str] = []
         self._html: list[str] = []
+        self._render_seq = 0
+        self._block_seq: dict[int, int] = {}  # block index -> sequence of its latest render
+        self._rendering: set[int] = set()  # blocks whose latest render is still on the render thread
+        self._rendered.connect(self._on_rendered)
         self._assistant_md = ""
-        self._append_code_context_block()
-        self._set_html("".join(self._html))
+        self._answer_block = 0  # transcript block where the current answer starts
+        self._msg_blocks: dict[int, int] = {}  # history index -> transcript block of its role label
+        if parent is not None:
+            self._adopt_transcript(parent, fork_at)
+        else:
+            self._append_code_context_block()
+        self._set_html()
 
         self._render_timer = QTimer(self)
         self._render_timer.setInterval(80)
         self._render_timer.timeout.connect(self._flush_render)
 
-        self._worker: ChatWorker | None = None
+        self._worker: ChatWorker | MapReduceWorker | None = None
+        self._fan: dict[str, dict] = {}  # section key -> {"worker", "title", "md", "elapsed", "stats", "failed"}
+        self._fan_mode = "actions"  # what the sections are: "actions" (Run all), "compare" or "race"
         self._start_ts = 0.0
         self._chars = 0
+        self._project_context_added = parent is not None
+        self._diff: dict | None = None  # {"key", "check"} while a diff-mode answer streams
+        self._route = None  # routing.Route behind the last "Auto" model choice
+
+        # Speculative first action: generated invisibly, shown if that button is pressed
+        self._first_action_recorded = False
+        self._spec_worker: ChatWorker | None = None
+        self._spec_key: str | None = None
+        self._spec_model = ""
+        self._spec_buf: list[str] = []
+        self._spec_done = False
+        self._spec_started = 0.0
 
-        self._flush_render(force=True)
+        if parent is None:  # (a fork's last answer is already rendered)
+            self._flush_render(force=True)
+        if SPECULATE and self.code.strip():
+            QTimer.singleShot(0, self._start_speculation)
+        if parent is not None:
+            self._save_session()
+            if self.history[-1].role == "user":  # forked at a question: answer it afresh
+                QTimer.singleShot(0, self._answer_forked_question)
+            else:
+                self.status.showMessage(f"Forked after message {fork_at}: the next question reuses the prompt "
+                                        "the server already has")
 
     def _get_current_available_models(self) -> list[str]:
         """
@@ -134,23 +320,27 @@ class SessionWidget(QWidget):
         available Ollama models.
         """
         current_model_list = self._get_current_available_models()
-        try:
-            self.model_combo.currentTextChanged.disconnect(self._on_model_changed)
-        except RuntimeError:
-            pass
-
+        # no disconnect/reconnect: a failed disconnect warns with the widget's address, and every
+        # distinct warning text stays in the module's warning registry for the life of the process
+        self.model_combo.blockSignals(True)
         self.model_combo.clear()
 
         if current_model_list:
+            if len(current_model_list) > 1:
+                self.model_combo.addItem(AUTO)  # route per request; picking a model overrides it
+                self.model_combo.setItemData(0, "Pick a model per request from its size, action and "
+                                                "measured latency", Qt.ToolTipRole)
             self.model_combo.addItems(current_model_list)
+            self._populate_compare_menu(current_model_list)
             # Try to restore saved model or fall back to default/first available
             # Use the MODEL from config.py as the application-wide default if not saved
             saved_model = self._settings.value("chat/model", MODEL, type=str)
-            preferred = next((model for model in (saved_model, MODEL) if model in current_model_list),
+            choices = [self.model_combo.itemText(i) for i in range(self.model_combo.count())]
+            preferred = next((model for model in (saved_model, MODEL) if model in choices),
                              current_model_list[0])
             self.model_combo.setCurrentText(preferred)
             self.model_combo.setEnabled(True)
-            self.model_combo.currentTextChanged.connect(self._on_model_changed)
+            self.model_combo.blockSignals(False)
             self._on_model_changed(self.model_combo.currentText())
             self.status.showMessage("Ready")
             self.refresh_btn.setVisible(False)
@@ -160,6 +350,7 @@ class SessionWidget(QWidget):
             self.model_combo.addItem("No Ollama Models Found")
             self.model_combo.setCurrentIndex(0)
             self.model_combo.setEnabled(False)
+            self.model_combo.blockSignals(False)
             if server_up:
                 self.status.showMessage("No Ollama models found. Click Refresh to check again.")
             else:
@@ -192,89 +383,774 @@ class SessionWidget(QWidget):
             self.status.showMessage(f"Failed to start Ollama: {exc}")
 
     def create_button_handler(self, key):
-        return lambda: self.auto_run(ACTIONS[key])
+        return lambda: self.run_action(key)
 
     # public API
-    def auto_run(self, instruction: str):
+    def auto_run(self, instruction: str, action: str = "chat"):
         if not instruction.strip() or self._busy():
             return
         self.asked.emit()
         self._user_say(instruction)
-        self._chat()
+        self._chat(action=action)
+
+    def run_action(self, key: str):
+        """Run a quick action; oversized selections are analysed part by part."""
+        self._record_first_action(key)
+        if self._adopt_speculation(key):
+            return
+        self._cancel_speculation()
+        if estimate_tokens(self.code) > LARGE_SELECTION_TOKENS:
+            self._run_large_selection(ACTIONS[key], key)
+        elif self._diff_mode(key):
+            self._run_diff_action(key)
+        else:
+            self.auto_run(ACTIONS[key], key)
+
+    # diff mode: edit actions answer with a unified diff that is applied here
+    def _diff_mode(self, key: str) -> bool:
+        if key not in DIFF_ACTIONS or DIFF_MODE == "off" or not self.code.strip() or self._compress:
+            return False
+        return DIFF_MODE == "on" or self.code.count("\n") + 1 >= DIFF_MIN_LINES
+
+    def _action_message(self, key: str) -> tuple[str, str]:
+        """(prompt sent to the model, text shown in the transcript) for a quick action."""
+        if self._diff_mode(key):
+            return diff_prompt(key, self.file_name), f"{ACTIONS[key]} (answer as a diff)"
+        return ACTIONS[key], ACTIONS[key]
+
+    def _run_diff_action(self, key: str):
+        if self._busy():
+            return
+        prompt, shown = self._action_message(key)
+        self.asked.emit()
+        self._user_say(prompt, shown)
+        if self._chat(action=key, diff=True):
+            self._diff = {"key": key, "check": StreamingDiffCheck(self.code)}
+
+    def _finish_diff(self) -> bool:
+        """Apply the streamed diff; on failure regenerate the full answer (returns True then)."""
+        try:
+            patched = apply_markdown_diff(self.code, self._assistant_md)
+        except DiffError as e:
+            self._diff_fallback(str(e))
+            return True
+        self._diff = None
+        tail = f"\n\n**Patched code** (diff applied locally):\n\n```{self.lang}\n{patched.rstrip()}\n```\n"
+        self._assistant_md += tail
+        self._render_buf.append(tail)
+        return False
+
+    def _diff_fallback(self, reason: str):
+        key, self._diff = self._diff["key"], None
+        w, self._worker = self._worker, None
+        if w is not None and w.isRunning():
+            w.stop()
+            self._retire(w)
+        self._render_timer.stop()
+        del self._html[self._answer_block:]  # drop the unusable diff answer
+        self.history[-1] = Message("user", ACTIONS[key])
+        if self._chat(action=key):
+            self.status.showMessage(f"Diff did not apply ({reason}); generating the full code…")
+        else:
+            self._set_html()
+
+    def run_fan_out(self):
+        """Dispatch every checked action in parallel against the shared pinned prefix."""
+        keys = [a.data() for a in self._fanout_menu.actions() if a.isChecked()]
+        if not keys or self._busy():
+            return
+        models = {key: self._selected_model(key) for key in keys}
+        if not all(models.values()):
+            return
+        self._cancel_speculation()
+        self.asked.emit()
+        self._user_say("Run all: " + ", ".join(k.capitalize() for k in keys))
+        prefix = self.history[:-1]
+        used = ", ".join(dict.fromkeys(models.values()))
+        self._begin_response(used, f"Running {len(keys)} actions with {used}…")
+        large = estimate_tokens(self.code) > LARGE_SELECTION_TOKENS
+        workers = {}
+        for key in keys:
+            model = models[key]
+            if large:
+                chunks = split_code(self._context_code(), self.lang, CHUNK_TOKENS)
+                w = MapReduceWorker(ACTIONS[key], chunks, self.lang, model=model)
+            else:
+                w = ChatWorker(prefix + [Message("user", ACTIONS[key])], model=model,
+                               profile=self._profile(key, model), affinity=self._endpoint)
+            workers[key] = (key.capitalize(), w)
+        self._run_sections(workers, "actions")
+
+    def run_compare(self):
+        """Ask the checked models the typed question (or the last one again) side by side."""
+        models = [a.data() for a in self._compare_menu.actions() if a.data() and a.isChecked()]
+        if len(models) < 2:
+            self.status.showMessage("Pick at least two models to compare (▾ next to Compare).")
+            return
+        if self._busy():
+            return
+        text = self.input.toPlainText().strip()
+        if text:
+            self.input.clear()
+            self.input.reset_to_min()
+        else:
+            text = next((m.content for m in reversed(self.history) if m.role == "user"), "")
+            if not text:
+                self.status.showMessage("Type a question to compare the models on.")
+                return
+        race = self._race_action.isChecked() and self._race_action.isEnabled()
+        self._cancel_speculation()
+        self.asked.emit()
+        self._user_say(text)
+        messages = list(self.history)
+        self._route = None
+        self._begin_response(", ".join(models), f"{'Racing' if race else 'Comparing'} {len(models)} models…")
+        self._run_sections({m: (m, ChatWorker(list(messages), model=m, profile=self._profile("chat", m)))
+                            for m in models}, "race" if race else "compare")
+
+    def _run_sections(self, workers: dict[str, tuple[str, QThread]], mode: str):
+        """Stream several workers side by side, one transcript section each.
+
+        ``mode`` is "actions" (Run all), "compare" or "race" (the first answer to
+        finish wins and the other requests are cancelled).
+        """
+        self._fan_mode = mode
+        for key, (title, w) in workers.items():
+            w.chunk.connect(lambda s, k=key, w=w: self._on_fan_chunk(k, w, s))
+            w.error.connect(lambda msg, k=key, w=w: self._on_fan_error(k, w, msg))
+            w.done.connect(lambda k=key, w=w: self._on_fan_done(k, w))
+            if isinstance(w, ChatWorker):
+                w.stats.connect(lambda stats, k=key, w=w: self._on_fan_stats(k, w, stats))
+            w.finished.connect(lambda w=w: self._release(w))
+            self._fan[key] = {"worker": w, "title": title, "md": "", "elapsed": None, "stats": None, "failed": False}
+        for sec in self._fan.values():
+            sec["worker"].start()
+        self._render_timer.start()
+
+    def _populate_compare_menu(self, models: list[str]):
+        saved = self._settings.value("chat/compare_models", "", type=str).split(",")
+        self._compare_menu.clear()
+        for model in models:
+            act = self._compare_menu.addAction(model)
+            act.setData(model)
+            act.setCheckable(True)
+            act.setChecked(model in saved)
+            act.toggled.connect(self._save_compare_selection)
+        self._compare_menu.addSeparator()
+        self._race_action = self._compare_menu.addAction("Race: keep the first answer, cancel the rest")
+        self._race_action.setCheckable(True)
+        self._race_action.setChecked(self._settings.value("chat/compare_race", False, type=bool))
+        if SCHEDULER.slots < 2:  # one slot serves the models in turn: the first in the queue always wins
+            self._race_action.setText("Race (needs OLLAMA_NUM_PARALLEL of 2 or more)")
+            self._race_action.setEnabled(False)
+        self._race_action.toggled.connect(lambda on: self._settings.setValue("chat/compare_race", on))
+
+    def _save_compare_selection(self, *_):
+        models = [a.data() for a in self._compare_menu.actions() if a.data() and a.isChecked()]
+        self._settings.setValue("chat/compare_models", ",".join(models))
+
+    def _save_fanout_selection(self, *_):
+        keys = [a.data() for a in self._fanout_menu.actions() if a.isChecked()]
+        self._settings.setValue("chat/fanout_actions", ",".join(keys))
+
+    def _on_fan_chunk(self, key: str, worker: QThread, s: str):
+        sec = self._fan.get(key)
+        if sec and sec["worker"] is worker and sec["elapsed"] is None:
+            sec["md"] += s
+            self._render_buf.append(s)
+            self._chars += len(s)
+
+    def _on_fan_error(self, key: str, worker: QThread, msg: str):
+        sec = self._fan.get(key)
+        if sec and sec["worker"] is worker:
+            sec["failed"] = True
+            self._on_fan_chunk(key, worker, f"\n\n**Error:** {msg}\n")
+
+    def _on_fan_stats(self, key: str, worker: QThread, stats: dict):
+        sec = self._fan.get(key)
+        if sec and sec["worker"] is worker:
+            sec["stats"] = stats
+
+    def _on_fan_done(self, key: str, worker: QThread):
+        sec = self._fan.get(key)
+        if not sec or sec["worker"] is not worker or sec["elapsed"] is not None:
+            return
+        sec["elapsed"] = time.time() - self._start_ts
+        self._render_buf.append("")
+        if self._fan_mode == "race" and not sec["failed"]:
+            self._win_race(key)
+        elif all(s["elapsed"] is not None for s in self._fan.values()):
+            self._finish_fan_out()
+
+    @staticmethod
+    def _section_state(sec: dict) -> str:
+        """Summary-line state of a section: "generating…", its time, or its TTFT / tok/s once known."""
+        if sec["elapsed"] is None:
+            return "generating…"
+        hud = format_hud(sec["stats"] or {})
+        return f"{sec['elapsed']:.1f}s · {hud}" if hud else f"{sec['elapsed']:.1f}s"
+
+    def _win_race(self, winner: str):
+        losers = [k for k, s in self._fan.items() if k != winner and s["elapsed"] is None]
+        for key in losers:
+            w = self._fan[key]["worker"]
+            if w is not None:
+                w.stop()
+                self._retire(w)
+        self._fan = {winner: self._fan[winner]}
+        self._finish_fan_out(cancelled=losers)
+
+    def _finish_fan_out(self, stopped: bool = False, cancelled: list[str] | None = None):
+        self._render_timer.stop()
+        if self._fan_mode == "race" and len(self._fan) == 1:
+            self._assistant_md = next(iter(self._fan.values()))["md"]
+        else:
+            self._assistant_md = "\n\n".join(f"## {s['title']}\n\n{s['md']}" for s in self._fan.values())
+        self._flush_render(True)
+        self.history.append(Message("assistant", self._assistant_md))
+        self._save_session()
+        if stopped:
+            self.status.showMessage("Generation stopped")
+            return
+        elapsed = time.time() - self._start_ts
+        if self._fan_mode == "actions":
+            slowest = max(self._fan, key=lambda k: self._fan[k]["elapsed"])
+            self.status.showMessage(
+                f"Done {len(self._fan)} actions in {elapsed:.1f}s | slowest {self._fan[slowest]['title']} "
+                f"{self._fan[slowest]['elapsed']:.1f}s | {self._chars} chars | {self._active_model}"
+            )
+            return
+        figures = " | ".join(
+            f"{s['title']} " + (f"TTFT {s['stats']['ttft_s']:.2f}s" if (s["stats"] or {}).get("ttft_s") is not None
+                                 else f"{s['elapsed']:.1f}s")
+            + (f" · {s['stats']['gen_tps']:.0f} tok/s" if (s["stats"] or {}).get("gen_tps") else "")
+            for s in self._fan.values())
+        if cancelled is not None:
+            self.status.showMessage(f"{next(iter(self._fan))} won in {elapsed:.1f}s ({figures}); "
+                                    f"cancelled {', '.join(cancelled) or 'none'}")
+        elif self._fan_mode == "race":
+            self.status.showMessage(f"No model finished the race: all {len(self._fan)} failed in {elapsed:.1f}s")
+        else:
+            self.status.showMessage(f"Compared {len(self._fan)} models in {elapsed:.1f}s | {figures}")
 
     def focus_input(self):
         self.warm_up()
         self.input.setFocus(Qt.TabFocusReason)
 
     def warm_up(self):
-        model = self.model_combo.currentText().strip()
-        if model and model != "No Ollama Models Found":
+        model = self._resolve_model()
+        if model:
             warm_up_model(model)
 
     # conversation plumbing
     def _build_system_message(self):
+        self.history = [Message("system", self._system_content())]
+
+    def _system_content(self) -> str:
         base = "You are a senior software engineer. Be concise and precise."
         if self.code.strip():
             content = (
                 base + " Pinned code context follows.\n\n" +
-                f"```{self.lang}\n{self.code}\n```"
+                f"```{self.lang}\n{self._context_code()}\n```"
             )
         else:
             content = base
-        self.history = [{"role": "system", "content": content}]
+        return content + self._project_context
+
+    @property
+    def code(self) -> str:
+        return self._pinned.text
+
+    @code.setter
+    def code(self, text: str):
+        self._pinned = SharedText(text)
+
+    def _compress_pinned(self):
+        """Compress the pinned code on the compression thread; ``_on_compressed`` takes the result.
+
+        The result is kept with the code in the content store, so other tabs on the same code reuse it.
+        """
+        if not self.code.strip():
+            return
+        pinned, lang, ready = self._pinned, self.lang, self._compressed_ready
+
+        def done(result):
+            try:
+                ready.emit(pinned.key, result)
+            except RuntimeError:  # the tab was closed meanwhile
+                pass
+
+        _COMPRESSOR.submit(id(self), "pinned",
+                           lambda: pinned.derived(("compress", lang), lambda: compress(pinned.text, lang)), done)
+
+    def _on_compressed(self, key: str, result):
+        if key != self._pinned.key:
+            return  # the pinned code changed since; a newer compression is on its way
+        self._compressed = result
+        self._update_compress_tooltip()
+        if self._compress and self._apply_compressed:
+            self._apply_compressed = False
+            self._cancel_speculation()
+            self.history[0] = Message("system", self._system_content())
+            self.status.showMessage(f"Pinned code compressed for the model: {result.summary()}")
+
+    def _context_code(self) -> str:
+        """The pinned code as the model sees it (comments etc. stripped when compression is on)."""
+        return self._compressed.text if self._compress and self._compressed else self.code
+
+    def _toggle_compression(self, on: bool):
+        if self._busy():  # the running request already has its prompt
+            self.compress_btn.setChecked(self._compress)
+            return
+        self._compress = on
+        self._cancel_speculation()
+        if on and self._compressed is None:
+            self._apply_compressed = True
+            self._compress_pinned()  # the system message changes once it is ready
+            self.status.showMessage("Compressing the pinned code…")
+            return
+        self.history[0] = Message("system", self._system_content())
+        if on:
+            self.status.showMessage(f"Pinned code compressed for the model: {self._compressed.summary()}")
+        else:
+            self.status.showMessage(f"Pinned code sent verbatim ({estimate_tokens(self.code)} tokens)")
+
+    def _update_compress_tooltip(self):
+        self.compress_btn.setToolTip(
+            "Send the pinned code without comments, with docstrings shortened and large literals elided; "
+            "the transcript keeps the original. Edit actions then answer in full instead of as a diff."
+            + (f"\n{self._compressed.summary()}" if self._compressed is not None else "")
+        )
 
-    def _user_say(self, text: str):
-        self.history.append({"role": "user", "content": text})
-        self._append_role_block("user", text)
+    def _locate_region(self, selection_range) -> LiveRegion | None:
+        if not self.filepath or not self.code.strip():
+            return None
+        try:
+            with open(self.filepath, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return None
+        return LiveRegion.locate(text, self.code, selection_range[0] if selection_range else None)
+
+    def _toggle_live(self, on: bool):
+        self._watch = on
+        if on:
+            self._on_file_changed()  # catch up on edits made while it was off
+
+    def _on_file_changed(self):
+        if self.filepath not in self._watcher.files() and os.path.exists(self.filepath):
+            self._watcher.addPath(self.filepath)  # saved by replacing the file
+        if not self._watch:
+            return
+        try:
+            with open(self.filepath, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return
+        self._live.update(text)
+        if self._live.changed:
+            self._cancel_speculation()
+            self.status.showMessage(f"{self.file_name} edited (now lines {self._live.start + 1}–{self._live.end}); "
+                                    "the changes go to the model with your next message")
+
+    def _sync_live_context(self):
+        """Send edits to the pinned lines since the model last saw them, as a diff message."""
+        if not self._watch or self._live is None:
+            return
+        change = self._live.take_change()
+        if change is None:
+            return
+        self.history.append(Message("user", change.message(self.file_name)))
+        self.code = self._live.text.rstrip("\n")
+        self._compressed = None  # recomputed when compression is next switched on
+        if self._compress:
+            self._compress_pinned()
+        self._update_compress_tooltip()
+        self._html.append(
+            f'<details><summary style="cursor:pointer">{escape(self.file_name)} edited '
+            f'({escape(change.summary())})</summary>'
+            f'<pre><code class="language-diff">{escape(change.diff)}</code></pre></details><hr/>'
+        )
+
+    def _add_project_context(self):
+        """Add the project definitions the pinned code refers to, once, as soon as the index is ready.
+
+        Before the first question they go into the system message. If the index is
+        ready only later, they become a message of their own: the system message the
+        model has already answered with (and the server has cached) stays unchanged.
+        """
+        if self._project_context_added or not self._symbols or not self._symbols.ready.is_set():
+            return
+        self._project_context_added = True
+        defs = self._symbols.context_for(self.code, self.lang, SYMBOL_CONTEXT_TOKENS, exclude=self.filepath)
+        if not defs:
+            return
+        if len(self.history) == 1:
+            self._project_context = "\n\n" + format_context(defs)
+            self.history[0] = Message("system", self.history[0].content + self._project_context)
+        else:
+            self.history.append(Message("system", "Project definitions the pinned code refers to:\n\n"
+                                                  + format_context(defs)))
+        names = ", ".join(escape(d["name"]) for d in defs)
+        self._html.append(
+            f'<details><summary style="cursor:pointer">Project context ({len(defs)} definitions)</summary>'
+            f'<p>{names}</p></details><hr/>'
+        )
+
+    def _user_say(self, text: str, shown: str | None = None):
+        self._add_project_context()
+        self._sync_live_context()
+        self.history.append(Message("user", text))
+        self._append_role_block("user", text if shown is None else shown, len(self.history) - 1)
         self._flush_render(True)
 
-    def _chat(self):
+    def _resolve_model(self, action: str = "chat") -> str | None:
+        """The model for the next request: the selected one, or the routed one under "Auto"."""
         model = self.model_combo.currentText().strip()
         if not model or model == "No Ollama Models Found":  # Check for the dummy text
+            return None
+        self._route = None
+        if model != AUTO:
+            return model
+        models = [self.model_combo.itemText(i) for i in range(self.model_combo.count())]
+        prompt_tokens = sum(estimate_tokens(m.content) for m in self.history)
+        self._route = route(models, prompt_tokens, action, selection_tokens=estimate_tokens(self.code))
+        return self._route.model
+
+    def _selected_model(self, action: str = "chat") -> str | None:
+        model = self._resolve_model(action)
+        if not model:
             self.status.showMessage("No Ollama models available to chat with.")
+        return model
+
+    def _generating_label(self, model: str, profile: dict | None = None) -> str:
+        label = model if self._route is None else f"Auto → {model} ({self._route.reason})"
+        return f"{label}, {describe_profile(profile)}" if profile else label
+
+    def _profile(self, action: str, model: str, diff: bool = False) -> dict:
+        return generation_profile(action, model, MODEL_PROFILES, estimate_tokens(self.code), diff)
+
+    def _chat(self, prepare=None, action: str = "chat", diff: bool = False) -> bool:
+        """Ask the model for an answer to ``history``; False if there is no model to ask."""
+        model = self._selected_model(action)
+        if not model:
+            return False
+        profile = self._profile(action, model, diff)
+        self._begin_response(model, f"Generating with {self._generating_label(model, profile)}…")
+        self._start_worker(ChatWorker(self.history, model=model, prepare=prepare, profile=profile,
+                                      affinity=self._endpoint))
+        return True
+
+    def _retrieval_for(self, question: str):
+        """Return a callable that attaches project code relevant to ``question``, or None."""
+        if not self._embeddings or not mentions_outside_code(question, self.code):
+            return None
+        history, at = self.history, len(self.history) - 1
+        index = self._embeddings
+
+        def attach():
+            hits = index.context_for(question, self.code)
+            if hits:
+                history[at] = Message("user", history[at].content + "\n\n" + format_hits(hits, lang_hint))
+
+        return attach
+
+    def _run_large_selection(self, instruction: str, action: str = "chat"):
+        if not instruction.strip() or self._busy():
+            return
+        model = self._selected_model(action)
+        if not model:
             return
+        label = self._generating_label(model)
+        chunks = split_code(self._context_code(), self.lang, CHUNK_TOKENS)
+        self.asked.emit()
+        self._user_say(instruction)
+        self._begin_response(model, f"Large selection: analysing {len(chunks)} parts with {label}…")
+        worker = MapReduceWorker(instruction, chunks, self.lang, model=model)
+        worker.progress.connect(self._on_part_done)
+        self._start_worker(worker)
 
+    def _begin_response(self, model: str, status: str):
         if self._worker and self._worker.isRunning():
             self._worker.stop()
-            self._worker.wait()
+            self._retire(self._worker)
 
         self._assistant_md = ""
         self._render_buf = []
-        self.status.showMessage(f"Generating with {model}…")
+        self._fan = {}
+        self._diff = None
+        self._last_stats = None
+        self.status.showMessage(status)
         self._start_ts = time.time()
         self._chars = 0
-        self._append_role_block("assistant", "")
+        self._answer_block = len(self._html)  # first transcript block of this answer
+        self._append_role_block("assistant", "", len(self.history))  # its message is added when it is done
         self._flush_render(True)
-
         self._active_model = model
-        self._worker = ChatWorker(self.history, model=model)
-        self._worker.chunk.connect(self._on_chunk)
-        self._worker.error.connect(self._on_error)
-        self._worker.done.connect(self._on_done)
+        if self._journal is not None:
+            self._journal.begin(self._session_state(), model)
+
+    def _start_worker(self, worker: ChatWorker | MapReduceWorker):
+        self._worker = worker
+        # a worker replaced mid-answer (diff fallback) may still deliver queued signals
+        worker.chunk.connect(lambda s, w=worker: self._on_chunk(s) if w is self._worker else None)
+        worker.error.connect(lambda msg, w=worker: self._on_error(msg) if w is self._worker else None)
+        worker.done.connect(lambda w=worker: self._on_done() if w is self._worker else None)
+        if isinstance(worker, ChatWorker):
+            worker.status.connect(lambda text, w=worker: self._on_worker_status(w, text))
+            worker.stats.connect(lambda stats, w=worker: self._on_stats(w, stats))
+        worker.finished.connect(lambda w=worker: self._release(w))
         self._worker.start()
         self._render_timer.start()
 
+    # speculative first action
+    def _record_first_action(self, action: str):
+        if not self._first_action_recorded and len(self.history) == 1:
+            self._first_action_recorded = True
+            CLICK_STATS.record(self.lang, action)
+
+    def _start_speculation(self):
+        if SCHEDULER.slots < 2:  # speculation only ever runs on a spare slot
+            return
+        key = CLICK_STATS.most_likely(self.lang)
+        if key not in ACTIONS or self._busy() or len(self.history) > 1 or estimate_tokens(self.code) > LARGE_SELECTION_TOKENS:
+            return
+        model = self._resolve_model(key)
+        if not model:
+            return
+        self._add_project_context()
+        messages = [self.history[0], Message("user", self._action_message(key)[0])]
+        w = ChatWorker(messages, model=model, priority=PRIORITY_SPECULATIVE,
+                       profile=self._profile(key, model, self._diff_mode(key)))
+        w.chunk.connect(lambda s, w=w: self._on_spec_chunk(w, s))
+        w.error.connect(lambda msg, w=w: self._on_spec_error(w, msg))
+        w.done.connect(lambda w=w: self._on_spec_done(w))
+        w.finished.connect(lambda w=w: self._release(w))
+        self._spec_worker, self._spec_key, self._spec_model = w, key, model
+        self._spec_buf, self._spec_done = [], False
+        self._spec_started = time.time()
+        w.start(QThread.LowestPriority)
+
+    def _on_spec_chunk(self, w: ChatWorker, s: str):
+        if w is self._worker:
+            self._on_chunk(s)
+        elif w is self._spec_worker:
+            self._spec_buf.append(s)
+
+    def _on_spec_error(self, w: ChatWorker, msg: str):
+        if w is self._worker:
+            self._on_error(msg)
+        elif w is self._spec_worker:
+            self._cancel_speculation()
+
+    def _on_spec_done(self, w: ChatWorker):
+        if w is self._worker:
+            self._on_done()
+        elif w is self._spec_worker:
+            self._spec_done = True
+
+    def _adopt_speculation(self, key: str) -> bool:
+        """Show the pre-generated answer for ``key`` (and keep streaming it) if there is one."""
+        w = self._spec_worker
+        if (w is None or key != self._spec_key or self._busy()
+                or self._resolve_model(key) != self._spec_model):
+            return False
+        self._spec_worker = None
+        w.set_priority(PRIORITY_INTERACTIVE)  # still waiting for a slot: it is the user's request now
+        self.asked.emit()
+        self._user_say(*self._action_message(key))
+        label = self._generating_label(self._spec_model, w.profile)
+        self._begin_response(self._spec_model, f"Generating with {label}… (prefetched)")
+        if self._diff_mode(key):
+            self._diff = {"key": key, "check": StreamingDiffCheck(self.code)}
+        self._start_ts = self._spec_started
+        self._worker = w
+        w.status.connect(lambda text, w=w: self._on_worker_status(w, text))
+        w.stats.connect(lambda stats, w=w: self._on_stats(w, stats))
+        buffered, self._spec_buf = self._spec_buf, []
+        for s in buffered:
+            self._on_chunk(s)
+        if self._spec_done:
+            if w.timeline.tokens:
+                self._on_stats(w, w.timeline.stats())
+            self._on_done()
+            if not w.isRunning():
+                self._release(w)
+        else:
+            self._render_timer.start()
+        return True
+
+    def _cancel_speculation(self):
+        w, self._spec_worker = self._spec_worker, None
+        self._spec_buf = []
+        if w is None:
+            return
+        if w.isRunning():
+            w.stop()
+            self._retire(w)
+        else:
+            self._release(w)
+
+    def _release(self, worker: QThread):
+        """Drop and delete a finished worker.
+
+        Its signals are connected to lambdas holding this tab, so a QThread that is
+        never deleted keeps a closed tab, its transcript and its history alive.
+        """
+        if worker is self._spec_worker:
+            return  # a finished prefetch waits for its button; released when adopted or cancelled
+        if worker is self._worker:
+            self._worker = None
+        for sec in self._fan.values():
+            if sec["worker"] is worker:
+                sec["worker"] = None
+        try:
+            worker.deleteLater()
+        except RuntimeError:
+            pass  # already deleted (adopted prefetch released twice)
+
+    def _retire(self, worker: QThread):
+        """Keep a stopped worker referenced until its thread has finished (even if this tab closes)."""
+        if not worker.isRunning():
+            return
+        _DETACHED.add(worker)
+        worker.finished.connect(lambda w=worker: _DETACHED.discard(w))
+
+    def _confirm_released(self, workers: list[QThread], stopped_at: float):
+        """Report once the stopped workers have closed their connections and given back their slots."""
+        pending = {id(w) for w in workers}
+
+        def finished(w):
+            pending.discard(id(w))
+            if pending or not self.status.currentMessage().startswith("Generation stopped"):
+                return
+            ms = (time.perf_counter() - stopped_at) * 1000
+            self.status.showMessage(f"Generation stopped · connection closed, server slot released in {ms:.0f} ms "
+                                    f"({SCHEDULER.in_use}/{SCHEDULER.slots} slots busy)")
+
+        for w in workers:
+            if w.isRunning():
+                w.finished.connect(lambda w=w: finished(w))
+            else:
+                finished(w)
+
+    def _on_worker_status(self, w: ChatWorker, text: str):
+        if w is self._worker:
+            self.status.showMessage(text)
+
+    def _on_stats(self, w: ChatWorker, stats: dict):
+        if w is not self._worker:
+            return
+        self._last_stats = stats
+        self._endpoint = stats.get("endpoint") or self._endpoint
+        self.hud.setText(format_hud(stats))
+        self.hud.model = stats.get("model")
+
+    def _on_part_done(self, finished: int, total: int):
+        self.status.showMessage(f"Large selection: {finished}/{total} parts done with {self._active_model}…")
+
     def _on_chunk(self, s: str):
+        if self._journal is not None:
+            self._journal.append(s)
         self._render_buf.append(s)
         self._assistant_md += s
         self._chars += len(s)
+        if self._diff is not None and self._diff["check"].feed(s):
+            self._diff_fallback(self._diff["check"].error)
 
     def _on_model_changed(self, model: str):
         self._settings.setValue("chat/model", model)
+        for key, button in self._action_buttons.items():
+            budget = describe_profile(generation_profile(key, None if model == AUTO else model, MODEL_PROFILES))
+            button.setToolTip(f"{ACTIONS[key]}\n\nGeneration budget: {budget}")
 
     def _on_error(self, msg: str):
+        self._diff = None  # a failed request is reported as it is, not asked again in full
         self._render_buf.append(f"\n\n**Error:** {msg}\n")
 
     def _on_done(self):
+        if self._diff is not None and self._finish_diff():
+            return
         self._render_timer.stop()
         self._flush_render(True)
-        self.history.append({"role": "assistant", "content": self._assistant_md})
+        self.history.append(Message("assistant", self._assistant_md))
+        self._save_session()
         elapsed = time.time() - self._start_ts
-        cps = int(self._chars / elapsed) if elapsed > 0 else 0
         model = getattr(self, "_active_model", self.model_combo.currentText())
-        self.status.showMessage(
-            f"Done in {elapsed:.1f}s | {self._chars} chars @ {cps} cps | {model}"
-        )
+        stats = self._last_stats or {}
+        if stats.get("gen_tps"):
+            rate = f"{stats['gen_tokens']} tokens @ {stats['gen_tps']:.1f} tok/s"
+        else:
+            rate = f"{self._chars} chars @ {int(self._chars / elapsed) if elapsed > 0 else 0} cps"
+        if stats.get("stop_reason") == "length":
+            rate += " (token budget reached)"
+        elif stats.get("stop_reason") == "artifact":
+            rate += " (stopped after the code block)"
+        self.status.showMessage(f"Done in {elapsed:.1f}s | {rate} | {model}")
+
+    # forking
+    def _on_view_command(self, url: QUrl):
+        if url.host() == "fork":
+            try:
+                index = int(url.path().strip("/"))
+            except ValueError:
+                return
+            if index in self._msg_blocks and index < len(self.history):  # a streaming answer has no message yet
+                self.fork_requested.emit(self, index)
+
+    def _answer_forked_question(self):
+        """Answer the question the fork ends with; a quick action runs again through ``run_action``.
+
+        Re-asking an action's prompt with ``_chat`` would show a diff-mode answer raw instead of applying it.
+        """
+        question = self.history[-1].content
+        key = next((k for k in ACTIONS if question in (ACTIONS[k], diff_prompt(k, self.file_name))), None)
+        if key is None:
+            self._chat()
+            return
+        del self._html[self._msg_blocks.pop(len(self.history) - 1):]  # run_action asks it again
+        self.history.pop()
+        self.run_action(key)
+
+    def _adopt_transcript(self, parent: SessionWidget, fork_at: int):
+        """Start the transcript with the parent's blocks up to message ``fork_at`` (the strings are shared)."""
+        end = parent._msg_blocks[fork_at] + 2
+        self._html = parent._html[:end]
+        self._msg_blocks = {m: b for m, b in parent._msg_blocks.items() if m <= fork_at}
+        for m, b in self._msg_blocks.items():
+            if b + 1 in parent._rendering:  # the parent's render of it has not arrived yet
+                text = self.history[m].content
+                self._render_block(b + 1, len(text), lambda text=text: md.render(text))
+
+    # crash recovery
+    def _session_state(self) -> dict:
+        return {"file_name": self.file_name, "filepath": self.filepath, "code": self.code,
+                "selection_range": self._selection_range, "project_context": self._project_context,
+                "history": [m.as_dict() for m in self.history]}
+
+    def _save_session(self):
+        """Compact the finished answer into the session store (drops its journal)."""
+        if self._journal is not None:
+            self._journal.save(self._session_state())
+
+    def restore(self, session: RecoveredSession):
+        """Show a conversation recovered after a crash, with the interrupted answer if there was one."""
+        self._project_context = session.state.get("project_context", "")
+        self._project_context_added = True
+        self.history = [Message(m["role"], m["content"]) for m in session.state["history"]]
+        for i, message in enumerate(self.history[1:], 1):
+            if message.role != "system":  # project context that arrived mid-conversation
+                self._append_role_block(message.role, message.content, i)
+        if session.partial is not None:
+            if session.partial:
+                self.history.append(Message("assistant", session.partial))
+                self._append_role_block("assistant", session.partial, len(self.history) - 1)
+            model = f" from {escape(session.model)}" if session.model else ""
+            self._html.append(f'<p class="role">Answer{model} interrupted: LocalPilot stopped after '
+                              f'{len(session.partial)} characters; recovered from the journal.</p><hr/>')
+        self._set_html()  # not _flush_render: there is no streamed answer to re-render
+        self._save_session()
+        self.status.showMessage("Recovered after an unexpected exit")
 
     # rendering
     def _append_code_context_block(self):
@@ -282,40 +1158,77 @@ class SessionWidget(QWidget):
             return
         lang = self.lang or "plaintext"
         self._html.append('<div class="role">system</div>')
-        self._html.append(
+        self._html.append(self._pinned.derived(("context_html", lang), lambda: (
             f'<details open>'
             f'<summary style="cursor:pointer">Pinned code context ({lang})</summary>'
             f'<pre><code class="language-{lang}">{escape(self.code)}</code></pre>'
             f'</details><hr/>'
-        )
+        )))
 
-    def _append_role_block(self, role: str, content_md: str):
+    def _append_role_block(self, role: str, content_md: str, message: int | None = None):
+        """Add a message to the transcript; ``message`` (its history index) adds a "fork" link."""
         label = {"system": "system", "user": "you", "assistant": "assistant"}.get(role, role)
+        if message is not None:
+            self._msg_blocks[message] = len(self._html)
+            label += f' <a href="localpilot://fork/{message}" title="Continue from here in a new tab">fork</a>'
         self._html.append(f'<div class="role">{label}</div>')
-        self._html.append(md.render(content_md or ""))
+        text = content_md or ""
+        self._html.append(f"<pre>{escape(text)}</pre>" if len(text) >= SYNC_RENDER_CHARS else "")
+        self._render_block(len(self._html) - 1, len(text), lambda: md.render(text))
+
+    def _assistant_job(self):
+        """A render of the current answer that only uses a snapshot (safe on the render thread)."""
+        if not self._fan:
+            text = self._assistant_md
+            return len(text), lambda: md.render(text)
+        sections = [(sec["title"], self._section_state(sec), sec["md"]) for sec in self._fan.values()]
+        side_by_side = self._fan_mode != "actions" and len(sections) > 1
+        cell = ' style="min-width:0"' if side_by_side else ""
+
+        def job():
+            html = "".join(
+                f'<details open class="fanout"{cell}>'
+                f'<summary style="cursor:pointer">{escape(title)} · {escape(state)}</summary>'
+                f'{md.render(text)}</details>'
+                for title, state, text in sections
+            )
+            if side_by_side:  # one column per model
+                html = (f'<div class="compare" style="display:grid;gap:12px;'
+                        f'grid-template-columns:repeat({len(sections)},minmax(0,1fr))">{html}</div>')
+            return html
+
+        return sum(len(t) for _, _, t in sections), job
+
+    def _render_block(self, index: int, size: int, job) -> None:
+        """Render block ``index`` inline when small, otherwise on the shared render thread."""
+        self._render_seq += 1
+        seq = self._block_seq[index] = self._render_seq
+        if size < SYNC_RENDER_CHARS:
+            self._rendering.discard(index)
+            with span("render.markdown", "ui", chars=size):
+                self._html[index] = job()
+            return
+        self._rendering.add(index)
+        RENDERER.submit(id(self), index, job, lambda html: self._rendered.emit(index, seq, html))
+
+    def _on_rendered(self, index: int, seq: int, html: str):
+        if self._block_seq.get(index) != seq or index >= len(self._html):
+            return  # the block was re-rendered or removed since this job was queued
+        self._rendering.discard(index)
+        self._html[index] = html
+        self._set_html()
 
     def _flush_render(self, force=False):
         if self._render_buf or force:
             if len(self._html) >= 2 and "assistant" in self._html[-2]:
-                self._html[-1] = md.render(self._assistant_md)
+                self._render_block(len(self._html) - 1, *self._assistant_job())
             self._render_buf = []
-            self._set_html("".join(self._html))
-
-    def _on_page_ready(self, ok: bool):
-        self._page_ready = bool(ok)
-        if self._page_ready and self._pending_html is not None:
-            self._really_set_html(self._pending_html)
-            self._pending_html = None
+            self._set_html()
 
-    def _set_html(self, html: str):
-        if not hasattr(self, "_page_ready") or not self._page_ready:
-            self._pending_html = html
-            return
-        self._really_set_html(html)
-
-    def _really_set_html(self, html: str):
-        js = f"setHtml({json.dumps(html)});"
-        self.view.page().runJavaScript(js)
+    def _set_html(self):
+        """Show ``self._html`` in the transcript (the view only redraws the blocks that changed)."""
+        if hasattr(self, "view"):
+            self.view.set_blocks(self._html)
 
     def _send_message_same_tab(self):
         text = self.input.toPlainText().strip()
@@ -324,26 +1237,63 @@ class SessionWidget(QWidget):
         self.input.clear()
         self.input.reset_to_min()
         self.input.setFocus(Qt.TabFocusReason)
+        self._record_first_action(MESSAGE)
+        self._cancel_speculation()
         self.asked.emit()
         self._user_say(text)
-        self._chat()
+        self._chat(prepare=self._retrieval_for(text))
 
     def _stop_generation(self):
+        """Cancel the answer without blocking: connections are aborted, threads finish on their own."""
+        stopped_at = time.perf_counter()
+        running = [s["worker"] for s in self._fan.values() if s["elapsed"] is None and self._running(s["worker"])]
+        if running:
+            for w in running:
+                w.stop()
+                self._retire(w)
+            for s in self._fan.values():
+                if s["elapsed"] is None:
+                    s["elapsed"] = time.time() - self._start_ts
+            self._finish_fan_out(stopped=True)
+            self._confirm_released(running, stopped_at)
+            return
         if self._worker and self._worker.isRunning():
-            try:
-                self._worker.stop()
-                self._worker.wait()
-            except Exception:
-                pass
-            self._worker = None
+            w, self._worker = self._worker, None
+            w.stop()
+            self._retire(w)
+            self._diff = None
             self._render_timer.stop()
             self._flush_render(True)
             if getattr(self, "_assistant_md", ""):
-                self.history.append({"role": "assistant", "content": self._assistant_md})
+                self.history.append(Message("assistant", self._assistant_md))
+            self._save_session()
             self.status.showMessage("Generation stopped")
+            self._confirm_released([w], stopped_at)
+
+    def shutdown(self):
+        """Stop every worker owned by this tab (called before the tab is removed); does not block."""
+        self._cancel_speculation()
+        for w in [s["worker"] for s in self._fan.values()] + [self._worker]:
+            if self._running(w):
+                w.stop()
+                self._retire(w)
+        self._worker = None
+        self._fan = {}
+        RENDERER.cancel(id(self))
+        _COMPRESSOR.cancel(id(self), wait=False)  # a running compression must not block closing the tab
+        if self._watcher is not None:
+            self._watcher.removePaths(self._watcher.files())
+        if self._journal is not None:
+            self._journal.discard()
 
     def _busy(self) -> bool:
-        return self._worker is not None and self._worker.isRunning()
+        if any(s["elapsed"] is None and self._running(s["worker"]) for s in self._fan.values()):
+            return True
+        return self._running(self._worker)
+
+    @staticmethod
+    def _running(worker: QThread | None) -> bool:
+        return worker is not None and worker.isRunning()
 
     @staticmethod
     def _mk_btn(text, handler):
@@ -354,5 +1304,6 @@ class SessionWidget(QWidget):
             QPushButton { background:#22262b; color:#e6e6e6; border:none; padding:6px 14px; border-radius:8px; }
             QPushButton:hover { background:#2b3137; }
             QPushButton:pressed { background:#1e2328; }
+            QPushButton:checked { background:#2d4a66; }
         """)
         return b
@@ -0,0 +1,72 @@
+import json
+import time
+
+from PySide6.QtCore import QUrl, Signal
+from PySide6.QtWebEngineCore import QWebEnginePage
+from PySide6.QtWebEngineWidgets import QWebEngineView
+
+from resources.html_template import HTML_TEMPLATE
+from tracing import TRACER, span
+
+
+class _TranscriptPage(QWebEnginePage):
+    """Turns clicks on localpilot:// links into ``command`` instead of a navigation."""
+    command = Signal(QUrl)
+
+    def acceptNavigationRequest(self, url: QUrl, nav_type, is_main_frame: bool) -> bool:
+        if url.scheme() == "localpilot":
+            self.command.emit(url)
+            return False
+        return super().acceptNavigationRequest(url, nav_type, is_main_frame)
+
+
+class WebTranscript(QWebEngineView):
+    """Transcript in a Chromium page: the template's ``setHtml`` patches only the changed blocks."""
+    command = Signal(QUrl)  # a localpilot:// link was clicked (e.g. "fork from here")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        page = _TranscriptPage(self)
+        page.command.connect(self.command)
+        self.setPage(page)
+        self.ready = False
+        self._pending: str | None = None  # latest HTML sent before the page finished loading
+        self.setHtml(HTML_TEMPLATE)
+        self.loadFinished.connect(self._on_page_ready)
+
+    def set_blocks(self, blocks: list[str], done=None) -> None:
+        """Show the transcript ``blocks``; ``done()`` runs once the page has applied them."""
+        html = "".join(blocks)
+        if not self.ready:
+            self._pending = html
+            return
+        if TRACER.enabled:
+            self._traced_set_html(html, done)
+            return
+        js = f"setHtml({json.dumps(html)});"
+        if done is None:
+            self.page().runJavaScript(js)
+        else:
+            self.page().runJavaScript(js, 0, lambda _result: done())
+
+    def _on_page_ready(self, ok: bool):
+        self.ready = bool(ok)
+        if self.ready and self._pending is not None:
+            html, self._pending = self._pending, None
+            self.set_blocks([html])
+
+    def _traced_set_html(self, html: str, done=None):
+        """setHtml that also reports how long the page spent on it (DOM update + highlighting)."""
+        js = f"(function(){{const t0 = performance.now(); setHtml({json.dumps(html)}); return performance.now() - t0;}})()"
+        dispatched = time.perf_counter_ns() / 1000
+
+        def finished(js_ms):
+            now = time.perf_counter_ns() / 1000
+            dur = float(js_ms or 0) * 1000
+            TRACER.complete("page.setHtml", now - dur, dur, cat="page", tid=0, thread_name="page (JS)",
+                            args={"bytes": len(html), "round_trip_ms": round((now - dispatched) / 1000, 3)})
+            if done is not None:
+                done()
+
+        with span("render.setHtml", "ui", bytes=len(html)):
+            self.page().runJavaScript(js, 0, finished)
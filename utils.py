@@ -1,4 +1,5 @@
 """Small utilities and static prompts."""
+import re
 
 ACTIONS = {
     "explain": "Explain what this code does, list concrete risks, and break down the flow.",
@@ -8,6 +9,90 @@ ACTIONS = {
     "simplify": "Simplify the code to make it more readable and easier to understand while preserving its original functionality."
 }
 
+# Edit actions that can answer with a unified diff instead of re-emitting the whole selection
+DIFF_ACTIONS = ("refactor", "performance", "simplify")
+DIFF_INSTRUCTIONS = (
+    "Answer with a unified diff against the code above (it is the file `{file}`): one ```diff block with "
+    "`@@ -start,count +start,count @@` hunks, 3 unchanged context lines around each change, and lines copied "
+    "exactly from the original. Do not repeat unchanged code outside the diff. After the diff, explain the "
+    "changes in at most three bullet points."
+)
+
+
+def diff_prompt(key: str, file_name: str) -> str:
+    """The instruction for ``key`` asking for a unified diff instead of the full rewritten code."""
+    return f"{ACTIONS[key]}\n\n{DIFF_INSTRUCTIONS.format(file=file_name or 'selection')}"
+
+
+# Generation budget per action ("chat" covers free-form questions). "num_predict" caps the answer
+# (raised to "per_code_token" x the selection for actions that re-emit the code), "stop" are Ollama
+# stop sequences and "stop_after_fence" ends the answer once its first code block is closed.
+# Per-model overrides come from the JSON file in LOCALPILOT_PROFILES (see config.MODEL_PROFILES).
+ACTION_PROFILES = {
+    "chat": {"num_predict": 2048, "stop": ["\nuser:"], "stop_after_fence": False},
+    "explain": {"num_predict": 700, "stop": ["\nuser:"], "stop_after_fence": False},
+    "refactor": {"num_predict": 1024, "per_code_token": 1.5, "stop": ["\nuser:"], "stop_after_fence": True},
+    "tests": {"num_predict": 1536, "per_code_token": 2.0, "stop": ["\nuser:"], "stop_after_fence": False},
+    "performance": {"num_predict": 1024, "per_code_token": 1.5, "stop": ["\nuser:"], "stop_after_fence": True},
+    "simplify": {"num_predict": 1024, "per_code_token": 1.5, "stop": ["\nuser:"], "stop_after_fence": True},
+}
+
+
+def generation_profile(action: str, model: str | None = None, overrides: dict | None = None,
+                       code_tokens: int = 0, diff: bool = False) -> dict:
+    """Resolved profile for ``action`` on ``model``: ``num_predict``, ``stop`` and ``stop_after_fence``.
+
+    ``overrides`` maps a model name (or "*") to per-action settings, with "*" as the action for
+    all of them, e.g. ``{"qwen2.5-coder:1.5b": {"explain": {"num_predict": 400}}}``. Diff-mode
+    answers keep their explanation after the diff, so they never stop at the fence.
+    """
+    profile = dict(ACTION_PROFILES.get(action, ACTION_PROFILES["chat"]))
+    for name in ("*", model):
+        per_model = (overrides or {}).get(name) or {}
+        for key in ("*", action):
+            profile.update(per_model.get(key) or {})
+    if profile.get("num_predict") and profile.get("per_code_token"):
+        profile["num_predict"] = max(profile["num_predict"], int(code_tokens * profile["per_code_token"]))
+    profile.pop("per_code_token", None)
+    if diff:
+        profile["stop_after_fence"] = False
+    return profile
+
+
+def describe_profile(profile: dict) -> str:
+    """Short text for the UI, e.g. "≤700 tokens · ends after the code block"."""
+    parts = [f"≤{profile['num_predict']} tokens" if profile.get("num_predict") else "no token limit"]
+    if profile.get("stop_after_fence"):
+        parts.append("ends after the code block")
+    return " · ".join(parts)
+
+
+# A fence line of a markdown code block: its backticks/tildes and info string
+FENCE = re.compile(r"^\s*(`{3,}|~{3,})\s*([\w+-]*)\s*$")
+
+
+class FenceEnd:
+    """Finds where the first fenced code block of a streamed answer closes."""
+
+    def __init__(self):
+        self._line = ""
+        self._open: str | None = None
+
+    def feed(self, chunk: str) -> int | None:
+        """Offset in ``chunk`` just past the closing fence line, or None while the block is open."""
+        pos = 0
+        while (nl := chunk.find("\n", pos)) >= 0:
+            line, self._line, pos = self._line + chunk[pos:nl], "", nl + 1
+            m = FENCE.match(line)
+            if not m:
+                continue
+            if self._open is None:
+                self._open = m.group(1)
+            elif not m.group(2) and m.group(1)[0] == self._open[0] and len(m.group(1)) >= len(self._open):
+                return pos
+        self._line += chunk[pos:]
+        return None
+
 
 def lang_hint(filename: str) -> str:
     """Best-effort language hint from a file name."""
@@ -25,6 +110,25 @@ def lang_hint(filename: str) -> str:
     return "plaintext"
 
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for code and English)."""
+    return (len(text or "") + 3) // 4
+
+
+def chat_prompt(messages: list[dict]) -> str:
+    """Flatten chat messages into the ``/api/generate`` prompt format used by every client."""
+    parts: list[str] = []
+    for msg in messages:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        if role == "system":
+            parts.append(content)
+        else:
+            parts.append(f"{role}: {content}")
+    parts.append("assistant:")
+    return "\n".join(parts)
+
+
 def build_prompt(task: str, code: str, lang: str) -> str:
     return (
         "You are a senior software engineer. Be concise and precise.\n\n"
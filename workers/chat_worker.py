@@ -1,11 +1,19 @@
 from __future__ import annotations
 
 import queue
+import sys
 import threading
+from typing import Callable
+
 from PySide6.QtCore import QThread, Signal
 
 from config import MODEL
-from ollama_client import stream_ollama
+from latency import RequestTimeline
+from metrics import METRICS
+from ollama_client import StopEvent, stream_ollama
+from scheduler import PRIORITY_INTERACTIVE, PRIORITY_SPECULATIVE, SCHEDULER
+from tracing import span
+from utils import chat_prompt
 
 
 class ChatWorker(QThread):
@@ -13,35 +21,52 @@ class ChatWorker(QThread):
     chunk = Signal(str)
     done = Signal()
     error = Signal(str)
+    status = Signal(str)  # latency notes: "model loading (12 s)", failover, fallback model
+    stats = Signal(dict)  # RequestTimeline.stats() of the finished request
 
-    def __init__(self, messages: list[dict], model: str | None = None):
+    def __init__(self, messages: list[dict], model: str | None = None, prepare: Callable[[], None] | None = None,
+                 priority: int = PRIORITY_INTERACTIVE, profile: dict | None = None, affinity: str | None = None):
         super().__init__()
         self.messages = messages
         self.model = model or MODEL
-        self._stop_event = threading.Event()
+        self.prepare = prepare  # runs on this thread before the prompt is built (e.g. retrieval)
+        self.priority = priority
+        self.profile = profile or {}  # utils.generation_profile(): num_predict, stop, stop_after_fence
+        self.affinity = affinity  # endpoint URL that holds this conversation's prefix (see EndpointPool.choose)
+        self._stop_event = StopEvent()
+        self.timeline = RequestTimeline()
 
     def stop(self) -> None:
-        """Request the worker to stop streaming."""
+        """Stop streaming; aborts the HTTP connection immediately and never blocks."""
         self._stop_event.set()
 
+    def set_priority(self, priority: int) -> None:
+        """Raise or lower the request's scheduler priority, also while it waits for a slot."""
+        self.priority = priority
+        SCHEDULER.reprioritise(self._stop_event, priority)
+        if self.isRunning():  # speculative work runs at the lowest OS priority; Qt rejects InheritPriority here
+            self.setPriority(QThread.LowestPriority if priority >= PRIORITY_SPECULATIVE else QThread.NormalPriority)
+
     def _build_prompt(self) -> str:
-        parts: list[str] = []
-        for msg in self.messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "system":
-                parts.append(content)
-            else:
-                parts.append(f"{role}: {content}")
-        parts.append("assistant:")
-        return "\n".join(parts)
+        return chat_prompt(self.messages)
+
+    def _options(self) -> dict:
+        return {k: self.profile[k] for k in ("num_predict", "stop") if self.profile.get(k)}
 
     def run(self):
+        if self.prepare:
+            try:
+                self.prepare()
+            except Exception as e:
+                print(f"[ChatWorker] prepare failed: {e}", file=sys.stderr)
         prompt = self._build_prompt()
         q: queue.Queue[str | None] = queue.Queue()
+        self.timeline = RequestTimeline()
 
         def worker() -> None:
-            stream_ollama(prompt, q, model=self.model, stop_event=self._stop_event)
+            stream_ollama(prompt, q, model=self.model, stop_event=self._stop_event, priority=self.priority,
+                          on_status=self.status.emit, timeline=self.timeline, options=self._options(),
+                          stop_after_fence=bool(self.profile.get("stop_after_fence")), affinity=self.affinity)
 
         t = threading.Thread(target=worker, daemon=True)
         t.start()
@@ -59,10 +84,15 @@ class ChatWorker(QThread):
                 if chunk.startswith("[Error]") or chunk.startswith("\n[Error]"):
                     self.error.emit(chunk.strip())
                 else:
-                    self.chunk.emit(chunk)
+                    with span("worker.emit", "worker"):
+                        self.chunk.emit(chunk)
         except Exception as e:
             self.error.emit(str(e))
         finally:
             self._stop_event.set()
             t.join()
+            if self.timeline.tokens:
+                stats = self.timeline.stats()
+                METRICS.record(stats)
+                self.stats.emit(stats)
             self.done.emit()
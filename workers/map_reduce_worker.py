@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from PySide6.QtCore import QThread, Signal
+
+from chunking import CodeChunk
+from config import MODEL
+from map_reduce import run_map_reduce
+from ollama_client import StopEvent
+
+
+class MapReduceWorker(QThread):
+    """Runs one action over the chunks of a large selection and streams the merged answer."""
+    chunk = Signal(str)
+    progress = Signal(int, int)  # finished parts, total parts
+    done = Signal()
+    error = Signal(str)
+
+    def __init__(self, instruction: str, chunks: list[CodeChunk], lang: str, model: str | None = None):
+        super().__init__()
+        self.instruction = instruction
+        self.chunks = chunks
+        self.lang = lang
+        self.model = model or MODEL
+        self._stop_event = StopEvent()
+
+    def stop(self) -> None:
+        """Stop streaming; aborts the HTTP connection immediately and never blocks."""
+        self._stop_event.set()
+
+    def _emit(self, s: str) -> None:
+        if s.startswith("[Error]") or s.startswith("\n[Error]"):
+            self.error.emit(s.strip())
+        else:
+            self.chunk.emit(s)
+
+    def run(self):
+        try:
+            run_map_reduce(
+                self.instruction, self.chunks, self.lang, self._emit,
+                model=self.model, on_progress=self.progress.emit, stop_event=self._stop_event,
+            )
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            self._stop_event.set()
+            self.done.emit()